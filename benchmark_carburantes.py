@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from cli_carburantes import entorno_con_carpeta
+from escritores_carburantes import crear_escritor
+from json_carburantes import columnas_estaciones
+from servidor_prueba_carburantes import GeneradorPayloads
+
+CARPETA = os.path.dirname(os.path.abspath(__file__))
+
+
+def _fechas(inicio, dias):
+    primero = datetime.strptime(inicio, '%d-%m-%Y')
+    return [(primero + timedelta(days=i)).strftime('%d-%m-%Y') for i in range(dias)]
+
+
+def _version():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=CARPETA, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _rss_mb(ru_maxrss):
+    # ru_maxrss viene en KB en Linux y en bytes en macOS
+    return round(ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def medir_etapas(fechas, estaciones=12000, combustibles=None, formatos=('xlsx',)):
+    """Tiempo de pared, CPU y pico de memoria de cada etapa del procesado de un día, sin red
+
+    Se hacen dos pasadas: una solo con tiempos y otra solo con tracemalloc para el
+    pico de memoria, porque con el trazado activo las etapas van varias veces más lentas.
+    """
+    from scrapy_carburantes_simple import limpiar_dataframe
+
+    generador = GeneradorPayloads(estaciones)
+    etapas = {}
+
+    def cronometrar(nombre, funcion, *args):
+        pared, cpu = time.perf_counter(), time.process_time()
+        resultado = funcion(*args)
+        pared, cpu = time.perf_counter() - pared, time.process_time() - cpu
+        etapa = etapas.setdefault(nombre, {'pared_s': 0.0, 'cpu_s': 0.0, 'pico_mb': 0.0})
+        etapa['pared_s'] += pared
+        etapa['cpu_s'] += cpu
+        return resultado
+
+    def medir_memoria(nombre, funcion, *args):
+        tracemalloc.start()
+        try:
+            resultado = funcion(*args)
+            pico = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        etapa = etapas[nombre]
+        etapa['pico_mb'] = max(etapa['pico_mb'], round(pico / 1024 / 1024, 1))
+        return resultado
+
+    def dataframe(columnas, fecha):
+        df = pd.DataFrame(columnas)
+        df['FechaConsulta'] = fecha
+        df['FechaDescarga'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return df
+
+    def pasada(medir, carpeta):
+        for fecha in fechas:
+            cuerpo = generador.cuerpo(fecha)
+            columnas = medir('decodificar', columnas_estaciones, cuerpo)
+            df = medir('dataframe', dataframe, columnas, fecha)
+            del columnas
+            df = medir('limpiar', limpiar_dataframe, df, combustibles)
+            for formato in formatos:
+                escritor = crear_escritor(formato)
+                ruta = os.path.join(carpeta, f'precios_{fecha.replace("-", "_")}.{escritor.extension}')
+                medir(f'escribir_{escritor.extension}', escritor.escribir, df, ruta)
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        pasada(cronometrar, carpeta)
+        pasada(medir_memoria, carpeta)
+
+    for etapa in etapas.values():
+        etapa['dias_por_segundo'] = round(len(fechas) / etapa['pared_s'], 2) if etapa['pared_s'] else None
+        etapa['pared_s'] = round(etapa['pared_s'], 3)
+        etapa['cpu_s'] = round(etapa['cpu_s'], 3)
+    return etapas
+
+
+def medir_extremo_a_extremo(fechas, estaciones=12000, args_spider=None, ajustes=None, servidor=None):
+    """Lanzar el servidor de prueba y el spider completo en procesos aparte y medir el spider"""
+    puerto = _puerto_libre()
+    opciones_servidor = ['--puerto', str(puerto), '--estaciones', str(estaciones), '--cache-dias', str(len(fechas))]
+    for clave, valor in (servidor or {}).items():
+        opciones_servidor += [f'--{clave.replace("_", "-")}', str(valor)]
+    proceso_servidor = subprocess.Popen(
+        [sys.executable, os.path.join(CARPETA, 'servidor_prueba_carburantes.py')] + opciones_servidor,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f'http://127.0.0.1:{puerto}'
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', puerto), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        # Generar las respuestas antes de medir: el coste del servidor no cuenta
+        for fecha in fechas:
+            while True:
+                try:
+                    urllib.request.urlopen(f'{base_url}/EstacionesTerrestresHist/{fecha}', timeout=120).read()
+                    break
+                except OSError:
+                    time.sleep(0.1)
+
+        with tempfile.TemporaryDirectory() as carpeta:
+            salida_items = os.path.join(carpeta, 'items.jsonl')
+            args = {'fecha_inicio': fechas[0], 'fecha_fin': fechas[-1], 'base_url': base_url, 'cache': '0',
+                    'output_dir': os.path.join(carpeta, 'salida')}
+            args.update(args_spider or {})
+            todos_ajustes = {'DOWNLOAD_DELAY': 0, 'AUTOTHROTTLE_ENABLED': False, 'RETRY_TIMES': 10,
+                             'CONCURRENT_REQUESTS_PER_DOMAIN': 4, 'LOG_LEVEL': 'WARNING'}
+            todos_ajustes.update(ajustes or {})
+
+            comando = [sys.executable, '-m', 'scrapy', 'runspider', os.path.join(CARPETA, 'scrapy_carburantes_simple.py'),
+                       '-o', f'{salida_items}:jsonlines']
+            for clave, valor in args.items():
+                comando += ['-a', f'{clave}={valor}']
+            for clave, valor in todos_ajustes.items():
+                comando += ['-s', f'{clave}={valor}']
+
+            inicio = time.perf_counter()
+            proceso = subprocess.Popen(comando, cwd=carpeta, env=entorno_con_carpeta(), stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.PIPE, text=True)
+            # wait4 da el uso de recursos de este proceso (y de los hijos que haya esperado, como el pool)
+            _, estado, uso = os.wait4(proceso.pid, 0)
+            pared = time.perf_counter() - inicio
+            proceso.returncode = os.waitstatus_to_exitcode(estado)
+            errores = proceso.stderr.read()
+
+            items = []
+            if os.path.exists(salida_items):
+                with open(salida_items, encoding='utf-8') as f:
+                    items = [json.loads(linea) for linea in f if linea.strip()]
+    finally:
+        proceso_servidor.terminate()
+        proceso_servidor.wait()
+
+    exitos = sum(1 for item in items if item.get('status') == 'success')
+    return {
+        'codigo_salida': proceso.returncode,
+        'dias': len(fechas),
+        'dias_ok': exitos,
+        'pared_s': round(pared, 3),
+        'cpu_s': round(uso.ru_utime + uso.ru_stime, 3),
+        'pico_rss_mb': _rss_mb(uso.ru_maxrss),
+        'dias_por_segundo': round(exitos / pared, 2) if pared else None,
+        'args': args,
+        'ajustes': todos_ajustes,
+        'errores': errores[-2000:] if proceso.returncode else '',
+    }
+
+
+def comparar(actual, anterior):
+    """Cociente de días/segundo entre dos informes (>1 es más rápido que antes)"""
+    filas = []
+    pares = [('extremo_a_extremo', actual.get('extremo_a_extremo'), anterior.get('extremo_a_extremo'))]
+    pares += [(f'etapa {nombre}', datos, anterior.get('etapas', {}).get(nombre)) for nombre, datos in actual.get('etapas', {}).items()]
+    for nombre, nuevo, viejo in pares:
+        if nuevo and viejo and nuevo.get('dias_por_segundo') and viejo.get('dias_por_segundo'):
+            filas.append((nombre, viejo['dias_por_segundo'], nuevo['dias_por_segundo'],
+                          round(nuevo['dias_por_segundo'] / viejo['dias_por_segundo'], 2)))
+    return filas
+
+
+def _clave_valor(texto):
+    clave, _, valor = texto.partition('=')
+    return clave, valor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark del pipeline de carburantes contra el servidor de prueba local')
+    parser.add_argument('--dias', type=int, default=7)
+    parser.add_argument('--inicio', default='01-01-2024', help='primera fecha (dd-mm-aaaa)')
+    parser.add_argument('--estaciones', type=int, default=12000)
+    parser.add_argument('--combustibles', default='Gasoleo A,Gasolina 95 E5')
+    parser.add_argument('--formatos', default='xlsx,csv,parquet', help='formatos a medir en las etapas')
+    parser.add_argument('--formato', default='xlsx', help='formato de salida del spider de extremo a extremo')
+    parser.add_argument('-a', dest='args_spider', action='append', type=_clave_valor, default=[],
+                        help='argumento extra del spider (clave=valor)')
+    parser.add_argument('-s', dest='ajustes', action='append', type=_clave_valor, default=[],
+                        help='ajuste extra de Scrapy (CLAVE=valor)')
+    parser.add_argument('--latencia', type=float, default=0.0)
+    parser.add_argument('--tasa-429', type=float, default=0.0)
+    parser.add_argument('--tasa-500', type=float, default=0.0)
+    parser.add_argument('--sin-etapas', action='store_true')
+    parser.add_argument('--sin-extremo', action='store_true')
+    parser.add_argument('--salida', help='fichero JSON del informe (por defecto benchmark_carburantes_<fecha>.json)')
+    parser.add_argument('--comparar', help='informe JSON anterior con el que comparar')
+    args = parser.parse_args(argv)
+
+    fechas = _fechas(args.inicio, args.dias)
+    combustibles = [c for c in args.combustibles.split(',') if c]
+    formatos = []
+    for formato in args.formatos.split(','):
+        try:
+            crear_escritor(formato)
+            formatos.append(formato)
+        except (ValueError, ImportError) as e:
+            print(f'⚠️ Se omite el formato {formato}: {e}')
+
+    informe = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'version': _version(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'parametros': {'dias': args.dias, 'inicio': args.inicio, 'estaciones': args.estaciones, 'combustibles': combustibles},
+    }
+
+    if not args.sin_etapas:
+        print(f'⏱️ Midiendo etapas sobre {len(fechas)} días...')
+        informe['etapas'] = medir_etapas(fechas, args.estaciones, combustibles, formatos)
+    if not args.sin_extremo:
+        print(f'🚀 Midiendo el spider de extremo a extremo sobre {len(fechas)} días...')
+        args_spider = {'formato': args.formato, 'combustibles_extra': ','.join(combustibles)}
+        args_spider.update(dict(args.args_spider))
+        servidor = {'latencia': args.latencia, 'tasa_429': args.tasa_429, 'tasa_500': args.tasa_500}
+        informe['extremo_a_extremo'] = medir_extremo_a_extremo(fechas, args.estaciones, args_spider, dict(args.ajustes), servidor)
+
+    salida = args.salida or f'benchmark_carburantes_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+
+    for nombre, datos in informe.get('etapas', {}).items():
+        print(f'  {nombre:<18} {datos["dias_por_segundo"]:>8} días/s  cpu {datos["cpu_s"]:>7}s  pico {datos["pico_mb"]} MB')
+    if 'extremo_a_extremo' in informe:
+        e2e = informe['extremo_a_extremo']
+        print(f'  {"extremo a extremo":<18} {e2e["dias_por_segundo"]:>8} días/s  cpu {e2e["cpu_s"]:>7}s  '
+              f'RSS {e2e["pico_rss_mb"]} MB  ({e2e["dias_ok"]}/{e2e["dias"]} días)')
+        if e2e['codigo_salida']:
+            print(f'❌ El spider terminó con código {e2e["codigo_salida"]}:\n{e2e["errores"]}')
+    print(f'💾 Informe guardado en {salida}')
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            anterior = json.load(f)
+        print(f'📊 Comparación con {args.comparar} (versión {anterior.get("version")}):')
+        for nombre, viejo, nuevo, cociente in comparar(informe, anterior):
+            print(f'  {nombre:<24} {viejo:>8} → {nuevo:>8} días/s  (x{cociente})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+from scrapy.http import TextResponse
+
+# Tamaño máximo por defecto: más de un año de días completos comprimidos
+CACHE_MAX_MB = 500
+
+
+def carpeta_cache_usuario():
+    """Carpeta de caché del usuario: %LOCALAPPDATA% en Windows, $XDG_CACHE_HOME o ~/.cache en el resto"""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'carburantes', 'respuestas')
+
+
+class CacheRespuestas:
+    """Caché persistente y comprimida de las respuestas JSON en bruto de la API"""
+
+    def __init__(self, directorio=None, max_mb=CACHE_MAX_MB, refrescar_dias=0):
+        self.directorio = directorio or carpeta_cache_usuario()
+        self.max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else None
+        self.refrescar_dias = int(refrescar_dias or 0)
+        os.makedirs(self.directorio, exist_ok=True)
+        # Tamaño total de las entradas, llevado a mano: solo se recorre la carpeta al pasarse del límite
+        self.total_bytes = sum(tamaño for _, tamaño, _ in self.entradas()) if self.max_bytes else 0
+
+    def ruta(self, endpoint, fecha):
+        """Ruta del fichero de caché para un endpoint y una fecha dd-mm-aaaa"""
+        dia = datetime.strptime(fecha, '%d-%m-%Y').strftime('%Y%m%d')
+        carpeta = os.path.join(self.directorio, *endpoint.strip('/').split('/'))
+        return os.path.join(carpeta, f'{dia}.json.gz')
+
+    def debe_refrescar(self, fecha):
+        """Los últimos `refrescar_dias` días se vuelven a descargar siempre"""
+        if self.refrescar_dias <= 0:
+            return False
+        limite = datetime.now().date() - timedelta(days=self.refrescar_dias)
+        return datetime.strptime(fecha, '%d-%m-%Y').date() > limite
+
+    def ruta_validadores(self, endpoint, fecha):
+        """Fichero junto a la entrada con el ETag y el Last-Modified con que llegó"""
+        return self.ruta(endpoint, fecha)[:-len('.json.gz')] + '.validadores.json'
+
+    def obtener(self, endpoint, fecha):
+        """Devolver el cuerpo en bruto guardado o None si no está en caché (o hay que refrescarlo)"""
+        if self.debe_refrescar(fecha):
+            return None
+        return self.leer(endpoint, fecha)
+
+    def leer(self, endpoint, fecha):
+        """Cuerpo guardado de una fecha aunque toque refrescarla, o None"""
+        ruta = self.ruta(endpoint, fecha)
+        try:
+            with gzip.open(ruta, 'rb') as f:
+                cuerpo = f.read()
+        except (OSError, EOFError):
+            return None
+        # El mtime hace de marca de último uso para la expulsión
+        os.utime(ruta, None)
+        return cuerpo
+
+    def guardar(self, endpoint, fecha, cuerpo, validadores=None):
+        """Guardar el cuerpo en bruto de forma atómica y aplicar el límite de tamaño"""
+        ruta = self.ruta(endpoint, fecha)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temporal = f'{ruta}.{os.getpid()}.tmp'
+        with gzip.open(temporal, 'wb', compresslevel=6) as f:
+            f.write(cuerpo)
+        try:
+            self.total_bytes -= os.path.getsize(ruta)
+        except OSError:
+            pass
+        self.total_bytes += os.path.getsize(temporal)
+        os.replace(temporal, ruta)
+        self.guardar_validadores(endpoint, fecha, validadores)
+        self.expulsar()
+        return ruta
+
+    def validadores(self, endpoint, fecha):
+        """ETag / Last-Modified guardados para una fecha ({} si no hay)"""
+        try:
+            with open(self.ruta_validadores(endpoint, fecha), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def guardar_validadores(self, endpoint, fecha, validadores):
+        ruta = self.ruta_validadores(endpoint, fecha)
+        validadores = {clave: valor for clave, valor in (validadores or {}).items() if valor}
+        if not validadores:
+            if os.path.exists(ruta):
+                os.remove(ruta)
+            return
+        temporal = f'{ruta}.{os.getpid()}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(validadores, f)
+        os.replace(temporal, ruta)
+
+    def entradas(self):
+        """Listar (ruta, tamaño, último uso) de todas las entradas de la caché"""
+        resultado = []
+        for raiz, _, archivos in os.walk(self.directorio):
+            for archivo in archivos:
+                if archivo.endswith('.json.gz'):
+                    ruta = os.path.join(raiz, archivo)
+                    try:
+                        info = os.stat(ruta)
+                    except OSError:
+                        continue
+                    resultado.append((ruta, info.st_size, info.st_mtime))
+        return resultado
+
+    def expulsar(self):
+        """Al pasar de max_mb, eliminar las entradas menos usadas hasta quedar en el 90%
+
+        El margen evita volver a recorrer la carpeta en cada guardado una vez llena.
+        """
+        if not self.max_bytes or self.total_bytes <= self.max_bytes:
+            return 0
+        entradas = self.entradas()
+        total = sum(tamaño for _, tamaño, _ in entradas)
+        objetivo = self.max_bytes * 0.9 if total > self.max_bytes else self.max_bytes
+        eliminadas = 0
+        for ruta, tamaño, _ in sorted(entradas, key=lambda e: e[2]):
+            if total <= objetivo:
+                break
+            try:
+                os.remove(ruta)
+            except OSError:
+                continue
+            try:
+                os.remove(ruta[:-len('.json.gz')] + '.validadores.json')
+            except OSError:
+                pass
+            total -= tamaño
+            eliminadas += 1
+        # El recorrido corrige lo que hayan guardado o borrado otros procesos con la misma carpeta
+        self.total_bytes = total
+        return eliminadas
+
+
+def validadores_respuesta(response):
+    """ETag y Last-Modified de una respuesta, para pedir después el mismo día de forma condicional"""
+    return {
+        'etag': response.headers.get('ETag', b'').decode('latin-1'),
+        'last_modified': response.headers.get('Last-Modified', b'').decode('latin-1'),
+    }
+
+
+class CacheRespuestasMiddleware:
+    """Servir desde la caché del spider las fechas ya descargadas, sin tocar la red
+
+    Los días recientes (que se refrescan siempre) se piden con If-None-Match /
+    If-Modified-Since si hay copia guardada; un 304 se contesta con esa copia,
+    marcada como 'cached' y 'no_modificado'.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_request(self, request, spider=None):
+        spider = self.crawler.spider
+        cache = getattr(spider, 'cache', None)
+        endpoint = request.meta.get('endpoint')
+        if cache is None or endpoint is None:
+            return None
+
+        fecha = request.meta['fecha']
+        cuerpo = cache.obtener(endpoint, fecha)
+        if cuerpo is None:
+            self.crawler.stats.inc_value('cache_carburantes/miss')
+            self._hacer_condicional(cache, endpoint, fecha, request)
+            return None
+
+        self.crawler.stats.inc_value('cache_carburantes/hit')
+        return TextResponse(
+            url=request.url,
+            status=200,
+            body=cuerpo,
+            encoding='utf-8',
+            request=request,
+            flags=['cached'],
+        )
+
+    def _hacer_condicional(self, cache, endpoint, fecha, request):
+        if not cache.debe_refrescar(fecha) or request.meta.get('condicional'):
+            return
+        validadores = cache.validadores(endpoint, fecha)
+        if not validadores or not os.path.exists(cache.ruta(endpoint, fecha)):
+            return
+        if validadores.get('etag'):
+            request.headers['If-None-Match'] = validadores['etag']
+        if validadores.get('last_modified'):
+            request.headers['If-Modified-Since'] = validadores['last_modified']
+        request.meta['condicional'] = True
+        request.meta['handle_httpstatus_list'] = list(request.meta.get('handle_httpstatus_list', [])) + [304]
+        self.crawler.stats.inc_value('cache_carburantes/condicional')
+
+    def process_response(self, request, response, spider=None):
+        if response.status != 304 or not request.meta.get('condicional'):
+            return response
+        cache = getattr(self.crawler.spider, 'cache', None)
+        endpoint, fecha = request.meta['endpoint'], request.meta['fecha']
+        cuerpo = cache.leer(endpoint, fecha) if cache is not None else None
+        if cuerpo is None:
+            return response
+        self.crawler.stats.inc_value('cache_carburantes/no_modificado')
+        nuevos = {clave: valor for clave, valor in validadores_respuesta(response).items() if valor}
+        if nuevos:
+            cache.guardar_validadores(endpoint, fecha, {**cache.validadores(endpoint, fecha), **nuevos})
+        return TextResponse(
+            url=request.url,
+            status=200,
+            body=cuerpo,
+            encoding='utf-8',
+            request=request,
+            flags=['cached', 'no_modificado'],
+        )
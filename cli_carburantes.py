@@ -0,0 +1,239 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from manifiesto_carburantes import ManifiestoDescargas
+
+CARPETA = os.path.dirname(os.path.abspath(__file__))
+ESTADOS_TERMINADOS = {'success', 'no_data'}
+
+
+def entorno_con_carpeta():
+    """Entorno para un proceso hijo que tiene que importar los módulos de esta carpeta desde cualquier directorio"""
+    entorno = dict(os.environ)
+    entorno['PYTHONPATH'] = os.pathsep.join(filter(None, [CARPETA, entorno.get('PYTHONPATH')]))
+    return entorno
+
+
+def _fecha(texto):
+    return datetime.strptime(texto, '%d-%m-%Y')
+
+
+def _texto(fecha):
+    return fecha.strftime('%d-%m-%Y')
+
+
+def dividir_en_shards(desde, hasta, meses_por_shard=6):
+    """Partir [desde, hasta] en tramos de meses completos
+
+    Los cortes caen siempre en día 1, así que cada partición mensual de los almacenes
+    (dataset, deltas) la escribe un solo shard.
+    """
+    if meses_por_shard < 1:
+        raise ValueError(f'meses_por_shard debe ser al menos 1 (es {meses_por_shard})')
+    shards = []
+    inicio = desde
+    while inicio <= hasta:
+        mes = inicio.month - 1 + meses_por_shard
+        siguiente = datetime(inicio.year + mes // 12, mes % 12 + 1, 1)
+        fin = min(hasta, siguiente - timedelta(days=1))
+        shards.append({'id': f'{len(shards):03d}', 'desde': _texto(inicio), 'hasta': _texto(fin)})
+        inicio = siguiente
+    return shards
+
+
+def _fechas_shard(shard):
+    actual, fin = _fecha(shard['desde']), _fecha(shard['hasta'])
+    while actual <= fin:
+        yield _texto(actual)
+        actual += timedelta(days=1)
+
+
+class EjecucionShards:
+    """Backfill de un rango largo en shards de meses, con varios spiders en paralelo
+
+    El estado (shards y su resultado) vive en <salida>/.estado/estado.json y cada
+    shard lleva su propio manifiesto: relanzar el mismo comando salta los shards
+    completos y, en los fallidos, solo vuelve a pedir las fechas que fallaron.
+    """
+
+    def __init__(self, salida, desde, hasta, meses_por_shard=6, procesos=None, intervalo=3.0,
+                 args_spider=None, ajustes=None, reiniciar=False):
+        self.salida = salida
+        self.carpeta_estado = os.path.join(salida, '.estado')
+        self.ruta_estado = os.path.join(self.carpeta_estado, 'estado.json')
+        self.procesos = max(1, procesos or os.cpu_count() or 1)
+        self.intervalo = intervalo
+        self.args_spider = args_spider or {}
+        self.ajustes = ajustes or {}
+        os.makedirs(self.carpeta_estado, exist_ok=True)
+
+        self.estado = self._cargar()
+        if hasta is None:
+            # Sin --hasta, un reintento sigue con el rango con el que se empezó (no con el nuevo 'hoy')
+            hasta = _fecha(self.estado['parametros']['hasta']) if self.estado and not reiniciar else datetime.now()
+        parametros = {'desde': _texto(desde), 'hasta': _texto(hasta), 'meses_por_shard': meses_por_shard}
+        if self.estado is None or reiniciar:
+            self.estado = {'parametros': parametros, 'shards': dividir_en_shards(desde, hasta, meses_por_shard)}
+            for shard in self.estado['shards']:
+                shard.update({'estado': 'pendiente', 'intentos': 0})
+            self._guardar()
+        elif self.estado['parametros'] != parametros:
+            raise ValueError(f'{self.ruta_estado} es de otro rango ({self.estado["parametros"]}); usa --reiniciar para empezar de nuevo')
+
+    def _cargar(self):
+        if not os.path.exists(self.ruta_estado):
+            return None
+        with open(self.ruta_estado, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _guardar(self):
+        temporal = f'{self.ruta_estado}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(self.estado, f, ensure_ascii=False, indent=2)
+        os.replace(temporal, self.ruta_estado)
+
+    def _ruta(self, shard, extension):
+        return os.path.join(self.carpeta_estado, f'shard_{shard["id"]}.{extension}')
+
+    def _comando(self, shard, activos):
+        # Presupuesto de cortesía global: entre todos los shards, una petición cada `intervalo` segundos
+        retardo = self.intervalo * activos
+        args = {'fecha_inicio': shard['desde'], 'fecha_fin': shard['hasta'], 'output_dir': self.salida,
+                'manifiesto': self._ruta(shard, 'manifiesto.jsonl')}
+        args.update(self.args_spider)
+        ajustes = {'DOWNLOAD_DELAY': retardo, 'ADAPTATIVO_RETARDO_MIN': retardo,
+                   'CONCURRENT_REQUESTS_PER_DOMAIN': 1, 'LOG_FILE': self._ruta(shard, 'log')}
+        ajustes.update(self.ajustes)
+
+        comando = [sys.executable, '-m', 'scrapy', 'runspider', os.path.join(CARPETA, 'scrapy_carburantes_simple.py')]
+        for clave, valor in args.items():
+            comando += ['-a', f'{clave}={valor}']
+        for clave, valor in ajustes.items():
+            comando += ['-s', f'{clave}={valor}']
+        return comando
+
+    def _revisar(self, shard, codigo):
+        """Dar por bueno un shard solo si el spider terminó bien y todas sus fechas quedaron resueltas"""
+        manifiesto = ManifiestoDescargas(self._ruta(shard, 'manifiesto.jsonl'))
+        fechas = list(_fechas_shard(shard))
+        resueltas = [f for f in fechas if manifiesto.registros.get(f, {}).get('status') in ESTADOS_TERMINADOS]
+        shard['codigo_salida'] = codigo
+        shard['dias_ok'] = len(resueltas)
+        shard['dias_fallidos'] = len(fechas) - len(resueltas)
+        shard['estado'] = 'completo' if codigo == 0 and len(resueltas) == len(fechas) else 'fallido'
+
+    def ejecutar(self):
+        """Lanzar los shards pendientes o fallidos, como mucho `procesos` a la vez"""
+        cola = [s for s in self.estado['shards'] if s['estado'] != 'completo']
+        total = len(self.estado['shards'])
+        print(f'🧩 {len(cola)} de {total} shards por hacer, {self.procesos} en paralelo '
+              f'(una petición cada {self.intervalo}s en total)')
+        en_curso = {}
+        while cola or en_curso:
+            while cola and len(en_curso) < self.procesos:
+                shard = cola.pop(0)
+                activos = min(self.procesos, len(en_curso) + 1 + len(cola))
+                shard['intentos'] += 1
+                shard['estado'] = 'en_curso'
+                proceso = subprocess.Popen(self._comando(shard, activos), cwd=os.getcwd(), env=entorno_con_carpeta(),
+                                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                en_curso[proceso] = shard
+                self._guardar()
+                print(f'🚀 Shard {shard["id"]}: {shard["desde"]} → {shard["hasta"]} (intento {shard["intentos"]})')
+
+            time.sleep(1)
+            for proceso in [p for p in en_curso if p.poll() is not None]:
+                shard = en_curso.pop(proceso)
+                self._revisar(shard, proceso.returncode)
+                self._guardar()
+                icono = '✅' if shard['estado'] == 'completo' else '❌'
+                print(f'{icono} Shard {shard["id"]}: {shard["dias_ok"]} días ok, {shard["dias_fallidos"]} pendientes '
+                      f'(código {shard["codigo_salida"]}, log {self._ruta(shard, "log")})')
+        return self.fusionar()
+
+    def fusionar(self):
+        """Unir los resultados de todos los shards en <salida>/resultado.jsonl y un resumen"""
+        registros = []
+        for shard in self.estado['shards']:
+            ruta = self._ruta(shard, 'manifiesto.jsonl')
+            if os.path.exists(ruta):
+                registros.extend(ManifiestoDescargas(ruta).registros.values())
+        registros.sort(key=lambda r: _fecha(r['fecha']))
+
+        with open(os.path.join(self.salida, 'resultado.jsonl'), 'w', encoding='utf-8') as f:
+            for registro in registros:
+                f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+        por_status = {}
+        for registro in registros:
+            por_status[registro.get('status')] = por_status.get(registro.get('status'), 0) + 1
+        resumen = {
+            'parametros': self.estado['parametros'],
+            'shards': len(self.estado['shards']),
+            'shards_completos': sum(1 for s in self.estado['shards'] if s['estado'] == 'completo'),
+            'shards_fallidos': [s['id'] for s in self.estado['shards'] if s['estado'] != 'completo'],
+            'dias': len(registros),
+            'por_status': por_status,
+            'estaciones': sum(r.get('estaciones') or 0 for r in registros),
+        }
+        with open(os.path.join(self.salida, 'resumen.json'), 'w', encoding='utf-8') as f:
+            json.dump(resumen, f, ensure_ascii=False, indent=2)
+        return resumen
+
+
+def _entero_positivo(texto):
+    valor = int(texto)
+    if valor < 1:
+        raise argparse.ArgumentTypeError(f'debe ser al menos 1: {texto}')
+    return valor
+
+
+def _clave_valor(texto):
+    clave, _, valor = texto.partition('=')
+    return clave, valor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Descarga histórica sin interfaz: divide el rango en shards y lanza varios spiders en paralelo')
+    parser.add_argument('--desde', required=True, help='primera fecha (dd-mm-aaaa)')
+    parser.add_argument('--hasta', help='última fecha (dd-mm-aaaa, por defecto hoy)')
+    parser.add_argument('--salida', required=True, help='carpeta de resultados y estado')
+    parser.add_argument('--meses-por-shard', type=_entero_positivo, default=6)
+    parser.add_argument('--procesos', type=_entero_positivo, default=os.cpu_count(), help='spiders en paralelo')
+    parser.add_argument('--intervalo', type=float, default=3.0,
+                        help='segundos entre peticiones al servidor, sumando todos los spiders')
+    parser.add_argument('-a', dest='args_spider', action='append', type=_clave_valor, default=[],
+                        help='argumento del spider (clave=valor), igual que en scrapy runspider')
+    parser.add_argument('-s', dest='ajustes', action='append', type=_clave_valor, default=[],
+                        help='ajuste de Scrapy (CLAVE=valor)')
+    parser.add_argument('--reiniciar', action='store_true', help='descartar el estado anterior y empezar de cero')
+    parser.add_argument('--fusionar', action='store_true', help='solo unir los resultados ya descargados')
+    args = parser.parse_args(argv)
+
+    try:
+        ejecucion = EjecucionShards(
+            args.salida, _fecha(args.desde), _fecha(args.hasta) if args.hasta else None, args.meses_por_shard,
+            args.procesos, args.intervalo, dict(args.args_spider), dict(args.ajustes), args.reiniciar,
+        )
+    except ValueError as e:
+        print(f'❌ {e}')
+        return 2
+    resumen = ejecucion.fusionar() if args.fusionar else ejecucion.ejecutar()
+
+    print(f'📊 {resumen["dias"]} días registrados: {resumen["por_status"]}')
+    if resumen['shards_fallidos']:
+        print(f'⚠️ Shards sin completar: {", ".join(resumen["shards_fallidos"])}. '
+              'Vuelve a lanzar el mismo comando para reintentarlos (solo se piden sus fechas fallidas)')
+        return 1
+    print(f'🎉 Todos los shards completos. Resultado en {os.path.join(args.salida, "resultado.jsonl")}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+COLUMNA_FECHA = 'FechaConsulta'
+
+
+@contextmanager
+def bloqueo(ruta, espera_max=600, caducidad=1800):
+    """Cerrojo entre procesos basado en un fichero .lock creado de forma exclusiva"""
+    ruta_lock = f'{ruta}.lock'
+    inicio = time.monotonic()
+    while True:
+        try:
+            fd = os.open(ruta_lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(ruta_lock) > caducidad:
+                    os.remove(ruta_lock)
+                    continue
+            except OSError:
+                continue
+            if time.monotonic() - inicio > espera_max:
+                raise TimeoutError(f'No se pudo bloquear {ruta}')
+            time.sleep(0.05)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        try:
+            os.remove(ruta_lock)
+        except OSError:
+            pass
+
+
+def escribir_parquet_atomico(df, ruta):
+    """Escribir a un temporal y renombrar, para que un lector nunca vea un fichero a medias"""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    df.to_parquet(temporal, index=False, engine='pyarrow', compression='snappy')
+    os.replace(temporal, ruta)
+    return ruta
+
+
+class DatasetParticionado:
+    """Dataset consolidado de precios diarios, particionado por año y mes
+
+    Estructura: <raiz>/anio=AAAA/mes=MM/dia=DD.parquet, un fichero por día, de
+    modo que añadir o repetir un día solo escribe el suyo. Los meses guardados
+    antes en un único precios.parquet se siguen leyendo; al repetir uno de sus
+    días, sus filas se quitan de ese fichero.
+    """
+
+    ANTIGUO = 'precios.parquet'
+
+    def __init__(self, raiz):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError('El dataset consolidado necesita pyarrow: pip install pyarrow')
+        self.raiz = raiz
+        os.makedirs(self.raiz, exist_ok=True)
+
+    def carpeta_mes(self, fecha):
+        dia = datetime.strptime(fecha, '%d-%m-%Y')
+        return os.path.join(self.raiz, f'anio={dia.year:04d}', f'mes={dia.month:02d}')
+
+    def ruta_dia(self, fecha):
+        """Fichero de un día dd-mm-aaaa dentro de su partición mensual"""
+        return os.path.join(self.carpeta_mes(fecha), f'dia={fecha[:2]}.parquet')
+
+    def agregar_dia(self, df, fecha):
+        """Añadir (o sustituir) las filas de un día de forma atómica"""
+        df = df.copy()
+        df[COLUMNA_FECHA] = fecha
+        return self.agregar_dias(df)[0]
+
+    def agregar_dias(self, df):
+        """Añadir (o sustituir) varios días a la vez, un fichero por día
+
+        El apóstrofo que lleva 'C.P.' para Excel no se guarda.
+        """
+        if 'C.P.' in df.columns:
+            df = df.assign(**{'C.P.': df['C.P.'].astype(str).str.lstrip("'").where(df['C.P.'].notna())})
+        rutas = []
+        for fecha, grupo in df.groupby(COLUMNA_FECHA, sort=False):
+            rutas.append(escribir_parquet_atomico(grupo, self.ruta_dia(fecha)))
+        self._quitar_de_antiguos(df[COLUMNA_FECHA].unique())
+        return rutas
+
+    def _quitar_de_antiguos(self, fechas):
+        """Quitar unas fechas de los precios.parquet mensuales antiguos, si los hay, para no duplicarlas"""
+        por_mes = {}
+        for fecha in fechas:
+            por_mes.setdefault(self.carpeta_mes(fecha), []).append(fecha)
+        for carpeta, del_mes in por_mes.items():
+            ruta = os.path.join(carpeta, self.ANTIGUO)
+            if not os.path.exists(ruta):
+                continue
+            with bloqueo(ruta):
+                existente = pd.read_parquet(ruta)
+                restante = existente[~existente[COLUMNA_FECHA].isin(del_mes)]
+                if restante.empty:
+                    os.remove(ruta)
+                elif len(restante) < len(existente):
+                    escribir_parquet_atomico(restante, ruta)
+
+    def _meses(self, inicio=None, fin=None):
+        """Carpetas (año, mes, ruta) de las particiones que solapan con el rango"""
+        if not os.path.isdir(self.raiz):
+            return
+        for carpeta_anio in sorted(os.listdir(self.raiz)):
+            if not carpeta_anio.startswith('anio='):
+                continue
+            anio = int(carpeta_anio.split('=', 1)[1])
+            for carpeta_mes in sorted(os.listdir(os.path.join(self.raiz, carpeta_anio))):
+                if not carpeta_mes.startswith('mes='):
+                    continue
+                mes = int(carpeta_mes.split('=', 1)[1])
+                if inicio and (anio, mes) < (inicio.year, inicio.month):
+                    continue
+                if fin and (anio, mes) > (fin.year, fin.month):
+                    continue
+                yield anio, mes, os.path.join(self.raiz, carpeta_anio, carpeta_mes)
+
+    def _archivos(self, desde=None, hasta=None):
+        """(ruta, día) de los ficheros del rango; el día es None en los mensuales antiguos"""
+        inicio = datetime.strptime(desde, '%d-%m-%Y') if desde else None
+        fin = datetime.strptime(hasta, '%d-%m-%Y') if hasta else None
+        for anio, mes, carpeta in self._meses(inicio, fin):
+            for archivo in sorted(os.listdir(carpeta)):
+                if archivo == self.ANTIGUO:
+                    yield os.path.join(carpeta, archivo), None
+                elif archivo.startswith('dia=') and archivo.endswith('.parquet'):
+                    dia = datetime(anio, mes, int(archivo[4:6]))
+                    if (inicio is None or dia >= inicio) and (fin is None or dia <= fin):
+                        yield os.path.join(carpeta, archivo), dia
+
+    def particiones(self, desde=None, hasta=None):
+        """Ficheros del rango [desde, hasta] (dd-mm-aaaa): los de cada día y los mensuales antiguos que solapan"""
+        return [ruta for ruta, _ in self._archivos(desde, hasta)]
+
+    def leer(self, desde=None, hasta=None, columnas=None):
+        """Leer solo los ficheros y días del rango pedido"""
+        if columnas is not None and COLUMNA_FECHA not in columnas:
+            columnas = list(columnas) + [COLUMNA_FECHA]
+        inicio = datetime.strptime(desde, '%d-%m-%Y') if desde else None
+        fin = datetime.strptime(hasta, '%d-%m-%Y') if hasta else None
+
+        partes = []
+        for ruta in self.particiones(desde, hasta):
+            filtros = None
+            if os.path.basename(ruta) == self.ANTIGUO and (inicio or fin):
+                # Dentro de un fichero mensual solo se leen los días del rango que caen en ese mes
+                anio = int(ruta.split('anio=')[1][:4])
+                mes = int(ruta.split('mes=')[1][:2])
+                primero = datetime(anio, mes, 1)
+                ultimo = datetime(anio + mes // 12, mes % 12 + 1, 1) - timedelta(days=1)
+                dias = pd.date_range(max(primero, inicio or primero), min(ultimo, fin or ultimo))
+                filtros = [(COLUMNA_FECHA, 'in', list(dias.strftime('%d-%m-%Y')))]
+            partes.append(pd.read_parquet(ruta, columns=columnas, filters=filtros))
+
+        if not partes:
+            return pd.DataFrame(columns=columnas or [])
+        return pd.concat(partes, ignore_index=True, sort=False)
+
+    def fechas(self):
+        """Fechas (dd-mm-aaaa) presentes en el dataset, en orden cronológico"""
+        fechas = set()
+        for ruta, dia in self._archivos():
+            if dia is None:
+                fechas.update(pd.read_parquet(ruta, columns=[COLUMNA_FECHA])[COLUMNA_FECHA].unique())
+            else:
+                fechas.add(dia.strftime('%d-%m-%Y'))
+        return sorted(fechas, key=lambda f: datetime.strptime(f, '%d-%m-%Y'))
@@ -0,0 +1,260 @@
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from dataset_carburantes import bloqueo, escribir_parquet_atomico
+
+CLAVE = 'IDEESS'
+COLUMNAS_DEL_DIA = ['FechaConsulta', 'FechaDescarga']
+
+
+def _orden(fecha):
+    return datetime.strptime(fecha, '%d-%m-%Y')
+
+
+def _filtro_clave(ruta, ideess):
+    """Filtro de parquet por IDEESS con el tipo con que está guardada la columna
+
+    Los meses guardados desde el esquema común la tienen como Int32; los anteriores, como texto.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tipo = pq.read_schema(ruta).field(CLAVE).type
+    valor = int(ideess) if pa.types.is_integer(tipo) else str(ideess)
+    return [(CLAVE, '==', valor)]
+
+
+def aplicar_delta(estado, bajas, filas):
+    """Pasar del estado de un día al del siguiente: quitar las bajas y sustituir/añadir las filas cambiadas"""
+    quitar = estado.index.intersection(pd.Index(bajas).append(filas.index))
+    estado = estado.drop(index=quitar)
+    if filas.empty:
+        return estado
+    return pd.concat([estado, filas.reindex(columns=estado.columns.union(filas.columns, sort=False))])
+
+
+def calcular_delta(estado, actual, columnas):
+    """Comparar el estado acumulado con un día completo y devolver (bajas, filas nuevas o cambiadas)"""
+    bajas = estado.index.difference(actual.index)
+    comunes = actual.index.intersection(estado.index)
+    altas = actual.index.difference(estado.index)
+
+    anterior = estado.reindex(index=comunes, columns=columnas)
+    nuevo = actual.loc[comunes, columnas]
+    # Con tipos que admiten <NA> la comparación da <NA>, que cuenta como distinto
+    iguales = ((anterior == nuevo).fillna(False) | (anterior.isna() & nuevo.isna())).all(axis=1)
+    cambiadas = comunes[~iguales.values]
+
+    return list(bajas), actual.loc[altas.append(cambiadas), columnas]
+
+
+class AlmacenDeltas:
+    """Precios guardados como una foto completa por mes más los cambios de cada día
+
+    Estructura por mes (<raiz>/anio=AAAA/mes=MM/):
+    - keyframe.parquet: el primer día guardado del mes, completo.
+    - deltas.parquet: para cada día siguiente, las estaciones nuevas o con algún
+      valor distinto al día anterior (fila completa) y las que desaparecen (baja).
+      Los días que llegan en orden se añaden al final sin recalcular los demás.
+    - dias.json: días guardados, con sus columnas y su FechaDescarga.
+    """
+
+    def __init__(self, raiz):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError('El almacén de deltas necesita pyarrow: pip install pyarrow')
+        self.raiz = raiz
+        os.makedirs(self.raiz, exist_ok=True)
+
+    def carpeta_mes(self, fecha):
+        dia = _orden(fecha)
+        return os.path.join(self.raiz, f'anio={dia.year:04d}', f'mes={dia.month:02d}')
+
+    def _leer_dias(self, carpeta):
+        ruta = os.path.join(carpeta, 'dias.json')
+        if not os.path.exists(ruta):
+            return {}
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _iterar_mes(self, carpeta, hasta=None):
+        """Reconstruir en orden los días guardados de un mes: produce (fecha, info, estado)"""
+        dias = self._leer_dias(carpeta)
+        if not dias:
+            return
+        estado = pd.read_parquet(os.path.join(carpeta, 'keyframe.parquet')).set_index(CLAVE)
+        ruta_deltas = os.path.join(carpeta, 'deltas.parquet')
+        deltas = pd.read_parquet(ruta_deltas) if os.path.exists(ruta_deltas) else pd.DataFrame(columns=['fecha', 'baja', CLAVE])
+        por_dia = dict(tuple(deltas.groupby('fecha', sort=False)))
+
+        for i, fecha in enumerate(sorted(dias, key=_orden)):
+            if hasta is not None and _orden(fecha) > _orden(hasta):
+                return
+            if i > 0 and fecha in por_dia:
+                cambios = por_dia[fecha]
+                bajas = cambios.loc[cambios['baja'], CLAVE].tolist()
+                filas = cambios.loc[~cambios['baja']].drop(columns=['fecha', 'baja']).set_index(CLAVE)
+                estado = aplicar_delta(estado, bajas, filas[[c for c in filas.columns if c in dias[fecha]['columnas']]])
+            yield fecha, dias[fecha], estado
+
+    @staticmethod
+    def _vista(fecha, info, estado):
+        """Convertir el estado acumulado en la tabla del día, con sus columnas originales"""
+        df = estado.reset_index()
+        for col in info['columnas']:
+            if col not in df.columns:
+                df[col] = None
+        df['FechaConsulta'] = fecha
+        df['FechaDescarga'] = info.get('FechaDescarga')
+        return df[info['columnas']].sort_values(CLAVE, kind='stable').reset_index(drop=True)
+
+    def agregar_dia(self, df, fecha):
+        """Guardar (o sustituir) un día
+
+        Un día posterior al último guardado del mes solo añade su delta; uno que
+        llega fuera de orden o que ya estaba obliga a volver a codificar el mes.
+        """
+        carpeta = self.carpeta_mes(fecha)
+        os.makedirs(carpeta, exist_ok=True)
+        ruta_dias = os.path.join(carpeta, 'dias.json')
+
+        with bloqueo(ruta_dias):
+            dias = self._leer_dias(carpeta)
+            if dias and _orden(fecha) > max(_orden(f) for f in dias):
+                self._anadir_al_final(carpeta, dias, df, fecha)
+                return ruta_dias
+
+            # Días completos del mes, con el nuevo insertado o sustituido en su sitio
+            completos = {}
+            for f, info, estado in self._iterar_mes(carpeta):
+                columnas = [c for c in info['columnas'] if c != CLAVE and c not in COLUMNAS_DEL_DIA]
+                completos[f] = (info, estado[columnas])
+            nuevo = df.drop(columns=[c for c in COLUMNAS_DEL_DIA if c in df.columns]).drop_duplicates(CLAVE)
+            completos[fecha] = (self._info_dia(df), nuevo.set_index(CLAVE))
+
+            orden = sorted(completos, key=_orden)
+            primero = orden[0]
+            keyframe = completos[primero][1]
+            estado = keyframe
+            partes = []
+            for f in orden[1:]:
+                actual = completos[f][1]
+                bajas, filas = calcular_delta(estado, actual, list(actual.columns))
+                estado = aplicar_delta(estado, bajas, filas)
+                if bajas:
+                    partes.append(pd.DataFrame({'fecha': f, 'baja': True, CLAVE: bajas}))
+                if not filas.empty:
+                    partes.append(filas.reset_index().assign(fecha=f, baja=False))
+
+            escribir_parquet_atomico(keyframe.reset_index(), os.path.join(carpeta, 'keyframe.parquet'))
+            ruta_deltas = os.path.join(carpeta, 'deltas.parquet')
+            if partes:
+                deltas = pd.concat(partes, ignore_index=True, sort=False)
+                columnas = ['fecha', 'baja', CLAVE] + [c for c in deltas.columns if c not in ('fecha', 'baja', CLAVE)]
+                escribir_parquet_atomico(deltas[columnas], ruta_deltas)
+            elif os.path.exists(ruta_deltas):
+                os.remove(ruta_deltas)
+
+            self._guardar_dias(ruta_dias, {f: completos[f][0] for f in orden})
+        return ruta_dias
+
+    @staticmethod
+    def _info_dia(df):
+        return {'columnas': list(df.columns),
+                'FechaDescarga': str(df['FechaDescarga'].iloc[0]) if 'FechaDescarga' in df.columns and len(df) else None}
+
+    @staticmethod
+    def _guardar_dias(ruta_dias, dias):
+        temporal = f'{ruta_dias}.{os.getpid()}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(dias, f, ensure_ascii=False)
+        os.replace(temporal, ruta_dias)
+
+    def _anadir_al_final(self, carpeta, dias, df, fecha):
+        """Añadir a deltas.parquet solo lo que cambia respecto al último día guardado, sin tocar el resto del mes"""
+        ultimo = max(dias, key=_orden)
+        anterior = self.dia(ultimo).drop(columns=[c for c in COLUMNAS_DEL_DIA if c in dias[ultimo]['columnas']])
+        actual = df.drop(columns=[c for c in COLUMNAS_DEL_DIA if c in df.columns]).drop_duplicates(CLAVE).set_index(CLAVE)
+        bajas, filas = calcular_delta(anterior.set_index(CLAVE), actual, list(actual.columns))
+
+        partes = []
+        if bajas:
+            partes.append(pd.DataFrame({'fecha': fecha, 'baja': True, CLAVE: bajas}))
+        if not filas.empty:
+            partes.append(filas.reset_index().assign(fecha=fecha, baja=False))
+        if partes:
+            ruta_deltas = os.path.join(carpeta, 'deltas.parquet')
+            if os.path.exists(ruta_deltas):
+                partes.insert(0, pd.read_parquet(ruta_deltas))
+            deltas = pd.concat(partes, ignore_index=True, sort=False)
+            columnas = ['fecha', 'baja', CLAVE] + [c for c in deltas.columns if c not in ('fecha', 'baja', CLAVE)]
+            escribir_parquet_atomico(deltas[columnas], ruta_deltas)
+
+        dias[fecha] = self._info_dia(df)
+        self._guardar_dias(os.path.join(carpeta, 'dias.json'), dias)
+
+    def dia(self, fecha):
+        """Reconstruir la tabla completa de un día: keyframe más el último cambio de cada estación hasta ese día"""
+        carpeta = self.carpeta_mes(fecha)
+        dias = self._leer_dias(carpeta)
+        if fecha not in dias:
+            return None
+        orden = sorted(dias, key=_orden)
+        anteriores = orden[1:orden.index(fecha) + 1]
+
+        estado = pd.read_parquet(os.path.join(carpeta, 'keyframe.parquet')).set_index(CLAVE)
+        ruta_deltas = os.path.join(carpeta, 'deltas.parquet')
+        if anteriores and os.path.exists(ruta_deltas):
+            cambios = pd.read_parquet(ruta_deltas, filters=[('fecha', 'in', anteriores)])
+            # Solo cuenta el último cambio de cada estación (los deltas se guardan en orden de día)
+            cambios = cambios.drop_duplicates(CLAVE, keep='last')
+            for f in cambios['fecha'].unique():
+                sobran = [c for c in cambios.columns if c not in ('fecha', 'baja', CLAVE) and c not in dias[f]['columnas']]
+                if sobran:
+                    cambios.loc[cambios['fecha'] == f, sobran] = None
+            filas = cambios.loc[~cambios['baja']].drop(columns=['fecha', 'baja']).set_index(CLAVE)
+            estado = aplicar_delta(estado, cambios.loc[cambios['baja'], CLAVE].tolist(), filas)
+        return self._vista(fecha, dias[fecha], estado)
+
+    def fechas(self):
+        """Fechas guardadas, en orden cronológico"""
+        fechas = []
+        for raiz, _, archivos in os.walk(self.raiz):
+            if 'dias.json' in archivos:
+                fechas.extend(self._leer_dias(raiz))
+        return sorted(fechas, key=_orden)
+
+    def historial_estacion(self, ideess, desde=None, hasta=None):
+        """Una fila por día guardado con los datos de una estación, siguiendo solo sus cambios"""
+        filas = []
+        meses = sorted({self.carpeta_mes(f) for f in self.fechas()
+                        if (desde is None or _orden(f) >= _orden(desde)) and (hasta is None or _orden(f) <= _orden(hasta))})
+        for carpeta in meses:
+            dias = self._leer_dias(carpeta)
+            ruta_keyframe = os.path.join(carpeta, 'keyframe.parquet')
+            keyframe = pd.read_parquet(ruta_keyframe, filters=_filtro_clave(ruta_keyframe, ideess))
+            actual = keyframe.iloc[0].to_dict() if len(keyframe) else None
+
+            ruta_deltas = os.path.join(carpeta, 'deltas.parquet')
+            cambios = {}
+            if os.path.exists(ruta_deltas):
+                for _, cambio in pd.read_parquet(ruta_deltas, filters=_filtro_clave(ruta_deltas, ideess)).iterrows():
+                    cambios[cambio['fecha']] = cambio
+
+            for i, fecha in enumerate(sorted(dias, key=_orden)):
+                if i > 0 and fecha in cambios:
+                    cambio = cambios[fecha]
+                    actual = None if cambio['baja'] else cambio.drop(['fecha', 'baja']).to_dict()
+                if actual is None:
+                    continue
+                if (desde and _orden(fecha) < _orden(desde)) or (hasta and _orden(fecha) > _orden(hasta)):
+                    continue
+                fila = {col: actual.get(col) for col in dias[fecha]['columnas']}
+                fila['FechaConsulta'] = fecha
+                fila['FechaDescarga'] = dias[fecha].get('FechaDescarga')
+                filas.append(fila)
+        return pd.DataFrame(filas)
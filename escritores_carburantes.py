@@ -0,0 +1,93 @@
+from esquema_carburantes import a_float64
+
+
+FILAS_POR_BLOQUE = 5000
+
+
+def filas_sin_nulos(df, filas_por_bloque=FILAS_POR_BLOQUE):
+    """Iterar las filas de un DataFrame como listas, con None en los valores vacíos
+
+    Se convierte un bloque de filas cada vez, así que la copia en objetos de Python
+    no pasa de `filas_por_bloque` filas aunque el DataFrame sea grande.
+    """
+    flotantes = [col for col in df.columns if df[col].dtype in ('float32', 'Float32')]
+    for inicio in range(0, len(df), filas_por_bloque):
+        bloque = df.iloc[inicio:inicio + filas_por_bloque]
+        # Los float32 pasan a float64 con su valor decimal (1.459 y no 1.45899999...)
+        if flotantes:
+            bloque = bloque.assign(**{col: a_float64(bloque[col]) for col in flotantes})
+        valores = bloque.astype(object).where(bloque.notna(), None)
+        for fila in valores.itertuples(index=False, name=None):
+            yield list(fila)
+
+
+class EscritorXlsx:
+    """Excel en streaming: fila a fila y con memoria constante"""
+
+    extension = 'xlsx'
+
+    def escribir(self, df, ruta):
+        try:
+            import xlsxwriter
+        except ImportError:
+            xlsxwriter = None
+
+        if xlsxwriter is not None:
+            libro = xlsxwriter.Workbook(ruta, {'constant_memory': True, 'nan_inf_to_errors': True})
+            hoja = libro.add_worksheet('Sheet1')
+            hoja.write_row(0, 0, [str(col) for col in df.columns])
+            for i, fila in enumerate(filas_sin_nulos(df), 1):
+                hoja.write_row(i, 0, fila)
+            libro.close()
+        else:
+            from openpyxl import Workbook
+            libro = Workbook(write_only=True)
+            hoja = libro.create_sheet('Sheet1')
+            hoja.append([str(col) for col in df.columns])
+            for fila in filas_sin_nulos(df):
+                hoja.append(fila)
+            libro.save(ruta)
+        return ruta
+
+
+class EscritorCsv:
+    """CSV plano en UTF-8"""
+
+    extension = 'csv'
+
+    def escribir(self, df, ruta):
+        df.to_csv(ruta, index=False, encoding='utf-8')
+        return ruta
+
+
+class EscritorParquet:
+    """Parquet columnar (requiere pyarrow)"""
+
+    extension = 'parquet'
+
+    def __init__(self):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("El formato 'parquet' necesita pyarrow: pip install pyarrow")
+
+    def escribir(self, df, ruta):
+        df.to_parquet(ruta, index=False, engine='pyarrow', compression='snappy')
+        return ruta
+
+
+ESCRITORES = {
+    'xlsx': EscritorXlsx,
+    'csv': EscritorCsv,
+    'parquet': EscritorParquet,
+}
+
+EXTENSIONES_SALIDA = tuple(f'.{formato}' for formato in ESCRITORES)
+
+
+def crear_escritor(formato='xlsx'):
+    """Instanciar el escritor para el formato pedido (xlsx, csv o parquet)"""
+    formato = (formato or 'xlsx').strip().lower()
+    if formato not in ESCRITORES:
+        raise ValueError(f"Formato '{formato}' no soportado. Usa uno de: {', '.join(ESCRITORES)}")
+    return ESCRITORES[formato]()
@@ -0,0 +1,217 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from esquema_carburantes import a_float64
+
+RADIO_TIERRA_KM = 6371.0088
+KM_POR_GRADO = RADIO_TIERRA_KM * np.pi / 180
+COLUMNAS_ESTACION = ['IDEESS', 'Rótulo', 'Dirección', 'Localidad', 'Municipio', 'Provincia']
+
+
+def distancia_km(lat, lon, lats, lons):
+    """Distancia haversine desde un punto a un array de puntos (grados), en km"""
+    lat, lon, lats, lons = map(np.radians, (lat, lon, lats, lons))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _columna_coordenada(df, nombre):
+    for col in df.columns:
+        if nombre in col.lower():
+            return col
+    raise KeyError(f'No hay columna de {nombre} en los datos')
+
+
+class IndiceEspacial:
+    """Rejilla de celdas (en grados) sobre las estaciones de un día, para búsquedas por radio y k vecinas
+
+    Las estaciones se ordenan por celda, así que todas las celdas de una fila de la
+    rejilla son un tramo contiguo: una consulta solo mira unos pocos tramos y calcula
+    la distancia exacta (haversine) a esos candidatos.
+    """
+
+    def __init__(self, df, celda_km=5.0):
+        lat = pd.to_numeric(df[_columna_coordenada(df, 'latitud')], errors='coerce').to_numpy(dtype='float64')
+        lon = pd.to_numeric(df[_columna_coordenada(df, 'longitud')], errors='coerce').to_numpy(dtype='float64')
+        validas = ~(np.isnan(lat) | np.isnan(lon))
+        df = df[validas].reset_index(drop=True)
+        lat, lon = lat[validas], lon[validas]
+
+        self.celda = celda_km / KM_POR_GRADO
+        self.lat0, self.lon0 = lat.min(initial=0.0), lon.min(initial=0.0)
+        fila = ((lat - self.lat0) // self.celda).astype('int64')
+        columna = ((lon - self.lon0) // self.celda).astype('int64')
+        self.n_columnas = int(columna.max(initial=0)) + 1
+        self.n_filas = int(fila.max(initial=0)) + 1
+
+        clave = fila * self.n_columnas + columna
+        orden = np.argsort(clave, kind='stable')
+        self.claves = clave[orden]
+        self.lat, self.lon = lat[orden], lon[orden]
+        self.estaciones = df.iloc[orden][[c for c in COLUMNAS_ESTACION if c in df.columns]].reset_index(drop=True)
+
+        # Precios como float por combustible (NaN si la estación no lo vende)
+        self.precios = {}
+        for col in df.columns:
+            if col.startswith('Precio '):
+                valores = df[col]
+                if not pd.api.types.is_numeric_dtype(valores):
+                    valores = valores.astype(str).str.strip().str.replace(',', '.', regex=False)
+                self.precios[col[len('Precio '):].strip().lower()] = a_float64(valores)[orden]
+
+    def __len__(self):
+        return len(self.claves)
+
+    def _precio(self, combustible):
+        try:
+            return self.precios[combustible.strip().lower()]
+        except KeyError:
+            raise KeyError(f'Combustible sin precios en el índice: {combustible}')
+
+    def _candidatos(self, lat, lon, radio_km):
+        """Posiciones de las estaciones en las celdas que cubren el círculo (un tramo por fila de la rejilla)"""
+        dlat = radio_km / KM_POR_GRADO
+        coseno = np.cos(np.radians(min(abs(lat) + dlat, 89.9)))
+        dlon = radio_km / (KM_POR_GRADO * coseno)
+        fila0 = max(int((lat - dlat - self.lat0) // self.celda), 0)
+        fila1 = min(int((lat + dlat - self.lat0) // self.celda), self.n_filas - 1)
+        col0 = max(int((lon - dlon - self.lon0) // self.celda), 0)
+        col1 = min(int((lon + dlon - self.lon0) // self.celda), self.n_columnas - 1)
+        if fila0 > fila1 or col0 > col1:
+            return np.empty(0, dtype='int64')
+
+        filas = np.arange(fila0, fila1 + 1) * self.n_columnas
+        inicios = np.searchsorted(self.claves, filas + col0, side='left')
+        finales = np.searchsorted(self.claves, filas + col1, side='right')
+        return np.concatenate([np.arange(i, f) for i, f in zip(inicios, finales) if f > i] or [np.empty(0, dtype='int64')])
+
+    def _radio(self, lat, lon, radio_km, combustible=None, limite=None):
+        """Posiciones y distancias dentro del radio, por precio (con combustible) o por distancia"""
+        posiciones = self._candidatos(lat, lon, radio_km)
+        distancias = distancia_km(lat, lon, self.lat[posiciones], self.lon[posiciones])
+        dentro = distancias <= radio_km
+        posiciones, distancias = posiciones[dentro], distancias[dentro]
+        if combustible is not None:
+            precios = self._precio(combustible)[posiciones]
+            vende = ~np.isnan(precios)
+            posiciones, distancias, precios = posiciones[vende], distancias[vende], precios[vende]
+            orden = np.lexsort((distancias, precios))
+        else:
+            orden = np.argsort(distancias, kind='stable')
+        orden = orden[:limite]
+        return posiciones[orden], distancias[orden]
+
+    def _cercanas(self, lat, lon, k, combustible=None, radio_max_km=None):
+        """Las k estaciones más cercanas (que vendan el combustible), ampliando el radio hasta tenerlas"""
+        radio = self.celda * KM_POR_GRADO
+        while True:
+            if radio_max_km is not None:
+                radio = min(radio, radio_max_km)
+            posiciones = self._candidatos(lat, lon, radio)
+            completo = len(posiciones) == len(self)
+            distancias = distancia_km(lat, lon, self.lat[posiciones], self.lon[posiciones])
+            if combustible is not None:
+                vende = ~np.isnan(self._precio(combustible)[posiciones])
+                posiciones, distancias = posiciones[vende], distancias[vende]
+            # Con k estaciones dentro del radio ya no puede haber otra más cerca fuera de él
+            if (distancias <= radio).sum() >= k or completo or radio == radio_max_km:
+                if radio_max_km is not None:
+                    dentro = distancias <= radio_max_km
+                    posiciones, distancias = posiciones[dentro], distancias[dentro]
+                orden = np.argsort(distancias, kind='stable')[:k]
+                return posiciones[orden], distancias[orden]
+            radio *= 2
+
+    def _tabla(self, resultados, combustible=None):
+        """Construir un único DataFrame con los resultados de una o varias consultas"""
+        if resultados:
+            posiciones = np.concatenate([p for p, _ in resultados])
+            distancias = np.concatenate([d for _, d in resultados])
+            consulta = np.repeat(np.arange(len(resultados)), [len(p) for p, _ in resultados])
+        else:
+            posiciones, distancias, consulta = (np.empty(0, dtype='int64'), np.empty(0), np.empty(0, dtype='int64'))
+        tabla = self.estaciones.iloc[posiciones].reset_index(drop=True)
+        tabla.insert(0, 'consulta', consulta)
+        tabla['distancia_km'] = distancias.round(3)
+        if combustible is not None:
+            tabla[f'Precio {combustible}'] = self._precio(combustible)[posiciones]
+        return tabla
+
+    def radio(self, lat, lon, radio_km, combustible=None, limite=None):
+        """Estaciones a menos de radio_km de un punto; con combustible, solo las que lo venden y de más barata a más cara"""
+        return self._tabla([self._radio(lat, lon, radio_km, combustible, limite)], combustible).drop(columns='consulta')
+
+    def cercanas(self, lat, lon, k=5, combustible=None, radio_max_km=None):
+        """Las k estaciones más cercanas a un punto (opcionalmente, solo las que venden un combustible)"""
+        return self._tabla([self._cercanas(lat, lon, k, combustible, radio_max_km)], combustible).drop(columns='consulta')
+
+    def radio_lote(self, puntos, radio_km, combustible=None, limite=None):
+        """radio() para muchos puntos (lat, lon) a la vez: una tabla con la columna 'consulta' (posición del punto)"""
+        return self._tabla([self._radio(lat, lon, radio_km, combustible, limite) for lat, lon in puntos], combustible)
+
+    def cercanas_lote(self, puntos, k=5, combustible=None, radio_max_km=None):
+        """cercanas() para muchos puntos (lat, lon) a la vez, en una sola tabla con la columna 'consulta'"""
+        return self._tabla([self._cercanas(lat, lon, k, combustible, radio_max_km) for lat, lon in puntos], combustible)
+
+
+def radio_fuerza_bruta(df, lat, lon, radio_km, combustible, limite=None):
+    """Referencia sin índice: recorrer todo el DataFrame con pandas en cada consulta"""
+    lats = pd.to_numeric(df[_columna_coordenada(df, 'latitud')], errors='coerce')
+    lons = pd.to_numeric(df[_columna_coordenada(df, 'longitud')], errors='coerce')
+    precios = pd.to_numeric(df[f'Precio {combustible}'].astype(str).str.replace(',', '.', regex=False), errors='coerce')
+    resultado = df.assign(distancia_km=distancia_km(lat, lon, lats.to_numpy(), lons.to_numpy()), precio=precios)
+    resultado = resultado[(resultado['distancia_km'] <= radio_km) & resultado['precio'].notna()]
+    return resultado.sort_values(['precio', 'distancia_km'], kind='stable').head(limite)
+
+
+def benchmark(df, n_consultas=1000, radio_km=10.0, combustible='Gasoleo A', limite=5, semilla=0):
+    """Comparar el índice con la búsqueda por fuerza bruta sobre puntos aleatorios cerca de las estaciones"""
+    inicio = time.perf_counter()
+    indice = IndiceEspacial(df)
+    construccion = time.perf_counter() - inicio
+
+    rng = np.random.default_rng(semilla)
+    elegidas = rng.integers(0, len(indice), n_consultas)
+    puntos = list(zip(indice.lat[elegidas] + rng.normal(0, 0.05, n_consultas),
+                      indice.lon[elegidas] + rng.normal(0, 0.05, n_consultas)))
+
+    inicio = time.perf_counter()
+    lote = indice.radio_lote(puntos, radio_km, combustible, limite)
+    tiempo_indice = time.perf_counter() - inicio
+
+    muestra = puntos[:max(1, min(n_consultas, 200))]
+    inicio = time.perf_counter()
+    referencia = [radio_fuerza_bruta(df, lat, lon, radio_km, combustible, limite) for lat, lon in muestra]
+    tiempo_bruta = (time.perf_counter() - inicio) * n_consultas / len(muestra)
+
+    coinciden = all(
+        lote.loc[lote['consulta'] == i, 'IDEESS'].astype(str).tolist() == ref['IDEESS'].astype(str).tolist()
+        for i, ref in enumerate(referencia)
+    )
+    return {
+        'estaciones': len(indice),
+        'consultas': n_consultas,
+        'construccion_s': round(construccion, 4),
+        'indice_s': round(tiempo_indice, 4),
+        'fuerza_bruta_s': round(tiempo_bruta, 4),
+        'aceleracion': round(tiempo_bruta / tiempo_indice, 1) if tiempo_indice else None,
+        'resultados_iguales': coinciden,
+    }
+
+
+if __name__ == '__main__':
+    # Uso: python espacial_carburantes.py precios_01_01_2024.xlsx [combustible] [radio_km]
+    ruta = sys.argv[1]
+    if ruta.endswith('.parquet'):
+        datos = pd.read_parquet(ruta)
+    elif ruta.endswith('.csv'):
+        datos = pd.read_csv(ruta, dtype={'IDEESS': str})
+    else:
+        datos = pd.read_excel(ruta, dtype={'IDEESS': str})
+    combustible = sys.argv[2] if len(sys.argv) > 2 else 'Gasoleo A'
+    radio_km = float(sys.argv[3]) if len(sys.argv) > 3 else 10.0
+    for clave, valor in benchmark(datos, radio_km=radio_km, combustible=combustible).items():
+        print(f'{clave}: {valor}')
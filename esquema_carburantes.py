@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+# Tipos de las columnas numéricas de un día limpio; el resto se queda como texto
+ESQUEMA = {
+    'IDEESS': 'Int32',
+    'IDMunicipio': 'Int32',
+    'IDProvincia': 'Int32',
+    'IDCCAA': 'Int32',
+    'Latitud': 'float64',
+    'Longitud (WGS84)': 'float64',
+    '% BioEtanol': 'Float32',
+    '% Éster metílico': 'Float32',
+}
+ESQUEMA_PREFIJOS = {
+    'Precio ': 'Float32',
+}
+CENTINELAS = ['', '#####', 'nan', 'None']
+# Decimales de las columnas Float32: precios con 3 y porcentajes con 1
+DECIMALES_FLOAT32 = 3
+
+
+def tipo_columna(nombre):
+    """Tipo del esquema para una columna, o None si no es numérica"""
+    if nombre in ESQUEMA:
+        return ESQUEMA[nombre]
+    for prefijo, tipo in ESQUEMA_PREFIJOS.items():
+        if nombre.startswith(prefijo):
+            return tipo
+    return None
+
+
+def aplicar_esquema(df):
+    """Convertir todas las columnas numéricas del esquema en una sola pasada
+
+    Las columnas que llegan como texto ('1,459', '#####', '') se apilan en una única
+    serie, se decodifican de una vez y se reparten; después cada una toma su tipo
+    (Float32 / Int32 admiten vacíos como <NA>).
+    """
+    tipos = {col: tipo for col in df.columns if (tipo := tipo_columna(col))}
+    texto = [col for col in tipos if not pd.api.types.is_numeric_dtype(df[col])]
+    if texto:
+        n = len(df)
+        valores = pd.concat([df[col] for col in texto], ignore_index=True).astype(str).str.strip()
+        valores = valores.str.replace(',', '.', regex=False).mask(lambda v: v.isin(CENTINELAS))
+        numeros = pd.to_numeric(valores, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        for i, col in enumerate(texto):
+            df[col] = numeros[i * n:(i + 1) * n]
+
+    for col, tipo in tipos.items():
+        if tipo.startswith('Int'):
+            # Los ids llegan como '0012' o 12.0; cualquier valor no entero se queda vacío
+            serie = pd.to_numeric(df[col], errors='coerce').astype('Float64')
+            df[col] = serie.where(serie.round() == serie).round().astype(tipo)
+        elif df[col].dtype != tipo:
+            df[col] = df[col].astype(tipo)
+    return df
+
+
+def a_float64(serie):
+    """Valores numéricos como array float64 con NaN en los vacíos, sin los restos binarios de float32
+
+    1.459 guardado en float32 vale 1.45899999...; redondear a los decimales con que
+    llegan los precios (3) devuelve exactamente 1.459.
+    """
+    if serie.dtype in ('float32', 'Float32'):
+        return np.round(serie.to_numpy(dtype='float32', na_value=np.nan).astype('float64'), DECIMALES_FLOAT32)
+    return pd.to_numeric(serie, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
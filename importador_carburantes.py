@@ -0,0 +1,335 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from xml.etree.ElementTree import ParseError, iterparse
+
+import pandas as pd
+
+from dataset_carburantes import COLUMNA_FECHA, DatasetParticionado
+from esquema_carburantes import aplicar_esquema
+
+PATRON_CARPETA = re.compile(r'^(sedeapp_carburantes_|carburantes_scrapy_)', re.IGNORECASE)
+PATRON_ARCHIVO = re.compile(r'^precios_(\d{2})_(\d{2})_(\d{4})\.(xlsx|csv|parquet)$')
+
+# Columnas de estación en el orden de la API; los precios van donde venían, tras 'Municipio'
+COLUMNAS_ESTACION = [
+    'C.P.', 'Dirección', 'Horario', 'Latitud', 'Localidad', 'Longitud (WGS84)', 'Margen', 'Municipio',
+    'Provincia', 'Remisión', 'Rótulo', 'Tipo Venta', '% BioEtanol', '% Éster metílico',
+    'IDEESS', 'IDMunicipio', 'IDProvincia', 'IDCCAA',
+]
+
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+
+def descubrir(raices):
+    """Buscar los precios_dd_mm_aaaa.* de las carpetas SEDEApp_Carburantes_* / carburantes_scrapy_*
+
+    Las raíces pueden ser esas carpetas o carpetas que las contengan. Si una fecha
+    aparece en varias descargas se queda el archivo modificado más tarde.
+    Devuelve [(fecha dd-mm-aaaa, ruta)] en orden cronológico y el número de carpetas.
+    """
+    por_fecha = {}
+    carpetas = set()
+    for raiz in raices:
+        for carpeta, subcarpetas, archivos in os.walk(raiz):
+            subcarpetas[:] = [s for s in subcarpetas if not s.startswith('.')]
+            if os.path.abspath(carpeta) != os.path.abspath(raiz) and not PATRON_CARPETA.match(os.path.basename(carpeta)):
+                continue
+            for archivo in archivos:
+                coincidencia = PATRON_ARCHIVO.match(archivo)
+                if coincidencia is None:
+                    continue
+                dia, mes, anio, _ = coincidencia.groups()
+                fecha = f'{dia}-{mes}-{anio}'
+                ruta = os.path.abspath(os.path.join(carpeta, archivo))
+                carpetas.add(os.path.dirname(ruta))
+                if fecha not in por_fecha or os.path.getmtime(ruta) > os.path.getmtime(por_fecha[fecha]):
+                    por_fecha[fecha] = ruta
+    fechas = sorted(por_fecha, key=lambda f: datetime.strptime(f, '%d-%m-%Y'))
+    return [(fecha, por_fecha[fecha]) for fecha in fechas], len(carpetas)
+
+
+def _indice_columna(referencia):
+    indice = 0
+    for caracter in referencia:
+        if caracter.isdigit():
+            break
+        indice = indice * 26 + ord(caracter) - 64
+    return indice - 1
+
+
+def _hoja_principal(libro):
+    """Ruta dentro del zip de la primera hoja del libro"""
+    try:
+        with libro.open('xl/workbook.xml') as f:
+            hoja = next(e for _, e in iterparse(f) if e.tag == f'{_NS}sheet')
+        id_relacion = hoja.get(f'{_NS_REL}id')
+        with libro.open('xl/_rels/workbook.xml.rels') as f:
+            for _, e in iterparse(f):
+                if e.get('Id') == id_relacion:
+                    destino = e.get('Target').lstrip('/')
+                    return destino if destino.startswith('xl/') else f'xl/{destino}'
+    except (KeyError, StopIteration):
+        pass
+    return 'xl/worksheets/sheet1.xml'
+
+
+def leer_xlsx(ruta):
+    """Leer la primera hoja de un .xlsx directamente del XML, sin openpyxl
+
+    Los libros de esta herramienta son una tabla plana con cabecera, sin fórmulas
+    ni estilos que interpretar: recorrer el XML con iterparse es varias veces más
+    rápido que pandas.read_excel. Las celdas vacías no se escriben, así que cada
+    valor va a la columna de su referencia (A, B, ..., AA).
+    """
+    c, v, fila_xml = f'{_NS}c', f'{_NS}v', f'{_NS}row'
+    with zipfile.ZipFile(ruta) as libro:
+        compartidas = []
+        if 'xl/sharedStrings.xml' in libro.namelist():
+            with libro.open('xl/sharedStrings.xml') as f:
+                for _, e in iterparse(f):
+                    if e.tag == f'{_NS}si':
+                        compartidas.append(''.join(e.itertext()))
+                        e.clear()
+
+        filas = []
+        with libro.open(_hoja_principal(libro)) as f:
+            fila = {}
+            for _, e in iterparse(f):
+                if e.tag == c:
+                    tipo = e.get('t')
+                    if tipo == 'inlineStr':
+                        valor = ''.join(e.itertext())
+                    else:
+                        nodo = e.find(v)
+                        if nodo is None or nodo.text is None:
+                            valor = None
+                        elif tipo == 's':
+                            valor = compartidas[int(nodo.text)]
+                        elif tipo in ('str', 'e'):
+                            valor = nodo.text
+                        elif tipo == 'b':
+                            valor = nodo.text == '1'
+                        else:
+                            valor = float(nodo.text)
+                    fila[_indice_columna(e.get('r'))] = valor
+                elif e.tag == fila_xml:
+                    filas.append(fila)
+                    fila = {}
+                    e.clear()
+
+    if not filas:
+        return pd.DataFrame()
+    cabecera = filas[0]
+    columnas = {nombre: [fila.get(i) for fila in filas[1:]] for i, nombre in sorted(cabecera.items())}
+    return pd.DataFrame(columnas)
+
+
+def leer_archivo(ruta):
+    """DataFrame de un archivo diario de la herramienta (.xlsx, .csv o .parquet)"""
+    if ruta.endswith('.parquet'):
+        return pd.read_parquet(ruta)
+    if ruta.endswith('.csv'):
+        return pd.read_csv(ruta, dtype=str, keep_default_na=False, encoding='utf-8')
+    try:
+        return leer_xlsx(ruta)
+    except (KeyError, ParseError, ValueError):
+        # Un libro que no sigue la forma habitual (guardado de nuevo desde Excel, por ejemplo)
+        return pd.read_excel(ruta, dtype=object)
+
+
+def deshacer_limpieza(df):
+    """Devolver un día exportado a la forma de un día limpio, igual para todos los días
+
+    - 'C.P.' sin el apóstrofo que se añade para Excel y con sus ceros a la izquierda
+    - las columnas de estación que limpiar_datos quitó ese día (>80% vacías, >90%
+      mismo valor) vuelven, vacías, para que todos los días tengan las mismas
+    - precios y porcentajes en texto ('1,459') pasan a número con el esquema común
+    """
+    df.columns = [str(col).strip() for col in df.columns]
+    df = df.drop(columns=[col for col in ('FechaConsulta', 'FechaDescarga') if col in df.columns])
+
+    if 'C.P.' in df.columns:
+        cp = df['C.P.'].astype(str).str.strip().str.lstrip("'")
+        # Leído como número: 1234.0 -> '01234'
+        cp = cp.str.replace(r'\.0$', '', regex=True)
+        cp = cp.where(~cp.str.isdigit(), cp.str.zfill(5))
+        df['C.P.'] = cp.where(df['C.P.'].notna() & ~cp.isin(['', 'nan', 'None']), None)
+
+    precios = [col for col in df.columns if col.startswith('Precio ')]
+    otras = [col for col in df.columns if col not in COLUMNAS_ESTACION and col not in precios]
+    posicion = COLUMNAS_ESTACION.index('Municipio') + 1
+    orden = COLUMNAS_ESTACION[:posicion] + precios + COLUMNAS_ESTACION[posicion:] + otras
+    df = df.reindex(columns=orden)
+    for col in COLUMNAS_ESTACION:
+        if df[col].isna().all():
+            # Columna que faltaba: texto con <NA>; si es numérica, el esquema le da su tipo
+            df[col] = df[col].astype('string')
+    return aplicar_esquema(df)
+
+
+def importar_archivo(fecha, ruta):
+    """Leer y normalizar un archivo en un proceso del pool; los errores vuelven como texto"""
+    inicio = time.perf_counter()
+    try:
+        df = deshacer_limpieza(leer_archivo(ruta))
+    except Exception as e:
+        return {'fecha': fecha, 'ruta': ruta, 'error': f'{type(e).__name__}: {str(e)[:200]}'}
+    df[COLUMNA_FECHA] = fecha
+    return {'fecha': fecha, 'ruta': ruta, 'df': df, 'ms': round((time.perf_counter() - inicio) * 1000, 1)}
+
+
+class RegistroImportados:
+    """Archivos ya importados (JSON Lines de solo añadir, una línea por archivo)
+
+    Un archivo se vuelve a importar si cambia su tamaño o su fecha de modificación.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.registros = {}
+        if os.path.exists(ruta):
+            with open(ruta, encoding='utf-8') as f:
+                for linea in f:
+                    try:
+                        registro = json.loads(linea)
+                    except json.JSONDecodeError:
+                        continue
+                    self.registros[registro['ruta']] = registro
+
+    @staticmethod
+    def _firma(ruta):
+        info = os.stat(ruta)
+        return {'tamaño': info.st_size, 'mtime': round(info.st_mtime, 3)}
+
+    def importado(self, ruta):
+        registro = self.registros.get(ruta)
+        return registro is not None and registro.get('status') == 'success' and \
+            {clave: registro.get(clave) for clave in ('tamaño', 'mtime')} == self._firma(ruta)
+
+    def registrar(self, resultado):
+        registro = {
+            'ruta': resultado['ruta'],
+            'fecha': resultado['fecha'],
+            'status': 'error' if 'error' in resultado else 'success',
+            'filas': resultado.get('filas'),
+            **self._firma(resultado['ruta']),
+            'importado': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        if 'error' in resultado:
+            registro['error'] = resultado['error']
+        os.makedirs(os.path.dirname(self.ruta) or '.', exist_ok=True)
+        with open(self.ruta, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        self.registros[registro['ruta']] = registro
+        return registro
+
+
+class ImportadorCarpetas:
+    """Pasar las descargas en xlsx/csv/parquet de la herramienta al dataset particionado
+
+    Los archivos se leen en un pool de procesos en orden cronológico, con como
+    mucho dos por proceso en vuelo, y cada partición mensual se escribe una sola
+    vez, con todos sus días juntos. El
+    registro (<dataset>/.importados.jsonl) permite relanzar la importación y
+    saltar lo ya hecho.
+    """
+
+    def __init__(self, dataset, procesos=None, reimportar=False):
+        self.dataset = DatasetParticionado(dataset)
+        self.procesos = max(1, procesos or os.cpu_count() or 1)
+        self.ventana = 2 * self.procesos
+        self.registro = RegistroImportados(os.path.join(dataset, '.importados.jsonl'))
+        self.reimportar = reimportar
+
+    def importar(self, archivos, al_progreso=None):
+        """Importar [(fecha, ruta)]; al_progreso(resultado, hechos, total) tras cada archivo"""
+        pendientes = [(f, r) for f, r in archivos if self.reimportar or not self.registro.importado(r)]
+        resumen = {'encontrados': len(archivos), 'saltados': len(archivos) - len(pendientes),
+                   'importados': 0, 'errores': 0, 'filas': 0}
+        if not pendientes:
+            return resumen
+
+        mes, del_mes = None, []
+        with ProcessPoolExecutor(max_workers=self.procesos) as pool:
+            for hechos, resultado in enumerate(self._en_orden(pool, pendientes), 1):
+                clave = resultado['fecha'][3:]
+                if clave != mes:
+                    self._guardar_mes(del_mes, resumen)
+                    mes, del_mes = clave, []
+                if 'error' in resultado:
+                    resumen['errores'] += 1
+                    self.registro.registrar(resultado)
+                else:
+                    resultado['filas'] = len(resultado['df'])
+                    del_mes.append(resultado)
+                if al_progreso is not None:
+                    al_progreso(resultado, hechos, len(pendientes))
+            self._guardar_mes(del_mes, resumen)
+        return resumen
+
+    def _en_orden(self, pool, pendientes):
+        """Resultados en el orden de `pendientes`, sin enviar al pool más de `ventana` archivos a la vez
+
+        pool.map lo envía todo de golpe y los días leídos se acumulan en memoria
+        mientras esperan su turno; así la memoria no crece con el número de archivos.
+        """
+        en_vuelo = deque()
+        for fecha, ruta in pendientes:
+            if len(en_vuelo) >= self.ventana:
+                yield en_vuelo.popleft().result()
+            en_vuelo.append(pool.submit(importar_archivo, fecha, ruta))
+        while en_vuelo:
+            yield en_vuelo.popleft().result()
+
+    def _guardar_mes(self, resultados, resumen):
+        if not resultados:
+            return
+        df = pd.concat([r.pop('df') for r in resultados], ignore_index=True, sort=False)
+        self.dataset.agregar_dias(df)
+        # Se registran después de escribir: si se corta antes, el mes se vuelve a importar entero
+        for resultado in resultados:
+            self.registro.registrar(resultado)
+            resumen['importados'] += 1
+            resumen['filas'] += resultado['filas']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Importar las carpetas de descargas (precios_dd_mm_aaaa.xlsx/csv/parquet) al dataset particionado')
+    parser.add_argument('carpetas', nargs='+', help='carpetas SEDEApp_Carburantes_* o carpetas que las contienen')
+    parser.add_argument('--dataset', required=True, help='raíz del dataset particionado (anio=/mes=)')
+    parser.add_argument('--procesos', type=int, default=os.cpu_count(), help='procesos para leer los archivos')
+    parser.add_argument('--reimportar', action='store_true', help='volver a importar también lo ya registrado')
+    args = parser.parse_args(argv)
+
+    archivos, carpetas = descubrir(args.carpetas)
+    print(f'🔎 {len(archivos)} días en {carpetas} carpetas')
+    importador = ImportadorCarpetas(args.dataset, args.procesos, args.reimportar)
+    inicio = time.monotonic()
+
+    def al_progreso(resultado, hechos, total):
+        ritmo = hechos / max(time.monotonic() - inicio, 1e-9)
+        nombre = os.path.basename(resultado['ruta'])
+        if 'error' in resultado:
+            print(f'⚠️ [{hechos}/{total}] {nombre}: {resultado["error"]}')
+        elif hechos % 25 == 0 or hechos == total:
+            print(f'📥 [{hechos}/{total}] {nombre} · {ritmo:.1f} archivos/s · quedan {(total - hechos) / ritmo:.0f} s')
+
+    resumen = importador.importar(archivos, al_progreso)
+    segundos = time.monotonic() - inicio
+    print(f'📊 {resumen["importados"]} importados ({resumen["filas"]} filas), {resumen["saltados"]} ya estaban, '
+          f'{resumen["errores"]} con error, en {segundos:.1f} s → {args.dataset}')
+    return 1 if resumen['errores'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import codecs
+import json
+
+_decodificador_json = json.JSONDecoder()
+_ESPACIOS = ' \t\r\n'
+
+# Id de producto de EstacionesTerrestresHist/FiltroProducto para cada combustible (nombre de su columna 'Precio ...')
+PRODUCTOS = {
+    'Gasolina 95 E5': 1,
+    'Gasolina 98 E5': 3,
+    'Gasoleo A': 4,
+    'Gasoleo Premium': 5,
+    'Gasoleo B': 6,
+    'Biodiesel': 8,
+    'Gases licuados del petróleo': 15,
+    'Gas Natural Licuado': 17,
+    'Gas Natural Comprimido': 18,
+    'Hidrogeno': 19,
+    'Gasolina 95 E5 Premium': 20,
+    'Gasolina 98 E10': 21,
+    'Gasolina 95 E10': 23,
+}
+
+
+def iterar_estaciones(cuerpo, encoding='utf-8', clave='ListaEESSPrecio', tamaño_bloque=1 << 20):
+    """Iterar los registros de la lista de estaciones directamente desde los bytes de la respuesta
+
+    Decodifica el cuerpo por bloques, sin crear el texto completo ni el dict con
+    toda la respuesta. Lanza json.JSONDecodeError si el contenido no es JSON válido.
+    """
+    marcador = f'"{clave}"'.encode(encoding)
+    pos = cuerpo.find(marcador)
+    if pos < 0:
+        # Sin la clave: o es un JSON sin estaciones (pequeño) o no es JSON
+        json.loads(cuerpo)
+        return
+
+    pos = cuerpo.find(b':', pos + len(marcador)) + 1
+    while pos < len(cuerpo) and cuerpo[pos:pos + 1] in b' \t\r\n':
+        pos += 1
+    if cuerpo[pos:pos + 1] != b'[':
+        # Valor nulo o inesperado: se valida el documento completo como hace json.loads
+        if json.loads(cuerpo).get(clave):
+            raise json.JSONDecodeError(f'{clave} no es una lista', cuerpo[:200].decode(encoding, 'replace'), 0)
+        return
+    pos += 1
+
+    decodificador = codecs.getincrementaldecoder(encoding)()
+    vista = memoryview(cuerpo)
+    texto = ''
+    i = 0
+    fin_entrada = False
+
+    while True:
+        while i < len(texto) and (texto[i] in _ESPACIOS or texto[i] == ','):
+            i += 1
+        if i < len(texto) and texto[i] == ']':
+            return
+        try:
+            if i >= len(texto):
+                raise ValueError
+            registro, i = _decodificador_json.raw_decode(texto, i)
+        except ValueError as e:
+            # Registro cortado al final del bloque: leer el siguiente y reintentar
+            if fin_entrada:
+                if isinstance(e, json.JSONDecodeError):
+                    raise
+                raise json.JSONDecodeError('Lista de estaciones sin cerrar', texto, i)
+            texto = texto[i:] + decodificador.decode(vista[pos:pos + tamaño_bloque], final=pos + tamaño_bloque >= len(cuerpo))
+            i = 0
+            pos += tamaño_bloque
+            fin_entrada = pos >= len(cuerpo)
+            continue
+        yield registro
+
+
+def columnas_estaciones(cuerpo, encoding='utf-8'):
+    """Construir en una sola pasada las columnas (dict nombre -> lista) de todas las estaciones"""
+    columnas = {}
+    n = 0
+    for registro in iterar_estaciones(cuerpo, encoding):
+        for nombre, valor in registro.items():
+            lista = columnas.get(nombre)
+            if lista is None:
+                lista = columnas[nombre] = [None] * n
+            lista.append(valor)
+        n += 1
+        if len(registro) != len(columnas):
+            for lista in columnas.values():
+                if len(lista) < n:
+                    lista.append(None)
+    return columnas
+
+
+def columnas_productos(cuerpos, encoding='utf-8'):
+    """Unir por IDEESS las respuestas de FiltroProducto ({combustible: cuerpo}) en columnas como las del día completo
+
+    Cada respuesta trae los datos de la estación y un único 'PrecioProducto', que pasa
+    a ser la columna 'Precio <combustible>'. Las estaciones que no venden ninguno de
+    los combustibles pedidos no aparecen.
+    """
+    columnas = {}
+    posiciones = {}
+    n = 0
+    for combustible, cuerpo in cuerpos.items():
+        columna_precio = f'Precio {combustible}'
+        for registro in iterar_estaciones(cuerpo, encoding):
+            i = posiciones.get(registro.get('IDEESS'))
+            if i is None:
+                i = posiciones[registro.get('IDEESS')] = n
+                n += 1
+                for lista in columnas.values():
+                    lista.append(None)
+            for nombre, valor in registro.items():
+                if nombre == 'PrecioProducto':
+                    nombre = columna_precio
+                lista = columnas.get(nombre)
+                if lista is None:
+                    lista = columnas[nombre] = [None] * n
+                if lista[i] is None:
+                    lista[i] = valor
+    # Los precios juntos, donde venía 'PrecioProducto', como en la respuesta completa
+    precios = [nombre for nombre in columnas if nombre.startswith('Precio ')]
+    if not precios:
+        return columnas
+    ordenadas = {}
+    for nombre, lista in columnas.items():
+        if nombre == precios[0]:
+            ordenadas.update((precio, columnas[precio]) for precio in precios)
+        elif nombre not in precios:
+            ordenadas[nombre] = lista
+    return ordenadas
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+
+
+def sha256_archivo(ruta, tamaño_bloque=1 << 20):
+    """Checksum SHA-256 de un fichero, leído por bloques"""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(tamaño_bloque), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+class ManifiestoDescargas:
+    """Registro persistente del resultado de cada fecha descargada
+
+    Es un fichero JSON Lines de solo añadir: cada línea es el último resultado
+    conocido de una fecha, así que un proceso interrumpido a mitad de escritura
+    como mucho pierde su última línea.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.registros = {}
+        self.cargar()
+
+    def cargar(self):
+        """Leer el manifiesto; para cada fecha manda la última línea escrita"""
+        self.registros = {}
+        if not os.path.exists(self.ruta):
+            return
+        lineas = 0
+        with open(self.ruta, encoding='utf-8') as f:
+            for linea in f:
+                lineas += 1
+                try:
+                    registro = json.loads(linea)
+                except json.JSONDecodeError:
+                    continue
+                if 'fecha' in registro:
+                    self.registros[registro['fecha']] = registro
+        if lineas > 2 * len(self.registros) + 100:
+            self.compactar()
+
+    def compactar(self):
+        """Reescribir el manifiesto dejando una sola línea por fecha"""
+        temporal = f'{self.ruta}.{os.getpid()}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            for fecha in sorted(self.registros, key=lambda x: datetime.strptime(x, '%d-%m-%Y')):
+                f.write(json.dumps(self.registros[fecha], ensure_ascii=False) + '\n')
+        os.replace(temporal, self.ruta)
+
+    def registrar(self, item):
+        """Añadir el resultado de una fecha (un item de parse_datos) al manifiesto"""
+        ruta_archivo = item.get('ruta')
+        registro = {
+            'fecha': item['fecha'],
+            'status': item.get('status'),
+            'estaciones': item.get('estaciones'),
+            'archivo': ruta_archivo,
+            'sha256': sha256_archivo(ruta_archivo) if ruta_archivo and os.path.exists(ruta_archivo) else None,
+            'registrado': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        if 'error' in item:
+            registro['error'] = item['error']
+
+        carpeta = os.path.dirname(self.ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        with open(self.ruta, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.registros[registro['fecha']] = registro
+        return registro
+
+    def completada(self, fecha):
+        """Una fecha está completa si terminó bien y su archivo sigue existiendo"""
+        registro = self.registros.get(fecha)
+        if not registro or registro.get('status') != 'success':
+            return False
+        return not registro.get('archivo') or os.path.exists(registro['archivo'])
+
+    def pendientes(self, fechas):
+        """Filtrar las fechas que todavía no se han completado"""
+        return [fecha for fecha in fechas if not self.completada(fecha)]
+
+    def fallidas(self):
+        """Fechas registradas cuyo último resultado no fue un éxito"""
+        return [fecha for fecha in self.registros if not self.completada(fecha)]
+
+    def ultima_exitosa(self):
+        """La fecha completada más reciente, o None"""
+        fechas = [datetime.strptime(f, '%d-%m-%Y') for f in self.registros if self.completada(f)]
+        return max(fechas) if fechas else None
+
+    def fechas_sync(self, desde=None, hasta=None):
+        """Fechas a pedir en modo sync: las fallidas y todas las posteriores a la última completada
+
+        `desde` solo se usa si el manifiesto no tiene ninguna fecha completada.
+        """
+        hasta = hasta or datetime.now()
+        ultima = self.ultima_exitosa()
+        inicio = ultima + timedelta(days=1) if ultima else desde
+        fechas = set(self.fallidas())
+        if inicio is not None:
+            actual = inicio
+            while actual.date() <= hasta.date():
+                fechas.add(actual.strftime('%d-%m-%Y'))
+                actual += timedelta(days=1)
+        return sorted(fechas, key=lambda f: datetime.strptime(f, '%d-%m-%Y'))
@@ -0,0 +1,131 @@
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+# Límites superiores (ms) de los cubos del histograma; el último recoge todo lo demás
+CUBOS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+PERCENTILES = [50, 90, 99]
+
+
+class MedidorEtapas:
+    """Cronómetro por etapas de un día: tiempo de pared, CPU y, con tracemalloc activo, pico de memoria"""
+
+    def __init__(self, memoria=False):
+        self.memoria = memoria
+        self.etapas = {}
+        self.pico_mb = 0.0
+
+    @contextmanager
+    def medir(self, nombre):
+        if self.memoria:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        pared, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            etapa = {
+                'ms': round((time.perf_counter() - pared) * 1000, 2),
+                'cpu_ms': round((time.process_time() - cpu) * 1000, 2),
+            }
+            if self.memoria:
+                pico = tracemalloc.get_traced_memory()[1]
+                # Memoria reservada por encima de la que ya había al empezar la etapa
+                etapa['pico_mb'] = round((pico - base) / 1024 / 1024, 1)
+                self.pico_mb = max(self.pico_mb, round(pico / 1024 / 1024, 1))
+            self.etapas[nombre] = etapa
+
+
+@contextmanager
+def perfilar(ruta):
+    """Ejecutar el bloque bajo cProfile y volcar las estadísticas a `ruta` (para pstats o snakeviz)"""
+    perfil = cProfile.Profile()
+    perfil.enable()
+    try:
+        yield
+    finally:
+        perfil.disable()
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        perfil.dump_stats(ruta)
+
+
+def _histograma(valores):
+    cuentas = np.bincount(np.searchsorted(CUBOS_MS, valores, side='left'), minlength=len(CUBOS_MS) + 1)
+    etiquetas = [f'<={limite}' for limite in CUBOS_MS] + [f'>{CUBOS_MS[-1]}']
+    return {etiqueta: int(n) for etiqueta, n in zip(etiquetas, cuentas) if n}
+
+
+class MetricasEtapas:
+    """Acumular las etapas de todos los días del spider y resumirlas en stats e informe"""
+
+    def __init__(self):
+        self.dias = []
+        self.tiempos = {}
+
+    def registrar(self, item):
+        etapas = item.get('etapas') or {}
+        self.dias.append({'fecha': item.get('fecha'), 'status': item.get('status'), 'etapas': etapas})
+        for nombre, etapa in etapas.items():
+            self.tiempos.setdefault(nombre, []).append(etapa)
+
+    def resumen(self):
+        """Por etapa: número de días, totales, percentiles e histograma de los tiempos de pared"""
+        resumen = {}
+        for nombre, etapas in self.tiempos.items():
+            ms = np.array([e['ms'] for e in etapas])
+            datos = {
+                'dias': len(ms),
+                'total_ms': round(float(ms.sum()), 1),
+                'media_ms': round(float(ms.mean()), 1),
+                'max_ms': round(float(ms.max()), 1),
+            }
+            for p, valor in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+                datos[f'p{p}_ms'] = round(float(valor), 1)
+            cpu = [e['cpu_ms'] for e in etapas if 'cpu_ms' in e]
+            if cpu:
+                datos['cpu_total_ms'] = round(sum(cpu), 1)
+            picos = [e['pico_mb'] for e in etapas if 'pico_mb' in e]
+            if picos:
+                datos['pico_mb_max'] = max(picos)
+            datos['histograma_ms'] = _histograma(ms)
+            resumen[nombre] = datos
+        return resumen
+
+    def volcar_stats(self, stats, resumen=None):
+        """Copiar el resumen a las stats de Scrapy como etapas/<etapa>/<medida>
+
+        Cada cubo del histograma va en etapas/<etapa>/hist/<límite en ms> (inf para el último).
+        """
+        for nombre, datos in (resumen or self.resumen()).items():
+            for medida, valor in datos.items():
+                if medida != 'histograma_ms':
+                    stats.set_value(f'etapas/{nombre}/{medida}', valor)
+            for etiqueta, n in datos.get('histograma_ms', {}).items():
+                limite = etiqueta[2:] if etiqueta.startswith('<=') else 'inf'
+                stats.set_value(f'etapas/{nombre}/hist/{limite}', n)
+
+    def guardar_informe(self, ruta, stats=None, extra=None):
+        """Escribir el informe JSON: resumen por etapa, detalle por día y stats de Scrapy"""
+        informe = {'generado': datetime.now().isoformat(timespec='seconds')}
+        informe.update(extra or {})
+        informe['etapas'] = self.resumen()
+        informe['dias'] = self.dias
+        informe['stats'] = stats or {}
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        temporal = f'{ruta}.{os.getpid()}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(temporal, ruta)
+        return ruta
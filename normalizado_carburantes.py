@@ -0,0 +1,198 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from dataset_carburantes import bloqueo, escribir_parquet_atomico
+
+ATRIBUTOS_ESTACION = ['Rótulo', 'Dirección', 'C.P.', 'Localidad', 'Municipio', 'Provincia',
+                      'Latitud', 'Longitud (WGS84)']
+
+
+def precio_a_float32(serie):
+    """Convertir precios '1,459' (o ya numéricos) a float32, con NaN en los vacíos"""
+    if not pd.api.types.is_numeric_dtype(serie):
+        serie = serie.astype(str).str.strip().str.replace(',', '.', regex=False)
+        serie = serie.replace(['', '#####', 'nan', 'None', '<NA>'], np.nan)
+    return pd.to_numeric(serie, errors='coerce').astype('float32')
+
+
+def _mismos_atributos(cruce):
+    """Comparar fila a fila los atributos del día con los de la dimensión (sufijo _dim), con vacío == vacío"""
+    iguales = pd.Series(True, index=cruce.index)
+    for col in ATRIBUTOS_ESTACION:
+        x, y = cruce[col], cruce[f'{col}_dim']
+        iguales &= ((x == y) | (x.isna() & y.isna())).fillna(False).astype(bool)
+    return iguales
+
+
+class AlmacenNormalizado:
+    """Dimensión de estaciones con historial y tabla de hechos de precios diarios
+
+    - estaciones.parquet: una fila por versión de estación (IDEESS int32), con
+      valido_desde/valido_hasta cuando cambian rótulo, dirección o ubicación.
+    - precios/anio=AAAA/mes=MM.parquet: (fecha, IDEESS int32, combustible
+      categórico, precio float32), solo con los precios informados.
+    """
+
+    def __init__(self, raiz):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError('El almacén normalizado necesita pyarrow: pip install pyarrow')
+        self.raiz = raiz
+        self.ruta_estaciones = os.path.join(raiz, 'estaciones.parquet')
+        os.makedirs(os.path.join(raiz, 'precios'), exist_ok=True)
+
+    def ruta_precios(self, fecha):
+        """Partición mensual de la tabla de precios para una fecha dd-mm-aaaa"""
+        dia = datetime.strptime(fecha, '%d-%m-%Y')
+        return os.path.join(self.raiz, 'precios', f'anio={dia.year:04d}', f'mes={dia.month:02d}.parquet')
+
+    def agregar_dia(self, df, fecha):
+        """Incorporar un día limpio: actualizar la dimensión y sustituir los precios de ese día"""
+        dia = pd.Timestamp(datetime.strptime(fecha, '%d-%m-%Y'))
+
+        estaciones = pd.DataFrame({'IDEESS': pd.to_numeric(df['IDEESS'], errors='coerce')})
+        for col in ATRIBUTOS_ESTACION:
+            estaciones[col] = df[col].values if col in df.columns else None
+        if 'C.P.' in df.columns:
+            estaciones['C.P.'] = df['C.P.'].astype(str).str.lstrip("'")
+        estaciones = estaciones.dropna(subset=['IDEESS']).drop_duplicates('IDEESS')
+        estaciones['IDEESS'] = estaciones['IDEESS'].astype('int32')
+
+        columnas_precio = [col for col in df.columns if col.startswith('Precio ')]
+        precios = pd.DataFrame({'IDEESS': pd.to_numeric(df['IDEESS'], errors='coerce')})
+        for col in columnas_precio:
+            precios[col[len('Precio '):]] = precio_a_float32(df[col]).values
+        precios = precios.dropna(subset=['IDEESS'])
+        precios = precios.melt(id_vars='IDEESS', var_name='combustible', value_name='precio').dropna(subset=['precio'])
+        precios.insert(0, 'fecha', dia)
+        precios['IDEESS'] = precios['IDEESS'].astype('int32')
+        precios['combustible'] = precios['combustible'].astype('category')
+        precios['precio'] = precios['precio'].astype('float32')
+
+        with bloqueo(self.ruta_estaciones):
+            self._actualizar_estaciones(estaciones, dia)
+
+        ruta = self.ruta_precios(fecha)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with bloqueo(ruta):
+            if os.path.exists(ruta):
+                existente = pd.read_parquet(ruta)
+                existente = existente[existente['fecha'] != dia]
+                precios = pd.concat([existente, precios], ignore_index=True)
+                precios['combustible'] = precios['combustible'].astype('category')
+            escribir_parquet_atomico(precios.reset_index(drop=True), ruta)
+        return ruta
+
+    def _actualizar_estaciones(self, dia_estaciones, dia):
+        """Aplicar los atributos de un día a la dimensión (slowly changing dimension tipo 2)"""
+        dim = self.leer_estaciones()
+        nuevas = dia_estaciones.assign(valido_desde=dia, valido_hasta=pd.NaT)
+
+        if dim.empty:
+            escribir_parquet_atomico(nuevas, self.ruta_estaciones)
+            return
+
+        cubre = (dim['valido_desde'] <= dia) & (dim['valido_hasta'].isna() | (dim['valido_hasta'] >= dia))
+        vigentes = dim[cubre].reset_index().rename(columns={'index': 'fila'})
+        cruce = dia_estaciones.merge(vigentes, on='IDEESS', how='left', suffixes=('', '_dim'))
+        sin_version = cruce['fila'].isna()
+        cambia = ~sin_version & ~_mismos_atributos(cruce)
+
+        altas = []
+
+        # Estaciones nunca vistas: alta abierta desde este día
+        nunca_vistas = sin_version & ~cruce['IDEESS'].isin(dim['IDEESS'])
+        altas.append(nuevas[nuevas['IDEESS'].isin(cruce.loc[nunca_vistas, 'IDEESS'])])
+
+        # Estaciones conocidas sin versión que cubra el día (carga hacia atrás): se compara
+        # con la primera versión posterior, que se adelanta si no hay cambios
+        atrasadas = cruce.loc[sin_version & ~nunca_vistas, ['IDEESS'] + ATRIBUTOS_ESTACION]
+        if not atrasadas.empty:
+            posteriores = dim[dim['IDEESS'].isin(atrasadas['IDEESS']) & (dim['valido_desde'] > dia)]
+            primeras = dim.loc[posteriores.groupby('IDEESS')['valido_desde'].idxmin()].reset_index()
+            comparadas = atrasadas.merge(primeras, on='IDEESS', suffixes=('', '_dim'))
+            iguales = _mismos_atributos(comparadas)
+            dim.loc[comparadas.loc[iguales, 'index'], 'valido_desde'] = dia
+            distintas = comparadas[~iguales]
+            alta = nuevas[nuevas['IDEESS'].isin(distintas['IDEESS'])].drop(columns='valido_hasta')
+            alta = alta.merge(distintas[['IDEESS', 'valido_desde']].rename(columns={'valido_desde': 'siguiente'}), on='IDEESS')
+            alta['valido_hasta'] = alta.pop('siguiente') - pd.Timedelta(days=1)
+            altas.append(alta)
+
+        # Cambios sobre la versión vigente: si empezó este mismo día se corrige en el sitio,
+        # si no se cierra el día anterior y se abre una nueva con el resto de su vigencia
+        cambios = cruce[cambia]
+        mismo_dia = cambios['valido_desde'] == dia
+        corregir = cambios[mismo_dia]
+        dim.loc[corregir['fila'].astype(int), ATRIBUTOS_ESTACION] = corregir[ATRIBUTOS_ESTACION].values
+        cerrar = cambios[~mismo_dia]
+        if not cerrar.empty:
+            alta = nuevas[nuevas['IDEESS'].isin(cerrar['IDEESS'])].drop(columns='valido_hasta')
+            alta = alta.merge(cerrar[['IDEESS', 'valido_hasta']], on='IDEESS')
+            altas.append(alta)
+            dim.loc[cerrar['fila'].astype(int), 'valido_hasta'] = dia - pd.Timedelta(days=1)
+
+        dim = pd.concat([dim] + [alta for alta in altas if not alta.empty], ignore_index=True)
+        dim = dim.sort_values(['IDEESS', 'valido_desde'], kind='stable').reset_index(drop=True)
+        escribir_parquet_atomico(dim, self.ruta_estaciones)
+
+    def leer_estaciones(self, fecha=None):
+        """Dimensión completa, o solo las versiones vigentes en una fecha dd-mm-aaaa"""
+        if not os.path.exists(self.ruta_estaciones):
+            return pd.DataFrame(columns=['IDEESS'] + ATRIBUTOS_ESTACION + ['valido_desde', 'valido_hasta'])
+        dim = pd.read_parquet(self.ruta_estaciones)
+        if fecha is not None:
+            dia = pd.Timestamp(datetime.strptime(fecha, '%d-%m-%Y'))
+            dim = dim[(dim['valido_desde'] <= dia) & (dim['valido_hasta'].isna() | (dim['valido_hasta'] >= dia))]
+        return dim.reset_index(drop=True)
+
+    def leer_precios(self, desde=None, hasta=None, combustibles=None):
+        """Precios del rango pedido, leyendo solo las particiones mensuales necesarias"""
+        inicio = pd.Timestamp(datetime.strptime(desde, '%d-%m-%Y')) if desde else None
+        fin = pd.Timestamp(datetime.strptime(hasta, '%d-%m-%Y')) if hasta else None
+
+        filtros = []
+        if inicio is not None:
+            filtros.append(('fecha', '>=', inicio))
+        if fin is not None:
+            filtros.append(('fecha', '<=', fin))
+        if combustibles:
+            filtros.append(('combustible', 'in', list(combustibles)))
+
+        partes = []
+        carpeta = os.path.join(self.raiz, 'precios')
+        for carpeta_anio in sorted(os.listdir(carpeta)):
+            anio = int(carpeta_anio.split('=', 1)[1])
+            for archivo in sorted(os.listdir(os.path.join(carpeta, carpeta_anio))):
+                if not archivo.endswith('.parquet'):
+                    continue
+                mes = int(archivo[len('mes='):len('mes=') + 2])
+                if inicio is not None and (anio, mes) < (inicio.year, inicio.month):
+                    continue
+                if fin is not None and (anio, mes) > (fin.year, fin.month):
+                    continue
+                partes.append(pd.read_parquet(os.path.join(carpeta, carpeta_anio, archivo), filters=filtros or None))
+
+        if not partes:
+            return pd.DataFrame({'fecha': pd.Series(dtype='datetime64[ns]'), 'IDEESS': pd.Series(dtype='int32'),
+                                 'combustible': pd.Series(dtype='category'), 'precio': pd.Series(dtype='float32')})
+        precios = pd.concat(partes, ignore_index=True)
+        precios['combustible'] = precios['combustible'].astype('category')
+        return precios
+
+    def dia(self, fecha):
+        """Reconstruir la tabla ancha de un día (estación + una columna 'Precio X' por combustible)
+
+        Parte de todas las estaciones vigentes ese día en la dimensión, así que las
+        que no tenían ningún precio informado siguen apareciendo, con los precios vacíos.
+        """
+        precios = self.leer_precios(fecha, fecha)
+        precios['combustible'] = precios['combustible'].astype(str)
+        ancha = precios.pivot(index='IDEESS', columns='combustible', values='precio')
+        ancha.columns = [f'Precio {col}' for col in ancha.columns]
+        estaciones = self.leer_estaciones(fecha).drop(columns=['valido_desde', 'valido_hasta'])
+        return estaciones.merge(ancha.reset_index(), on='IDEESS', how='left')
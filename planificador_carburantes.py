@@ -0,0 +1,151 @@
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta
+
+from scrapy.exceptions import NotConfigured
+
+logger = logging.getLogger('carburantes_historicos')
+
+SEÑALES_FRENO = {429, 503, 403}
+
+
+def _orden_biseccion(fechas):
+    """Ordenar un tramo de fechas consecutivas por bisección: primero el centro del hueco más grande"""
+    orden = []
+    pendientes = [(-len(fechas), 0, len(fechas))]
+    while pendientes:
+        _, inicio, fin = heapq.heappop(pendientes)
+        if inicio >= fin:
+            continue
+        medio = (inicio + fin) // 2
+        orden.append(fechas[medio])
+        heapq.heappush(pendientes, (-(medio - inicio), inicio, medio))
+        heapq.heappush(pendientes, (-(fin - medio - 1), medio + 1, fin))
+    return orden
+
+
+def orden_huecos_primero(fechas, completadas=()):
+    """Orden de descarga que rellena primero los huecos entre fechas ya completadas
+
+    Las fechas pendientes se agrupan en tramos consecutivos; van antes los tramos con
+    fechas completadas a ambos lados (huecos) y después el resto. Dentro de cada tramo
+    se va partiendo por la mitad, así que si la descarga se corta la cobertura queda
+    repartida y no concentrada al principio del rango.
+    """
+    dias = sorted({datetime.strptime(f, '%d-%m-%Y') for f in fechas})
+    hechas = {datetime.strptime(f, '%d-%m-%Y') for f in completadas}
+
+    tramos = []
+    for dia in dias:
+        if tramos and dia - tramos[-1][-1] == timedelta(days=1):
+            tramos[-1].append(dia)
+        else:
+            tramos.append([dia])
+
+    huecos, resto = [], []
+    for tramo in tramos:
+        rodeado = tramo[0] - timedelta(days=1) in hechas and tramo[-1] + timedelta(days=1) in hechas
+        (huecos if rodeado else resto).append(tramo)
+
+    orden = []
+    for grupo in (huecos, resto):
+        for tramo in sorted(grupo, key=len):
+            orden.extend(_orden_biseccion([d.strftime('%d-%m-%Y') for d in tramo]))
+    return orden
+
+
+class PlanificadorAdaptativo:
+    """Ajustar concurrencia y retardo de descarga según la latencia y los errores del servidor
+
+    Sube la concurrencia de uno en uno (y divide el retardo) tras cada ventana de
+    respuestas sanas por debajo de la latencia objetivo; ante 429/503/403, errores
+    de red o latencia excesiva reduce la concurrencia a la mitad y duplica el
+    retardo (respetando Retry-After). Las decisiones quedan en las stats adaptativo/*.
+    """
+
+    def __init__(self, crawler):
+        ajustes = crawler.settings
+        if not ajustes.getbool('ADAPTATIVO_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.concurrencia_min = ajustes.getint('ADAPTATIVO_CONCURRENCIA_MIN', 1)
+        self.concurrencia_max = ajustes.getint('ADAPTATIVO_CONCURRENCIA_MAX', 16)
+        self.retardo_min = ajustes.getfloat('ADAPTATIVO_RETARDO_MIN', 0.0)
+        self.retardo_max = ajustes.getfloat('ADAPTATIVO_RETARDO_MAX', 60.0)
+        self.latencia_objetivo = ajustes.getfloat('ADAPTATIVO_LATENCIA_OBJETIVO', 10.0)
+        self.ventana = ajustes.getint('ADAPTATIVO_VENTANA', 4)
+        self.enfriamiento = ajustes.getfloat('ADAPTATIVO_ENFRIAMIENTO', 30.0)
+
+        self.concurrencia = max(self.concurrencia_min, ajustes.getint('CONCURRENT_REQUESTS_PER_DOMAIN'))
+        self.retardo = ajustes.getfloat('DOWNLOAD_DELAY')
+        self.sanas = 0
+        self.ultimo_freno = float('-inf')
+        self.latencia_media = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _aplicar(self, request):
+        slot = self.crawler.engine.downloader.slots.get(request.meta.get('download_slot'))
+        if slot is not None:
+            slot.concurrency = self.concurrencia
+            slot.delay = self.retardo
+        self.stats.set_value('adaptativo/concurrencia', self.concurrencia)
+        self.stats.set_value('adaptativo/retardo_ms', round(self.retardo * 1000))
+        self.stats.max_value('adaptativo/concurrencia_max_alcanzada', self.concurrencia)
+
+    def _subir(self, request):
+        if self.concurrencia >= self.concurrencia_max and self.retardo <= self.retardo_min:
+            return
+        self.concurrencia = min(self.concurrencia_max, self.concurrencia + 1)
+        self.retardo = max(self.retardo_min, self.retardo / 2 if self.retardo > 0.05 else 0.0)
+        self.stats.inc_value('adaptativo/subidas')
+        logger.info(f'📈 Servidor estable: concurrencia {self.concurrencia}, retardo {self.retardo:.2f}s')
+        self._aplicar(request)
+
+    def _frenar(self, request, motivo, espera=0.0):
+        ahora = time.monotonic()
+        self.sanas = 0
+        self.stats.inc_value(f'adaptativo/señales/{motivo}')
+        # Las respuestas que ya estaban en vuelo traen la misma señal: un solo freno por retardo
+        if ahora - self.ultimo_freno < max(self.retardo, 1.0):
+            return
+        self.ultimo_freno = ahora
+        self.concurrencia = max(self.concurrencia_min, self.concurrencia // 2)
+        self.retardo = min(self.retardo_max, max(self.retardo * 2, 1.0, espera))
+        self.stats.inc_value('adaptativo/frenos')
+        logger.info(f'🐢 Frenando por {motivo}: concurrencia {self.concurrencia}, retardo {self.retardo:.2f}s')
+        self._aplicar(request)
+
+    def process_response(self, request, response, spider=None):
+        latencia = request.meta.get('download_latency')
+        if 'cached' in response.flags or latencia is None:
+            return response
+
+        if response.status in SEÑALES_FRENO:
+            retry_after = response.headers.get('Retry-After', b'').decode('latin-1').strip()
+            self._frenar(request, str(response.status), float(retry_after) if retry_after.isdigit() else 0.0)
+            return response
+        if response.status >= 500:
+            self._frenar(request, str(response.status))
+            return response
+
+        self.latencia_media = latencia if self.latencia_media is None else 0.8 * self.latencia_media + 0.2 * latencia
+        self.stats.set_value('adaptativo/latencia_media_ms', round(self.latencia_media * 1000))
+        self.stats.max_value('adaptativo/latencia_max_ms', round(latencia * 1000))
+        if self.latencia_media > self.latencia_objetivo:
+            self._frenar(request, 'latencia')
+            return response
+
+        self.sanas += 1
+        if self.sanas >= self.ventana and time.monotonic() - self.ultimo_freno > self.enfriamiento:
+            self.sanas = 0
+            self._subir(request)
+        return response
+
+    def process_exception(self, request, exception, spider=None):
+        self._frenar(request, type(exception).__name__)
+        return None
@@ -0,0 +1,48 @@
+import time
+
+
+class BytesRedMiddleware:
+    """Anotar los bytes recibidos tal como llegan por la red, antes de descomprimir
+
+    Va justo antes de HttpCompressionMiddleware (590) en el camino de vuelta y deja
+    en request.meta el tamaño, la codificación y el instante en que empieza la descompresión.
+    """
+
+    def __init__(self, crawler):
+        self.stats = crawler.stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_response(self, request, response, spider=None):
+        if 'cached' in response.flags:
+            return response
+        request.meta['bytes_red'] = len(response.body)
+        request.meta['codificacion'] = response.headers.get('Content-Encoding', b'').decode('latin-1') or None
+        request.meta['_inicio_descompresion'] = time.perf_counter()
+        self.stats.inc_value('red_carburantes/bytes_red', len(response.body))
+        if request.meta['codificacion']:
+            self.stats.inc_value(f'red_carburantes/codificacion/{request.meta["codificacion"]}')
+        return response
+
+
+class DescompresionMiddleware:
+    """Medir el tiempo de descompresión y el tamaño descomprimido, justo después de HttpCompressionMiddleware"""
+
+    def __init__(self, crawler):
+        self.stats = crawler.stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_response(self, request, response, spider=None):
+        inicio = request.meta.pop('_inicio_descompresion', None)
+        if inicio is None:
+            return response
+        request.meta['descompresion_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+        request.meta['bytes_descomprimidos'] = len(response.body)
+        self.stats.inc_value('red_carburantes/bytes_descomprimidos', len(response.body))
+        self.stats.inc_value('red_carburantes/descompresion_ms', request.meta['descompresion_ms'])
+        return response
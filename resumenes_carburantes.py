@@ -0,0 +1,156 @@
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from sqlite_carburantes import _iso, _numero
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS resumen_diario (
+    fecha TEXT NOT NULL,
+    nivel TEXT NOT NULL,
+    provincia TEXT NOT NULL,
+    municipio TEXT NOT NULL,
+    combustible TEXT NOT NULL,
+    estaciones INTEGER NOT NULL,
+    minimo REAL, media REAL, mediana REAL, p90 REAL,
+    PRIMARY KEY (fecha, nivel, provincia, municipio, combustible)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_resumen_combustible
+    ON resumen_diario (combustible, nivel, provincia, fecha);
+"""
+
+NIVELES = {
+    'provincia': ['provincia'],
+    'municipio': ['provincia', 'municipio'],
+}
+COLUMNAS = ['fecha', 'nivel', 'provincia', 'municipio', 'combustible', 'estaciones', 'minimo', 'media', 'mediana', 'p90']
+
+
+def _texto(df, columna):
+    if columna not in df.columns:
+        return np.full(len(df), '', dtype=object)
+    return df[columna].astype(str).str.strip().where(df[columna].notna(), '').to_numpy(dtype=object)
+
+
+def calcular_resumen(df, fecha):
+    """Mínimo, media, mediana y p90 de cada combustible por provincia y por municipio para un día
+
+    Los precios de todas las columnas 'Precio *' se apilan en una tabla larga
+    (una fila por estación y combustible informado) y cada nivel es un solo groupby.
+    """
+    if 'IDEESS' in df.columns:
+        df = df.drop_duplicates('IDEESS')
+    columnas_precio = [col for col in df.columns if col.startswith('Precio ')]
+    provincia, municipio = _texto(df, 'Provincia'), _texto(df, 'Municipio')
+
+    precios, combustibles, filas = [], [], []
+    for col in columnas_precio:
+        precio = _numero(df[col]).to_numpy(dtype='float64')
+        informado = np.flatnonzero(~np.isnan(precio))
+        precios.append(precio[informado])
+        filas.append(informado)
+        combustibles.append(np.full(len(informado), col[len('Precio '):], dtype=object))
+    if not precios or not sum(len(p) for p in precios):
+        return pd.DataFrame(columns=COLUMNAS)
+
+    filas = np.concatenate(filas)
+    largo = pd.DataFrame({
+        'provincia': provincia[filas],
+        'municipio': municipio[filas],
+        'combustible': np.concatenate(combustibles),
+        'precio': np.concatenate(precios),
+    })
+
+    resumenes = []
+    for nivel, claves in NIVELES.items():
+        grupos = largo.groupby(['combustible'] + claves, sort=False)['precio']
+        resumen = grupos.agg(estaciones='size', minimo='min', media='mean', mediana='median')
+        resumen['p90'] = grupos.quantile(0.9)
+        resumen = resumen.reset_index()
+        resumen['nivel'] = nivel
+        if 'municipio' not in resumen.columns:
+            resumen['municipio'] = ''
+        resumenes.append(resumen)
+
+    resumen = pd.concat(resumenes, ignore_index=True)
+    resumen['fecha'] = _iso(fecha)
+    for col in ['minimo', 'media', 'mediana', 'p90']:
+        resumen[col] = resumen[col].round(4)
+    return resumen[COLUMNAS]
+
+
+class AlmacenResumenes:
+    """Tabla SQLite con los agregados diarios por combustible, provincia y municipio
+
+    Cada día ocupa unas pocas miles de filas: añadir o repetir un día borra e
+    inserta solo las filas de esa fecha. nivel='provincia' lleva municipio vacío.
+    Puede compartir fichero con AlmacenSQLite.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        with closing(self.conectar()) as con:
+            con.executescript(ESQUEMA)
+
+    def conectar(self):
+        con = sqlite3.connect(self.ruta, timeout=600)
+        con.execute('PRAGMA journal_mode=WAL')
+        con.execute('PRAGMA synchronous=NORMAL')
+        return con
+
+    def agregar_dia(self, df, fecha):
+        """Calcular el resumen de un día y sustituir el de esa fecha para los combustibles que trae"""
+        combustibles = [col[len('Precio '):] for col in df.columns if col.startswith('Precio ')]
+        return self.guardar_resumen(calcular_resumen(df, fecha), fecha, combustibles)
+
+    def guardar_resumen(self, resumen, fecha, combustibles=None):
+        """Sustituir el resumen de una fecha; con `combustibles`, solo el de esos combustibles
+
+        Un día descargado con menos combustibles (por producto, por ejemplo) no borra
+        los agregados que ya había de los demás.
+        """
+        with closing(self.conectar()) as con, con:
+            if combustibles is None:
+                con.execute('DELETE FROM resumen_diario WHERE fecha = ?', (_iso(fecha),))
+            else:
+                con.executemany('DELETE FROM resumen_diario WHERE fecha = ? AND combustible = ?',
+                                [(_iso(fecha), combustible) for combustible in combustibles])
+            con.executemany(
+                f'INSERT INTO resumen_diario ({", ".join(COLUMNAS)}) VALUES ({", ".join("?" * len(COLUMNAS))})',
+                resumen[COLUMNAS].astype(object).where(resumen[COLUMNAS].notna(), None).itertuples(index=False, name=None),
+            )
+        return self.ruta
+
+    def consultar(self, combustible, desde=None, hasta=None, provincia=None, nivel='provincia'):
+        """Serie diaria de un combustible, por provincia o por municipio (fechas dd-mm-aaaa)"""
+        if nivel not in NIVELES:
+            raise ValueError(f'Nivel no soportado: {nivel} (usa {", ".join(NIVELES)})')
+        condiciones, parametros = ['combustible = ?', 'nivel = ?'], [combustible, nivel]
+        if provincia:
+            condiciones.append('provincia = ?')
+            parametros.append(provincia)
+        if desde:
+            condiciones.append('fecha >= ?')
+            parametros.append(_iso(desde))
+        if hasta:
+            condiciones.append('fecha <= ?')
+            parametros.append(_iso(hasta))
+        columnas = [c for c in COLUMNAS if c not in ('nivel', 'combustible') and (nivel == 'municipio' or c != 'municipio')]
+        with closing(self.conectar()) as con:
+            df = pd.read_sql_query(
+                f'SELECT {", ".join(columnas)} FROM resumen_diario WHERE {" AND ".join(condiciones)} '
+                f'ORDER BY {", ".join(NIVELES[nivel])}, fecha',
+                con, params=parametros,
+            )
+        if len(df):
+            df['fecha'] = pd.to_datetime(df['fecha'], format='%Y-%m-%d').dt.strftime('%d-%m-%Y')
+        return df
+
+    def fechas(self):
+        """Fechas con resumen (dd-mm-aaaa), en orden cronológico"""
+        with closing(self.conectar()) as con:
+            filas = con.execute("SELECT DISTINCT fecha FROM resumen_diario WHERE nivel = 'provincia' ORDER BY fecha").fetchall()
+        return [datetime.strptime(f, '%Y-%m-%d').strftime('%d-%m-%Y') for (f,) in filas]
@@ -1,13 +1,40 @@
 import scrapy
 from datetime import datetime, timedelta
 import json
+import logging
+import tracemalloc
 import pandas as pd
 import os
 import re
+import sys
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scrapy import signals
+from scrapy.spidermiddlewares.httperror import HttpError
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet import defer
+from twisted.python import failure
+
+from cache_carburantes import CACHE_MAX_MB, CacheRespuestas, CacheRespuestasMiddleware, validadores_respuesta
+from escritores_carburantes import crear_escritor
+from dataset_carburantes import DatasetParticionado
+from normalizado_carburantes import AlmacenNormalizado
+from deltas_carburantes import AlmacenDeltas
+from sqlite_carburantes import AlmacenSQLite
+from resumenes_carburantes import AlmacenResumenes
+from json_carburantes import PRODUCTOS, columnas_estaciones, columnas_productos
+from esquema_carburantes import aplicar_esquema
+from manifiesto_carburantes import ManifiestoDescargas
+from planificador_carburantes import PlanificadorAdaptativo, orden_huecos_primero
+from red_carburantes import BytesRedMiddleware, DescompresionMiddleware
+from metricas_carburantes import MedidorEtapas, MetricasEtapas, perfilar
+
+logger = logging.getLogger('carburantes_historicos')
 
 class CarburantesSpider(scrapy.Spider):
     name = 'carburantes_historicos'
+    base_url = 'https://sedeaplicaciones.minetur.gob.es/ServiciosRESTCarburantes/PreciosCarburantes'
+    endpoint = 'EstacionesTerrestresHist'
     
     custom_settings = {
         'DOWNLOAD_DELAY': 3,
@@ -34,11 +61,28 @@ class CarburantesSpider(scrapy.Spider):
         
         'ROBOTSTXT_OBEY': False,
         'COOKIES_ENABLED': False,
+        # HttpCompressionMiddleware pide gzip/deflate (y br/zstd si están brotli/zstandard) y descomprime
+        'COMPRESSION_ENABLED': True,
         'LOG_LEVEL': 'INFO',
         'TELNETCONSOLE_ENABLED': False,
+        
+        # Por clase y no por ruta: runspider quita la carpeta del spider de sys.path tras importarlo
+        'DOWNLOADER_MIDDLEWARES': {
+            CacheRespuestasMiddleware: 50,
+            DescompresionMiddleware: 585,
+            BytesRedMiddleware: 595,
+            PlanificadorAdaptativo: 950,
+        },
     }
     
-    def __init__(self, fecha_inicio=None, fecha_fin=None, combustibles_extra=None, *args, **kwargs):
+    def __init__(self, fecha_inicio=None, fecha_fin=None, combustibles_extra=None,
+                 cache='1', cache_dir=None, cache_max_mb=None, refrescar_dias='1',
+                 formato='xlsx', dataset=None, medir_memoria='0', procesos='0', cola_max=None,
+                 manifiesto=None, modo=None, normalizado=None, deltas=None, sqlite=None,
+                 output_dir=None, adaptativo='0', informe=None, perfilar=None,
+                 resumen=None, presupuesto_mb=None, max_en_vuelo=None,
+                 estrategia='completo', max_productos='1',
+                 *args, **kwargs):
         super(CarburantesSpider, self).__init__(*args, **kwargs)
         
         if fecha_inicio:
@@ -55,72 +99,326 @@ class CarburantesSpider(scrapy.Spider):
         if combustibles_extra:
             self.combustibles_extra = combustibles_extra.split(',')
             self.logger.info(f'🔥 Combustibles extra a conservar: {self.combustibles_extra}')
+        
+        self.productos = self.elegir_productos(estrategia, int(max_productos))
+        
+        self.escritor = crear_escritor(formato)
+        self.logger.info(f'📝 Formato de salida: {self.escritor.extension}')
             
         self.fechas = []
         fecha_actual = self.fecha_inicio
         while fecha_actual <= self.fecha_fin:
             self.fechas.append(fecha_actual.strftime('%d-%m-%Y'))
             fecha_actual += timedelta(days=1)
+        
+        self.manifiesto = None
+        if manifiesto:
+            self.manifiesto = ManifiestoDescargas(manifiesto)
+            if modo == 'sync':
+                self.fechas = self.manifiesto.fechas_sync(desde=self.fecha_inicio, hasta=self.fecha_fin)
+                self.logger.info(f'🔄 Modo sync: {len(self.fechas)} fechas pendientes según {manifiesto}')
+                if self.fechas:
+                    self.fecha_inicio = datetime.strptime(self.fechas[0], '%d-%m-%Y')
+                    self.fecha_fin = max(self.fecha_fin, datetime.strptime(self.fechas[-1], '%d-%m-%Y'))
+            else:
+                total = len(self.fechas)
+                self.fechas = self.manifiesto.pendientes(self.fechas)
+                self.logger.info(f'📒 Manifiesto {manifiesto}: {total - len(self.fechas)} fechas ya completadas se omiten')
+        elif modo == 'sync':
+            raise ValueError("El modo 'sync' necesita un manifiesto (-a manifiesto=ruta.jsonl)")
+        
+        self.adaptativo = str(adaptativo) == '1'
+        if self.adaptativo:
+            completadas = [f for f in self.manifiesto.registros if self.manifiesto.completada(f)] if self.manifiesto else []
+            self.fechas = orden_huecos_primero(self.fechas, completadas)
+            self.logger.info('🧭 Planificador adaptativo: se empieza por los huecos y la concurrencia se ajusta a la respuesta del servidor')
             
         self.logger.info(f'🎯 Preparado para procesar {len(self.fechas)} fechas')
         self.logger.info(f'📅 Desde: {self.fecha_inicio.strftime("%d-%m-%Y")}')
         self.logger.info(f'📅 Hasta: {self.fecha_fin.strftime("%d-%m-%Y")}')
         
-        fecha_str = f'{self.fecha_inicio.strftime("%Y%m%d")}_{self.fecha_fin.strftime("%Y%m%d")}'
-        self.output_dir = f'carburantes_scrapy_{fecha_str}'
-        os.makedirs(self.output_dir, exist_ok=True)
-        self.logger.info(f'📁 Archivos se guardarán en: {self.output_dir}')
+        if output_dir:
+            self.output_dir = output_dir
+        else:
+            fecha_str = f'{self.fecha_inicio.strftime("%Y%m%d")}_{self.fecha_fin.strftime("%Y%m%d")}'
+            self.output_dir = f'carburantes_scrapy_{fecha_str}'
+        
+        self.dataset = None
+        if dataset:
+            self.dataset = DatasetParticionado(dataset)
+            self.logger.info(f'🗄️ Modo dataset consolidado: {dataset} (particiones anio=/mes=)')
+        
+        self.normalizado = None
+        if normalizado:
+            self.normalizado = AlmacenNormalizado(normalizado)
+            self.logger.info(f'🧩 Almacén normalizado (estaciones + precios diarios): {normalizado}')
+        
+        self.deltas = None
+        if deltas:
+            self.deltas = AlmacenDeltas(deltas)
+            self.logger.info(f'🎞️ Almacén de deltas (foto mensual + cambios diarios): {deltas}')
+        
+        self.sqlite = None
+        if sqlite:
+            self.sqlite = AlmacenSQLite(sqlite)
+            self.logger.info(f'🗃️ Base de datos SQLite de precios: {sqlite}')
+        
+        self.resumen = None
+        if resumen:
+            # Crear la tabla aquí, antes de que los procesos del pool escriban a la vez
+            self.resumen = AlmacenResumenes(resumen)
+            self.logger.info(f'📈 Resumen diario por provincia y municipio (mín/media/mediana/p90): {resumen}')
         
+        if self.dataset is None and self.normalizado is None and self.deltas is None and self.sqlite is None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            self.logger.info(f'📁 Archivos se guardarán en: {self.output_dir}')
+        
+        self.medir_memoria = str(medir_memoria) == '1'
+        if self.medir_memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        
+        self.cache = None
+        if str(cache) != '0':
+            max_mb = CACHE_MAX_MB if cache_max_mb is None else cache_max_mb
+            self.cache = CacheRespuestas(cache_dir, max_mb=max_mb, refrescar_dias=refrescar_dias)
+            limite = f'{float(max_mb):g} MB' if self.cache.max_bytes else 'sin límite'
+            self.logger.info(f'💾 Caché de respuestas en: {self.cache.directorio} ({limite}, se refrescan los últimos {self.cache.refrescar_dias} días)')
+        
+        self.metricas = MetricasEtapas()
+        self.informe = informe
+        fecha_perfil = None
+        if perfilar and self.fechas:
+            # '1' perfila la primera fecha que se va a procesar; si no, la fecha indicada
+            fecha_perfil = self.fechas[0] if str(perfilar) == '1' else perfilar
+            carpeta_perfil = os.path.dirname(informe) if informe else self.output_dir
+            ruta_perfil = os.path.join(carpeta_perfil, f'perfil_{fecha_perfil.replace("-", "_")}.prof')
+            self.logger.info(f'🔬 Se perfilará con cProfile el día {fecha_perfil} → {ruta_perfil}')
+        
+        # Todo lo que necesita procesar_dia, en un dict serializable para los procesos del pool
+        self.config_procesado = {
+            'combustibles_extra': self.combustibles_extra,
+            'formato': self.escritor.extension,
+            'output_dir': self.output_dir,
+            'dataset': dataset,
+            'normalizado': normalizado,
+            'deltas': deltas,
+            'sqlite': sqlite,
+            'resumen': resumen,
+            'medir_memoria': self.medir_memoria,
+            'perfilar': fecha_perfil,
+            'perfil_ruta': ruta_perfil if fecha_perfil else None,
+        }
+        
+        # Presupuesto de memoria: no se sueltan más peticiones mientras lo descargado y sin guardar lo supere
+        self.presupuesto_bytes = int(float(presupuesto_mb) * 1024 * 1024) if presupuesto_mb else None
+        self.max_en_vuelo = int(max_en_vuelo) if max_en_vuelo else None
+        self.en_vuelo = 0
+        self.tamaño_medio = 16 * 1024 * 1024
+        if self.presupuesto_bytes or self.max_en_vuelo:
+            self.logger.info(f'🪫 Presupuesto de descarga: {presupuesto_mb or "sin límite de"} MB, '
+                             f'{max_en_vuelo or "sin límite de"} días en vuelo')
+        
+        self.procesos = int(procesos or 0)
+        self.pool = None
+        if self.procesos > 0:
+            # Los procesos hijos tienen que poder importar este módulo por su nombre
+            carpeta = os.path.dirname(os.path.abspath(__file__))
+            if carpeta not in sys.path:
+                sys.path.insert(0, carpeta)
+            self.cola_max = int(cola_max or 2 * self.procesos)
+            self.pool = ProcessPoolExecutor(max_workers=self.procesos)
+            self.cola_pool = defer.DeferredSemaphore(self.cola_max)
+            self.logger.info(f'⚙️ Procesado en {self.procesos} procesos (máximo {self.cola_max} días en cola)')
+    
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        if spider.pool is not None:
+            # Las respuestas esperando al pool cuentan para el slot del scraper: hay que dejar
+            # sitio a toda la cola para que descarga y procesado se solapen de verdad
+            tamaño_cola = spider.cola_max * 16 * 1024 * 1024
+            if crawler.settings.getint('SCRAPER_SLOT_MAX_ACTIVE_SIZE') < tamaño_cola:
+                crawler.settings.set('SCRAPER_SLOT_MAX_ACTIVE_SIZE', tamaño_cola, priority='spider')
+        if spider.presupuesto_bytes:
+            # El motor también deja de descargar cuando las respuestas sin procesar llenan el presupuesto
+            crawler.settings.set('SCRAPER_SLOT_MAX_ACTIVE_SIZE', spider.presupuesto_bytes, priority='spider')
+        if spider.manifiesto is not None:
+            crawler.signals.connect(spider.registrar_en_manifiesto, signal=signals.item_scraped)
+        if spider.adaptativo:
+            # El planificador sustituye a AutoThrottle y decide la concurrencia por debajo de este tope
+            crawler.settings.set('ADAPTATIVO_ENABLED', True, priority='spider')
+            crawler.settings.set('AUTOTHROTTLE_ENABLED', False, priority='spider')
+            crawler.settings.set('CONCURRENT_REQUESTS', crawler.settings.getint('ADAPTATIVO_CONCURRENCIA_MAX', 16), priority='spider')
+            crawler.settings.set('DOWNLOAD_DELAY', crawler.settings.getfloat('ADAPTATIVO_RETARDO_INICIAL', 1.0), priority='spider')
+        return spider
+        
+    async def start(self):
+        """Punto de entrada de Scrapy >= 2.13, que ya no llama a start_requests
+
+        Scrapy consume start() sin esperar, así que con presupuesto la pausa se hace
+        aquí: la siguiente petición no se genera hasta que haya sitio.
+        """
+        for request in self.start_requests():
+            if self.presupuesto_bytes or self.max_en_vuelo:
+                await self.esperar_presupuesto()
+            self.en_vuelo += 1
+            self.crawler.stats.max_value('presupuesto/max_en_vuelo', self.en_vuelo)
+            yield request
+    
+    def presupuesto_superado(self):
+        """Hay días en vuelo y soltar uno más pasaría del presupuesto de días o de memoria"""
+        if self.en_vuelo == 0:
+            return False
+        if self.max_en_vuelo and self.en_vuelo >= self.max_en_vuelo:
+            return True
+        if self.presupuesto_bytes:
+            motor = self.crawler.engine
+            # Respuestas en el scraper (esperando o en procesado) más las que se están descargando
+            pendiente = motor.scraper.slot.active_size + len(motor.downloader.active) * self.tamaño_medio
+            self.crawler.stats.max_value('presupuesto/max_pendiente_mb', round(pendiente / 1024 / 1024))
+            return pendiente + self.tamaño_medio > self.presupuesto_bytes
+        return False
+    
+    async def esperar_presupuesto(self):
+        from twisted.internet import reactor, task
+        
+        if self.presupuesto_superado():
+            self.crawler.stats.inc_value('presupuesto/pausas')
+        while self.presupuesto_superado():
+            await maybe_deferred_to_future(task.deferLater(reactor, 0.05, lambda: None))
+    
+    def elegir_productos(self, estrategia, max_productos):
+        """[(combustible, id de producto)] a pedir por FiltroProducto, o None para la respuesta completa
+
+        Cada respuesta por producto repite los datos de la estación y es una petición
+        más (con su DOWNLOAD_DELAY), así que 'auto' solo la usa con pocos combustibles
+        y todos con id de producto.
+        """
+        if estrategia not in ('auto', 'completo', 'producto'):
+            raise ValueError(f"Estrategia no soportada: {estrategia} (usa auto, completo o producto)")
+        por_nombre = {nombre.lower(): nombre for nombre in PRODUCTOS}
+        nombres = [por_nombre.get(c.strip().lower()) for c in self.combustibles_extra if c.strip()]
+        sin_id = [c.strip() for c, nombre in zip(self.combustibles_extra, nombres) if nombre is None]
+        
+        if estrategia == 'producto':
+            if not nombres or sin_id:
+                raise ValueError(f"La estrategia 'producto' necesita combustibles con id de producto (sin id: {sin_id or 'ninguno elegido'})")
+        elif estrategia == 'completo' or not nombres or sin_id or len(nombres) > max_productos:
+            if estrategia == 'auto' and nombres:
+                motivo = f'sin id de producto: {sin_id}' if sin_id else f'más de {max_productos} combustibles'
+                self.logger.info(f'📦 Se descarga la respuesta completa de cada día ({motivo})')
+            return None
+        
+        productos = [(nombre, PRODUCTOS[nombre]) for nombre in dict.fromkeys(nombres)]
+        self.logger.info(f'🎯 Descarga por producto (FiltroProducto): {", ".join(f"{n} ({i})" for n, i in productos)}')
+        return productos
+    
     def start_requests(self):
         """Generar todas las peticiones iniciales"""
-        base_url = 'https://sedeaplicaciones.minetur.gob.es/ServiciosRESTCarburantes/PreciosCarburantes/EstacionesTerrestresHist'
-        
         for fecha in self.fechas:
-            url = f'{base_url}/{fecha}'
+            if self.productos:
+                yield self.peticion_producto(fecha, self.productos, [])
+                continue
+            url = f'{self.base_url}/{self.endpoint}/{fecha}'
             yield scrapy.Request(
                 url=url,
                 callback=self.parse_datos,
-                meta={'fecha': fecha},
+                errback=self.error_descarga,
+                meta={'fecha': fecha, 'endpoint': self.endpoint},
                 dont_filter=True,
             )
     
-    def parse_datos(self, response):
+    def peticion_producto(self, fecha, pendientes, partes):
+        """Petición FiltroProducto del primer combustible pendiente; las respuestas anteriores van en meta"""
+        (combustible, id_producto), *resto = pendientes
+        return scrapy.Request(
+            url=f'{self.base_url}/{self.endpoint}/FiltroProducto/{fecha}/{id_producto}',
+            callback=self.parse_datos,
+            errback=self.error_descarga,
+            meta={'fecha': fecha, 'endpoint': f'{self.endpoint}/FiltroProducto/{id_producto}',
+                  'combustible': combustible, 'pendientes': resto, 'partes': partes},
+            dont_filter=True,
+        )
+    
+    async def parse_datos(self, response):
         """Procesar la respuesta JSON de cada fecha"""
+        self.tamaño_medio = int(0.8 * self.tamaño_medio + 0.2 * len(response.body))
+        try:
+            async for item in self._parse_datos(response):
+                yield item
+        finally:
+            self.en_vuelo -= 1
+    
+    def error_descarga(self, failure):
+        """Registrar como item el día que no se pudo descargar (HTTP de error tras los reintentos, red...)"""
+        self.en_vuelo -= 1
+        fecha = failure.request.meta['fecha']
+        if failure.check(HttpError):
+            response = failure.value.response
+            self.logger.error(f'🚨 {fecha}: HTTP {response.status}')
+            yield {
+                'fecha': fecha,
+                'status': f'http_{response.status}',
+                'error': response.body[:200].decode('utf-8', 'replace') if response.body else 'Sin contenido'
+            }
+            return
+        self.logger.error(f'🔌 {fecha}: Error de descarga - {failure.getErrorMessage()[:100]}')
+        yield {
+            'fecha': fecha,
+            'status': 'download_error',
+            'error': failure.getErrorMessage()[:200]
+        }
+    
+    async def _parse_datos(self, response):
         fecha = response.meta['fecha']
         
+        if response.status == 200:
+            partes = response.meta.get('partes', []) + [self.parte_respuesta(response)]
+            if response.meta.get('pendientes'):
+                # Falta algún producto del día: se pide y el día cuenta como uno solo en vuelo
+                self.en_vuelo += 1
+                yield self.peticion_producto(fecha, response.meta['pendientes'], partes)
+                return
+        
+        if response.status == 200 and all('no_modificado' in parte['flags'] for parte in partes):
+            previo = self.resultado_previo(fecha)
+            if previo is not None:
+                self.logger.info(f'♻️ {fecha}: sin cambios en el servidor (304), no se vuelve a procesar')
+                self.crawler.stats.inc_value('cache_carburantes/reprocesado_evitado')
+                item = dict(previo, fecha=fecha, status='success', sin_cambios=True, cache=True,
+                            etapas={'red': {'ms': round(sum(parte['latencia_ms'] or 0 for parte in partes), 2)}})
+                self.anotar_red(item, partes)
+                self.metricas.registrar(item)
+                yield item
+                return
+        
         if response.status == 200:
             try:
-                data = json.loads(response.text)
-                
-                if 'ListaEESSPrecio' in data and data['ListaEESSPrecio']:
-                    df = pd.DataFrame(data['ListaEESSPrecio'])
-                    
-                    df['FechaConsulta'] = fecha
-                    df['FechaDescarga'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    df = self.limpiar_datos(df)
-                    
-                    nombre_archivo = f'precios_{fecha.replace("-", "_")}.xlsx'
-                    ruta_archivo = os.path.join(self.output_dir, nombre_archivo)
-                    df.to_excel(ruta_archivo, index=False, engine='openpyxl')
-                    
-                    self.logger.info(f'✅ {fecha}: {len(df)} estaciones → {nombre_archivo}')
-
-                    yield {
-                        'fecha': fecha,
-                        'estaciones': len(df),
-                        'status': 'success',
-                        'archivo': nombre_archivo,
-                        'tamaño_kb': round(os.path.getsize(ruta_archivo) / 1024, 1)
-                    }
+                if 'combustible' in response.meta:
+                    cuerpo = {parte['combustible']: parte['cuerpo'] for parte in partes}
+                else:
+                    cuerpo = response.body
+                if self.pool is None:
+                    item = procesar_dia(cuerpo, response.encoding, fecha, self.config_procesado)
                 else:
-                    self.logger.warning(f'⚠️  {fecha}: Sin datos en la respuesta')
-                    yield {
-                        'fecha': fecha,
-                        'estaciones': 0,
-                        'status': 'no_data',
-                        'archivo': None
-                    }
+                    item = await self.procesar_en_pool(cuerpo, response.encoding, fecha)
+                
+                etapas = item.setdefault('etapas', {})
+                latencias = [parte['latencia_ms'] for parte in partes if 'cached' not in parte['flags'] and parte['latencia_ms'] is not None]
+                if latencias:
+                    etapas['red'] = {'ms': round(sum(latencias), 2)}
+                self.anotar_red(item, partes)
+                if item['status'] == 'success':
+                    if self.cache is not None and any('cached' not in parte['flags'] for parte in partes):
+                        medidor = MedidorEtapas()
+                        with medidor.medir('cache'):
+                            for parte in partes:
+                                if 'cached' not in parte['flags']:
+                                    self.cache.guardar(parte['endpoint'], fecha, parte['cuerpo'], parte['validadores'])
+                        etapas.update(medidor.etapas)
+                    item['cache'] = all('cached' in parte['flags'] for parte in partes)
+                self.metricas.registrar(item)
+                yield item
                     
             except json.JSONDecodeError as e:
                 self.logger.error(f'❌ {fecha}: Error JSON - {str(e)[:100]}')
@@ -145,78 +443,270 @@ class CarburantesSpider(scrapy.Spider):
                 'error': response.text[:200] if response.text else 'Sin contenido'
             }
     
+    async def procesar_en_pool(self, cuerpo, encoding, fecha):
+        """Mandar el día a un proceso del pool sin bloquear el reactor, con cola acotada"""
+        await maybe_deferred_to_future(self.cola_pool.acquire())
+        try:
+            future = self.pool.submit(procesar_dia, cuerpo, encoding, fecha, self.config_procesado)
+            return await maybe_deferred_to_future(deferred_desde_future(future))
+        finally:
+            self.cola_pool.release()
+    
+    def parte_respuesta(self, response):
+        """Lo que hace falta de una respuesta del día (la completa o la de un producto) para procesarlo y guardarlo"""
+        latencia = response.meta.get('download_latency')
+        parte = {
+            'combustible': response.meta.get('combustible'),
+            'endpoint': response.meta['endpoint'],
+            'cuerpo': response.body,
+            'flags': list(response.flags),
+            'validadores': validadores_respuesta(response),
+            'latencia_ms': round(latencia * 1000, 2) if latencia is not None else None,
+        }
+        for clave in ('bytes_red', 'codificacion', 'bytes_descomprimidos', 'descompresion_ms'):
+            if clave in response.meta:
+                parte[clave] = response.meta[clave]
+        return parte
+    
+    def anotar_red(self, item, partes):
+        """Bytes por la red, tamaño descomprimido y tiempo de descompresión de las respuestas del día"""
+        por_red = [parte for parte in partes if 'bytes_red' in parte]
+        if not por_red:
+            return
+        item['bytes_red'] = sum(parte['bytes_red'] for parte in por_red)
+        item['codificacion'] = por_red[-1].get('codificacion')
+        descomprimidas = [parte for parte in por_red if 'bytes_descomprimidos' in parte]
+        if descomprimidas:
+            item['bytes_descomprimidos'] = sum(parte['bytes_descomprimidos'] for parte in descomprimidas)
+            ms = round(sum(parte['descompresion_ms'] for parte in descomprimidas), 2)
+            item.setdefault('etapas', {})['descompresion'] = {'ms': ms}
+    
+    def resultado_previo(self, fecha):
+        """Lo ya guardado de una fecha (archivo, ruta, estaciones) o None si hay que procesarla"""
+        if self.manifiesto is not None and self.manifiesto.completada(fecha):
+            registro = self.manifiesto.registros[fecha]
+            ruta = registro.get('archivo')
+            return {'estaciones': registro.get('estaciones'), 'archivo': os.path.basename(ruta) if ruta else None, 'ruta': ruta}
+        if self.dataset is None and self.normalizado is None and self.deltas is None and self.sqlite is None:
+            nombre = f'precios_{fecha.replace("-", "_")}.{self.escritor.extension}'
+            ruta = os.path.join(self.output_dir, nombre)
+            if os.path.exists(ruta):
+                return {'archivo': nombre, 'ruta': os.path.abspath(ruta)}
+        return None
+    
+    def registrar_en_manifiesto(self, item, response=None, spider=None):
+        """Guardar en el manifiesto el resultado de cada fecha en cuanto se produce"""
+        self.manifiesto.registrar(item)
+    
     def limpiar_datos(self, df):
         """Limpieza de datos optimizada con preservación de combustibles seleccionados"""
-        if df.empty:
-            return df
-            
-        regex_lat = re.compile(r'latitud', re.IGNORECASE)
-        regex_lon = re.compile(r'longitud', re.IGNORECASE)
-        lat_cols = [col for col in df.columns if regex_lat.search(col)]
-        lon_cols = [col for col in df.columns if regex_lon.search(col)]
-        
-        for col in lat_cols + lon_cols:
-            if col in df.columns:
-                serie = df[col].replace(['#####', ''], np.nan)
-                serie = serie.astype(str).str.strip().str.replace(',', '.', regex=False)
-                df[col] = pd.to_numeric(serie, errors='coerce')
-        
-        columnas_combustibles = [col for col in df.columns if col.startswith('Precio ')]
-        
-        combustibles_usuario = []
-        if self.combustibles_extra:
-            for combustible_usuario in self.combustibles_extra:
-                matches = []
-                for col in columnas_combustibles:
-                    nombre_combustible = col.replace('Precio ', '')
-                    if combustible_usuario.strip().lower() == nombre_combustible.strip().lower():
-                        matches.append(col)
-                combustibles_usuario.extend(matches)
-        
-        cols_fundamentales = ['IDEESS', 'Rótulo', 'Dirección', 'C.P.', 'Localidad', 'Municipio', 'Provincia']
-        cols_importantes = (lat_cols + lon_cols + cols_fundamentales + combustibles_usuario)
-        
-        combustibles_no_seleccionados = [col for col in columnas_combustibles if col not in combustibles_usuario]
-        columnas_eliminadas = []
-        
-        for col in combustibles_no_seleccionados:
-            df = df.drop(columns=[col])
-            columnas_eliminadas.append(f"{col} (combustible no seleccionado)")
-        
-        def es_vacio(x):
-            return pd.isna(x) or x == '' or x == '#####'
-        
-        for col in list(df.columns):
-            if col not in cols_importantes:
-                vacios = df[col].apply(es_vacio).sum()
-                if vacios / len(df) > 0.8:
-                    df = df.drop(columns=[col])
-                    columnas_eliminadas.append(f"{col} (>80% vacíos)")
-                    continue
-                    
-                valores = df[col].astype(str).str.replace(',', '.').str.strip()
-                if len(valores.mode()) > 0:
-                    valor_frecuente = valores.mode()[0]
-                    frecuencia = (valores == valor_frecuente).sum() / len(df)
-                    if frecuencia > 0.9:
-                        df = df.drop(columns=[col])
-                        columnas_eliminadas.append(f"{col} (>90% mismo valor)")
-        
-        self.logger.info(f'🔥 Total combustibles disponibles: {len(columnas_combustibles)}')
-        self.logger.info(f'❌ Combustibles eliminados: {len(combustibles_no_seleccionados)}')
-        if combustibles_usuario:
-            self.logger.info(f'⭐ Combustibles preservados: {combustibles_usuario}')
-        else:
-            self.logger.info(f'⚠️ NINGÚN combustible seleccionado - Excel sin precios')
-        self.logger.info(f'🗑️ Total columnas eliminadas: {len(columnas_eliminadas)}')
-        
-        if 'C.P.' in df.columns:
-            df['C.P.'] = df['C.P.'].astype(str).apply(
-                lambda x: f"'{x.zfill(5)}" if x.isdigit() else f"'{x}"
-            )
+        return limpiar_dataframe(df, self.combustibles_extra)
+    
+    def closed(self, reason):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
         
-        if 'Localidad' in df.columns:
-            df = df.sort_values('Localidad', na_position='last')
+        resumen = self.metricas.resumen()
+        stats = self.crawler.stats
+        self.metricas.volcar_stats(stats, resumen)
+        for nombre, datos in resumen.items():
+            self.logger.info(f'⏱️ {nombre}: p50 {datos["p50_ms"]} ms, p90 {datos["p90_ms"]} ms, total {datos["total_ms"] / 1000:.1f} s ({datos["dias"]} días)')
+        if self.informe:
+            extra = {'motivo': reason, 'fechas': len(self.fechas), 'config': self.config_procesado}
+            ruta = self.metricas.guardar_informe(self.informe, stats.get_stats(), extra)
+            self.logger.info(f'📊 Informe de rendimiento guardado en {ruta}')
+
+
+def procesar_dia(cuerpo, encoding, fecha, config):
+    """Decodificar, limpiar y guardar un día; se ejecuta en el reactor o en un proceso del pool"""
+    if config.get('perfilar') != fecha:
+        return _procesar_dia(cuerpo, encoding, fecha, config)
+    with perfilar(config['perfil_ruta']):
+        item = _procesar_dia(cuerpo, encoding, fecha, config)
+    item['perfil'] = os.path.abspath(config['perfil_ruta'])
+    return item
+
+
+def _procesar_dia(cuerpo, encoding, fecha, config):
+    medidor = MedidorEtapas(config['medir_memoria'])
+    
+    # Las estaciones se leen por bloques desde los bytes, sin response.text ni el dict completo;
+    # con la estrategia por producto llega un cuerpo por combustible y se unen por IDEESS
+    with medidor.medir('decodificar'):
+        if isinstance(cuerpo, dict):
+            columnas = columnas_productos(cuerpo, encoding)
+        else:
+            columnas = columnas_estaciones(cuerpo, encoding)
+    
+    if not columnas:
+        logger.warning(f'⚠️  {fecha}: Sin datos en la respuesta')
+        return {
+            'fecha': fecha,
+            'estaciones': 0,
+            'status': 'no_data',
+            'archivo': None,
+            'etapas': medidor.etapas,
+        }
+    
+    with medidor.medir('dataframe'):
+        df = pd.DataFrame(columnas)
+        del columnas
         
+        df['FechaConsulta'] = fecha
+        df['FechaDescarga'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    if config.get('resumen'):
+        # Con todos los combustibles de la respuesta, antes de que la limpieza quite los no seleccionados
+        with medidor.medir('resumen'):
+            AlmacenResumenes(config['resumen']).agregar_dia(df, fecha)
+    
+    with medidor.medir('limpiar'):
+        df = limpiar_dataframe(df, config['combustibles_extra'])
+    
+    with medidor.medir('guardar'):
+        nombre_archivo, ruta_archivo = guardar_dia(df, fecha, config)
+    
+    total_ms = sum(etapa['ms'] for etapa in medidor.etapas.values())
+    logger.info(f'✅ {fecha}: {len(df)} estaciones → {nombre_archivo} ({total_ms:.0f} ms)')
+    
+    item = {
+        'fecha': fecha,
+        'estaciones': len(df),
+        'status': 'success',
+        'archivo': nombre_archivo,
+        'ruta': os.path.abspath(ruta_archivo),
+        'tamaño_kb': round(os.path.getsize(ruta_archivo) / 1024, 1),
+        'etapas': medidor.etapas,
+    }
+    if config['medir_memoria']:
+        item['memoria_pico_mb'] = medidor.pico_mb
+        logger.info(f'🧠 {fecha}: pico de memoria {item["memoria_pico_mb"]} MB')
+    return item
+
+
+def guardar_dia(df, fecha, config):
+    """Guardar un día limpio en los almacenes elegidos o, si no hay ninguno, en su archivo diario"""
+    guardados = []
+    
+    if config['dataset']:
+        dataset = DatasetParticionado(config['dataset'])
+        ruta = dataset.agregar_dia(df, fecha)
+        guardados.append((os.path.relpath(ruta, dataset.raiz), ruta))
+    
+    if config['normalizado']:
+        almacen = AlmacenNormalizado(config['normalizado'])
+        ruta = almacen.agregar_dia(df, fecha)
+        guardados.append((os.path.relpath(ruta, almacen.raiz), ruta))
+    
+    if config['deltas']:
+        almacen = AlmacenDeltas(config['deltas'])
+        ruta = almacen.agregar_dia(df, fecha)
+        guardados.append((os.path.relpath(ruta, almacen.raiz), ruta))
+    
+    if config['sqlite']:
+        ruta = AlmacenSQLite(config['sqlite']).agregar_dia(df, fecha)
+        guardados.append((os.path.basename(ruta), ruta))
+    
+    if not guardados:
+        escritor = crear_escritor(config['formato'])
+        nombre_archivo = f'precios_{fecha.replace("-", "_")}.{escritor.extension}'
+        ruta = os.path.join(config['output_dir'], nombre_archivo)
+        escritor.escribir(df, ruta)
+        guardados.append((nombre_archivo, ruta))
+    
+    return guardados[0]
+
+
+def deferred_desde_future(future):
+    """Convertir un concurrent.futures.Future en un Deferred que se dispara en el reactor"""
+    from twisted.internet import reactor
+    
+    d = defer.Deferred()
+    
+    def terminado(f):
+        error = f.exception()
+        if error is None:
+            reactor.callFromThread(d.callback, f.result())
+        else:
+            reactor.callFromThread(d.errback, failure.Failure(error))
+    
+    future.add_done_callback(terminado)
+    return d
+
+
+def limpiar_dataframe(df, combustibles_extra=None):
+    """Limpieza de datos optimizada con preservación de combustibles seleccionados"""
+    if df.empty:
         return df
 
+    regex_lat = re.compile(r'latitud', re.IGNORECASE)
+    regex_lon = re.compile(r'longitud', re.IGNORECASE)
+    lat_cols = [col for col in df.columns if regex_lat.search(col)]
+    lon_cols = [col for col in df.columns if regex_lon.search(col)]
+
+    for col in lat_cols + lon_cols:
+        if col in df.columns:
+            serie = df[col].replace(['#####', ''], np.nan)
+            serie = serie.astype(str).str.strip().str.replace(',', '.', regex=False)
+            df[col] = pd.to_numeric(serie, errors='coerce')
+
+    columnas_combustibles = [col for col in df.columns if col.startswith('Precio ')]
+
+    combustibles_usuario = []
+    if combustibles_extra:
+        por_nombre = {}
+        for col in columnas_combustibles:
+            por_nombre.setdefault(col.replace('Precio ', '').strip().lower(), []).append(col)
+        for combustible_usuario in combustibles_extra:
+            combustibles_usuario.extend(por_nombre.get(combustible_usuario.strip().lower(), []))
+
+    cols_fundamentales = ['IDEESS', 'Rótulo', 'Dirección', 'C.P.', 'Localidad', 'Municipio', 'Provincia']
+    cols_importantes = set(lat_cols + lon_cols + cols_fundamentales + combustibles_usuario)
+
+    combustibles_no_seleccionados = [col for col in columnas_combustibles if col not in combustibles_usuario]
+    columnas_eliminadas = [f"{col} (combustible no seleccionado)" for col in combustibles_no_seleccionados]
+    a_eliminar = list(combustibles_no_seleccionados)
+
+    no_seleccionados = set(combustibles_no_seleccionados)
+    candidatas = [col for col in df.columns if col not in cols_importantes and col not in no_seleccionados]
+    if candidatas:
+        total = len(df)
+        sub = df[candidatas]
+        # Una sola máscara para nulos y centinelas en todas las columnas candidatas
+        vacios = (sub.isna() | sub.isin(['', '#####'])).sum()
+
+        for col in candidatas:
+            if vacios[col] / total > 0.8:
+                a_eliminar.append(col)
+                columnas_eliminadas.append(f"{col} (>80% vacíos)")
+                continue
+
+            # La moda y su frecuencia salen de un único value_counts
+            valores = sub[col].astype(str).str.replace(',', '.').str.strip()
+            conteos = valores.value_counts()
+            if len(conteos) > 0 and conteos.iloc[0] / total > 0.9:
+                a_eliminar.append(col)
+                columnas_eliminadas.append(f"{col} (>90% mismo valor)")
+
+    df = df.drop(columns=a_eliminar)
+
+    logger.info(f'🔥 Total combustibles disponibles: {len(columnas_combustibles)}')
+    logger.info(f'❌ Combustibles eliminados: {len(combustibles_no_seleccionados)}')
+    if combustibles_usuario:
+        logger.info(f'⭐ Combustibles preservados: {combustibles_usuario}')
+    else:
+        logger.info(f'⚠️ NINGÚN combustible seleccionado - Excel sin precios')
+    logger.info(f'🗑️ Total columnas eliminadas: {len(columnas_eliminadas)}')
+
+    # Precios, porcentajes e ids con tipo fijo (esquema_carburantes), igual todos los días
+    df = aplicar_esquema(df)
+
+    if 'C.P.' in df.columns:
+        cp = df['C.P.'].astype(str)
+        es_numero = cp.str.isdigit().fillna(False).astype(bool)
+        df['C.P.'] = "'" + cp.where(~es_numero, cp.str.zfill(5))
+
+    if 'Localidad' in df.columns:
+        df = df.sort_values('Localidad', na_position='last')
+
+    return df
@@ -1,27 +1,293 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-import subprocess
-import sys
 import os
 import re
 from datetime import datetime, timedelta
 import threading
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+
+from escritores_carburantes import ESCRITORES
+from importador_carburantes import PATRON_ARCHIVO, deshacer_limpieza, leer_archivo
+from trabajador_carburantes import ClienteTrabajador
+
 VERDE_OSCURO = '#204529'
 VERDE_CLARO = '#7ED957'
 FONDO = VERDE_OSCURO
 TEXTO = 'white'
 
+# Columnas que enseña la vista previa, además de los precios
+COLUMNAS_VISTA = ['Fecha', 'Provincia', 'Municipio', 'Localidad', 'Rótulo', 'Dirección', 'C.P.']
+
+
+def cargar_dia_vista(ruta):
+    """Un archivo diario con solo las columnas de la vista previa y su fecha"""
+    df = deshacer_limpieza(leer_archivo(ruta))
+    coincidencia = PATRON_ARCHIVO.match(os.path.basename(ruta))
+    df['Fecha'] = '-'.join(coincidencia.groups()[:3]) if coincidencia else ''
+    precios = [col for col in df.columns if col.startswith('Precio ')]
+    return df[COLUMNAS_VISTA + precios]
+
+
+def filtrar_ordenar(df, provincia=None, combustible=None, minimo=None, maximo=None, columna=None, descendente=False):
+    """Posiciones de las filas que pasan los filtros, en el orden pedido (vacíos al final)
+
+    Con combustible solo quedan las estaciones con precio de ese combustible, y el
+    rango de precio se aplica a él.
+    """
+    mascara = np.ones(len(df), dtype=bool)
+    if provincia:
+        mascara &= (df['Provincia'] == provincia).to_numpy(dtype=bool, na_value=False)
+    if combustible:
+        columna_precio = f'Precio {combustible}'
+        if columna_precio not in df.columns:
+            return np.empty(0, dtype=np.int64)
+        # Los precios son float32: se redondean para que 1.459 no se quede fuera de [1.459, ...]
+        precio = np.round(df[columna_precio].to_numpy(dtype='float64', na_value=np.nan), 4)
+        mascara &= ~np.isnan(precio)
+        if minimo is not None:
+            mascara &= precio >= minimo
+        if maximo is not None:
+            mascara &= precio <= maximo
+    posiciones = np.flatnonzero(mascara)
+    if columna:
+        serie = df[columna].iloc[posiciones].reset_index(drop=True)
+        if columna == 'Fecha':
+            serie = pd.to_datetime(serie, format='%d-%m-%Y', errors='coerce')
+        orden = serie.sort_values(ascending=not descendente, na_position='last', kind='stable').index
+        posiciones = posiciones[orden.to_numpy()]
+    return posiciones
+
+
+class VistaPrevia(tk.Toplevel):
+    """Tabla virtual con los días descargados
+
+    La Treeview tiene siempre las mismas FILAS_VISIBLES filas y al desplazarse solo
+    cambian sus valores, así que pintar cuesta lo mismo con 12.000 filas que con
+    dos millones. Los archivos se leen en un hilo (las primeras filas aparecen con
+    el primer día) y el filtrado y la ordenación se calculan en otro hilo como un
+    índice de posiciones; si llega un resultado de una petición ya superada, se descarta.
+    """
+
+    FILAS_VISIBLES = 25
+
+    def __init__(self, maestro, rutas):
+        super().__init__(maestro)
+        self.title('👁️ Vista previa')
+        self.configure(bg=FONDO)
+        self.geometry('1100x680')
+        self.rutas = list(rutas)
+        self.datos = pd.DataFrame(columns=COLUMNAS_VISTA)
+        self.indice = np.empty(0, dtype=np.int64)
+        self.inicio = 0
+        self.orden = (None, False)
+        self.peticion = 0
+        self.dias_cargados = 0
+        self.calculando = False
+        self.cerrada = False
+        self.protocol('WM_DELETE_WINDOW', self.cerrar)
+        self.crear_widgets()
+        threading.Thread(target=self.cargar, daemon=True).start()
+
+    def crear_widgets(self):
+        fuente = ('Segoe UI', 10)
+        filtros = tk.Frame(self, bg=FONDO)
+        filtros.pack(fill='x', padx=10, pady=(10, 6))
+
+        self.provincia = tk.StringVar()
+        self.combustible = tk.StringVar()
+        self.minimo = tk.StringVar()
+        self.maximo = tk.StringVar()
+
+        tk.Label(filtros, text='Provincia:', bg=FONDO, fg=TEXTO, font=fuente).pack(side='left')
+        self.combo_provincia = ttk.Combobox(filtros, textvariable=self.provincia, width=22, state='readonly')
+        self.combo_provincia.pack(side='left', padx=(4, 12))
+        tk.Label(filtros, text='Combustible:', bg=FONDO, fg=TEXTO, font=fuente).pack(side='left')
+        self.combo_combustible = ttk.Combobox(filtros, textvariable=self.combustible, width=24, state='readonly')
+        self.combo_combustible.pack(side='left', padx=(4, 12))
+        tk.Label(filtros, text='Precio de', bg=FONDO, fg=TEXTO, font=fuente).pack(side='left')
+        tk.Entry(filtros, textvariable=self.minimo, width=7).pack(side='left', padx=4)
+        tk.Label(filtros, text='a', bg=FONDO, fg=TEXTO, font=fuente).pack(side='left')
+        tk.Entry(filtros, textvariable=self.maximo, width=7).pack(side='left', padx=(4, 12))
+        tk.Button(filtros, text='🔎 Filtrar', command=self.recalcular, bg=VERDE_CLARO,
+                  relief='flat', padx=10).pack(side='left', padx=(0, 6))
+        tk.Button(filtros, text='🔄 Quitar filtros', command=self.quitar_filtros, bg='#555', fg='white',
+                  relief='flat', padx=10).pack(side='left')
+        for combo in (self.combo_provincia, self.combo_combustible):
+            combo.bind('<<ComboboxSelected>>', lambda _: self.recalcular())
+
+        tabla_frame = tk.Frame(self, bg=FONDO)
+        tabla_frame.pack(fill='both', expand=True, padx=10)
+        self.tabla = ttk.Treeview(tabla_frame, show='headings', height=self.FILAS_VISIBLES, selectmode='browse')
+        self.barra = ttk.Scrollbar(tabla_frame, orient='vertical', command=self.desplazar)
+        self.tabla.pack(side='left', fill='both', expand=True)
+        self.barra.pack(side='right', fill='y')
+        for i in range(self.FILAS_VISIBLES):
+            self.tabla.insert('', 'end', iid=str(i), values=())
+        self.tabla.bind('<MouseWheel>', lambda e: self.desplazar('scroll', -1 if e.delta > 0 else 1, 'units'))
+        self.tabla.bind('<Button-4>', lambda e: self.desplazar('scroll', -1, 'units'))
+        self.tabla.bind('<Button-5>', lambda e: self.desplazar('scroll', 1, 'units'))
+        self.tabla.bind('<Prior>', lambda e: self.desplazar('scroll', -1, 'pages'))
+        self.tabla.bind('<Next>', lambda e: self.desplazar('scroll', 1, 'pages'))
+
+        self.estado = tk.Label(self, text='⏳ Cargando...', bg=FONDO, fg='lightgray', font=('Segoe UI', 9), anchor='w')
+        self.estado.pack(fill='x', padx=10, pady=(6, 10))
+
+    def cargar(self):
+        """Leer los días en segundo plano y publicar lo leído cada pocos archivos"""
+        partes = []
+        ultima = datetime.now()
+        for i, ruta in enumerate(self.rutas, 1):
+            if self.cerrada:
+                return
+            try:
+                partes.append(cargar_dia_vista(ruta))
+            except Exception as e:
+                self.after(0, lambda e=e, ruta=ruta: self.estado.config(
+                    text=f'⚠️ {os.path.basename(ruta)}: {str(e)[:80]}', fg='orange'))
+            if i == 1 or i == len(self.rutas) or (datetime.now() - ultima).total_seconds() > 1:
+                if partes:
+                    datos = pd.concat(partes, ignore_index=True, sort=False)
+                    partes = [datos]
+                    ultima = datetime.now()
+                    self.after(0, lambda datos=datos, i=i: self.publicar(datos, i))
+                else:
+                    self.after(0, lambda i=i: self.publicar(self.datos, i))
+
+    def publicar(self, datos, dias):
+        if self.cerrada:
+            return
+        self.datos = datos
+        self.dias_cargados = dias
+        self.combo_provincia['values'] = [''] + sorted(datos['Provincia'].dropna().unique())
+        self.combo_combustible['values'] = [''] + [c[len('Precio '):] for c in datos.columns if c.startswith('Precio ')]
+        columnas = list(datos.columns)
+        if list(self.tabla['columns']) != columnas:
+            self.tabla['columns'] = columnas
+            for columna in columnas:
+                self.tabla.heading(columna, text=columna, command=lambda c=columna: self.ordenar_por(c))
+                ancho = 90 if columna.startswith('Precio ') or columna in ('Fecha', 'C.P.') else 140
+                self.tabla.column(columna, width=ancho, anchor='e' if columna.startswith('Precio ') else 'w')
+        self.recalcular()
+
+    def filtros(self):
+        """Filtros de la barra superior; un precio mal escrito no filtra"""
+        def numero(texto):
+            try:
+                return float(texto.replace(',', '.'))
+            except ValueError:
+                return None
+        return {
+            'provincia': self.provincia.get() or None,
+            'combustible': self.combustible.get() or None,
+            'minimo': numero(self.minimo.get()),
+            'maximo': numero(self.maximo.get()),
+            'columna': self.orden[0],
+            'descendente': self.orden[1],
+        }
+
+    def recalcular(self):
+        """Filtrar y ordenar en un hilo; solo se aplica el resultado de la última petición"""
+        self.peticion += 1
+        peticion, datos, filtros = self.peticion, self.datos, self.filtros()
+        if not any(valor for clave, valor in filtros.items() if clave != 'descendente'):
+            self.aplicar(peticion, np.arange(len(datos)))
+            return
+        self.calculando = True
+        self.actualizar_estado()
+
+        def calcular():
+            indice = filtrar_ordenar(datos, **filtros)
+            self.after(0, lambda: self.aplicar(peticion, indice))
+
+        threading.Thread(target=calcular, daemon=True).start()
+
+    def aplicar(self, peticion, indice):
+        if self.cerrada or peticion != self.peticion:
+            return
+        self.calculando = False
+        self.indice = indice
+        self.inicio = min(self.inicio, max(0, len(indice) - self.FILAS_VISIBLES))
+        self.pintar()
+
+    def quitar_filtros(self):
+        for variable in (self.provincia, self.combustible, self.minimo, self.maximo):
+            variable.set('')
+        self.recalcular()
+
+    def ordenar_por(self, columna):
+        """Clic en una cabecera: ascendente, y otro clic en la misma la invierte"""
+        actual, descendente = self.orden
+        self.orden = (columna, not descendente if actual == columna else False)
+        for c in self.tabla['columns']:
+            flecha = (' ▼' if self.orden[1] else ' ▲') if c == columna else ''
+            self.tabla.heading(c, text=f'{c}{flecha}')
+        self.inicio = 0
+        self.recalcular()
+
+    def desplazar(self, accion, cantidad, unidad=None):
+        """Mover la ventana de filas visibles (mismo protocolo que yview de la barra de desplazamiento)"""
+        ultimo = max(0, len(self.indice) - self.FILAS_VISIBLES)
+        if accion == 'moveto':
+            self.inicio = int(float(cantidad) * len(self.indice))
+        else:
+            paso = self.FILAS_VISIBLES if unidad == 'pages' else 3
+            self.inicio += int(cantidad) * paso
+        self.inicio = min(max(0, self.inicio), ultimo)
+        self.pintar()
+
+    def pintar(self):
+        """Rellenar las filas fijas de la tabla con la página visible"""
+        posiciones = self.indice[self.inicio:self.inicio + self.FILAS_VISIBLES]
+        pagina = self.datos.iloc[posiciones]
+        filas = []
+        for columna in pagina.columns:
+            serie = pagina[columna]
+            if columna.startswith('Precio '):
+                valores = serie.to_numpy(dtype='float64', na_value=np.nan)
+                filas.append(['' if np.isnan(v) else f'{v:.3f}' for v in valores])
+            else:
+                filas.append(['' if pd.isna(v) else str(v) for v in serie])
+        for i in range(self.FILAS_VISIBLES):
+            valores = [columna[i] for columna in filas] if i < len(posiciones) else ()
+            self.tabla.item(str(i), values=valores)
+
+        total = len(self.indice)
+        if total:
+            self.barra.set(self.inicio / total, min(1.0, (self.inicio + self.FILAS_VISIBLES) / total))
+        else:
+            self.barra.set(0, 1)
+        self.actualizar_estado()
+
+    def actualizar_estado(self):
+        texto = f'{len(self.indice):,} de {len(self.datos):,} filas'.replace(',', '.')
+        if self.indice.size:
+            fin = min(self.inicio + self.FILAS_VISIBLES, len(self.indice))
+            texto += f' · mostrando {self.inicio + 1}-{fin}'
+        if self.dias_cargados < len(self.rutas):
+            texto += f' · ⏳ cargando {self.dias_cargados}/{len(self.rutas)} días'
+        if self.calculando:
+            texto += ' · ⏳ filtrando y ordenando...'
+        self.estado.config(text=texto, fg='lightgray')
+
+    def cerrar(self):
+        self.cerrada = True
+        self.destroy()
+
+
 class SedeAppSimple(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title('SEDEApp Carburantes')
         self.configure(bg=FONDO)
-        self.geometry('800x700')
+        self.geometry('800x740')
         self.resizable(False, False)
         self.carpeta_destino = tk.StringVar()
+        self.formato_salida = tk.StringVar(value='xlsx')
         self.descarga_en_progreso = False
+        self.rutas_descargadas = []
     
         self.combustibles_disponibles = [
             'Gasolina 95 E5', 'Gasoleo A', 'Gasoleo B', 'Gasoleo Premium', 'Gasolina 95 E10',
@@ -43,6 +309,11 @@ class SedeAppSimple(tk.Tk):
 
         self.crear_widgets()
 
+        # Scrapy y pandas se cargan ya en segundo plano: la primera descarga no espera al arranque
+        self.trabajador = ClienteTrabajador()
+        self.trabajador.iniciar()
+        self.protocol('WM_DELETE_WINDOW', self.cerrar)
+
     def crear_widgets(self):
         fuente = ('Segoe UI', 11)
         fuente_bold = ('Segoe UI', 11, 'bold')
@@ -129,12 +400,31 @@ class SedeAppSimple(tk.Tk):
         )
         btn_seleccionar_comunes.pack(side='left')
 
+        formato_frame = tk.Frame(self, bg=FONDO)
+        formato_frame.pack(pady=(0, 12))
+
+        tk.Label(formato_frame, text='📝 Formato de salida:', bg=FONDO, fg=TEXTO, font=fuente).pack(side='left', padx=(0, 8))
+
+        menu_formato = tk.OptionMenu(formato_frame, self.formato_salida, *ESCRITORES)
+        menu_formato.config(bg=VERDE_CLARO, font=('Segoe UI', 10), relief='flat', highlightthickness=0)
+        menu_formato.pack(side='left')
+
+        botones_frame = tk.Frame(self, bg=FONDO)
+        botones_frame.pack(pady=(0, 10))
+
         self.btn_descargar = tk.Button(
-            self, text='⚡ Descargar', command=self.descargar, 
+            botones_frame, text='⚡ Descargar', command=self.descargar, 
             bg=VERDE_CLARO, font=fuente_bold, relief='flat', 
             padx=25, pady=10
         )
-        self.btn_descargar.pack(pady=(0, 10))
+        self.btn_descargar.pack(side='left', padx=(0, 10))
+
+        self.btn_vista_previa = tk.Button(
+            botones_frame, text='👁️ Vista previa', command=self.abrir_vista_previa,
+            bg='#777', fg='white', font=fuente_bold, relief='flat',
+            padx=15, pady=10, state='disabled'
+        )
+        self.btn_vista_previa.pack(side='left')
 
         self.progreso = tk.Label(self, text='', bg=FONDO, fg=VERDE_CLARO, font=fuente)
         self.progreso.pack(pady=(0, 3))
@@ -191,6 +481,7 @@ class SedeAppSimple(tk.Tk):
 
         self.descarga_en_progreso = True
         self.btn_descargar.config(state='disabled', text='Descargando...')
+        self.btn_vista_previa.config(state='disabled')
         
 
         
@@ -262,94 +553,71 @@ class SedeAppSimple(tk.Tk):
         return seleccionados
 
     def ejecutar_scrapy(self, fecha_inicio, fecha_fin, total_dias):
-        """Ejecutar el script de Scrapy robusto que funciona"""
+        """Enviar la descarga al proceso trabajador y mostrar el progreso de cada fecha"""
         try:
             combustibles_extra = self.obtener_combustibles_seleccionados()
+            formato = self.formato_salida.get()
             
             self.after(0, lambda: self.progreso.config(text=f'🚀 Iniciando descarga de {total_dias} archivo(s)...', fg='yellow'))
             self.after(0, lambda: self.progreso_detalle.config(text='', fg='lightgray'))
-        
-            cmd = [
-                'python', '-m', 'scrapy', 'runspider', 'scrapy_carburantes_simple.py',
-                '-a', f'fecha_inicio={fecha_inicio}',
-                '-a', f'fecha_fin={fecha_fin}',
-                '--loglevel=INFO'
-            ]
             
+            # Los archivos se escriben directamente en la carpeta final
+            carpeta_destino = self.carpeta_destino.get()
+            if carpeta_destino:
+                # Formato correcto: dd-mm-aaaa_a_dd-mm-aaaa
+                if total_dias == 1:
+                    subcarpeta = f'SEDEApp_Carburantes_{fecha_inicio}'
+                else:
+                    subcarpeta = f'SEDEApp_Carburantes_{fecha_inicio}_a_{fecha_fin}'
+                ruta_final = os.path.join(carpeta_destino, subcarpeta)
+            else:
+                fecha_str = f'{datetime.strptime(fecha_inicio, "%d-%m-%Y").strftime("%Y%m%d")}_{datetime.strptime(fecha_fin, "%d-%m-%Y").strftime("%Y%m%d")}'
+                ruta_final = f'carburantes_scrapy_{fecha_str}'
+            
+            args = {
+                'fecha_inicio': fecha_inicio,
+                'fecha_fin': fecha_fin,
+                'formato': formato,
+                'output_dir': ruta_final,
+            }
             if combustibles_extra:
-                combustibles_str = ','.join(combustibles_extra)
-                cmd.extend(['-a', f'combustibles_extra={combustibles_str}'])
-
-            self.after(0, lambda: self.progreso.config(text='', fg='yellow'))
+                args['combustibles_extra'] = ','.join(combustibles_extra)
             
-            result = subprocess.run(cmd, capture_output=True, text=True, cwd=os.getcwd())
-
-            if result.returncode == 0:
-                fecha_str = f'{datetime.strptime(fecha_inicio, "%d-%m-%Y").strftime("%Y%m%d")}_{datetime.strptime(fecha_fin, "%d-%m-%Y").strftime("%Y%m%d")}'
-                carpeta_scrapy = f'carburantes_scrapy_{fecha_str}'
-                
-                if os.path.exists(carpeta_scrapy):
-                    archivos_excel = [f for f in os.listdir(carpeta_scrapy) if f.endswith('.xlsx')]
-                    
-                    if archivos_excel:
-                        # Mover archivos si se seleccionó carpeta destino
-                        carpeta_destino = self.carpeta_destino.get()
-                        if carpeta_destino:
-                            try:
-                                # Formato correcto: dd-mm-aaaa_a_dd-mm-aaaa
-                                if total_dias == 1:
-                                    subcarpeta = f'SEDEApp_Carburantes_{fecha_inicio}'
-                                else:
-                                    subcarpeta = f'SEDEApp_Carburantes_{fecha_inicio}_a_{fecha_fin}'
-                                
-                                ruta_final = os.path.join(carpeta_destino, subcarpeta)
-                                os.makedirs(ruta_final, exist_ok=True)
-                                
-                                # Progreso al empezar a mover archivos
-                                self.after(0, lambda: self.progreso.config(text=f'📁 Organizando {len(archivos_excel)} archivos...', fg='yellow'))
-                                # Mantener línea de detalle oculta durante organización
-                                
-                                archivos_movidos = 0
-                                for i, archivo in enumerate(archivos_excel, 1):
-                                    origen = os.path.join(carpeta_scrapy, archivo)
-                                    destino = os.path.join(ruta_final, archivo)
-                                    
-
-                                    
-                                    # Verificar que el archivo origen existe
-                                    if os.path.exists(origen):
-                                        # Si ya existe en destino, eliminarlo
-                                        if os.path.exists(destino):
-                                            os.remove(destino)
-                                        # Mover archivo
-                                        os.rename(origen, destino)
-                                        archivos_movidos += 1
-                                
-                                # Limpiar carpeta temporal de Scrapy
-                                try:
-                                    if os.path.exists(carpeta_scrapy):
-                                        import shutil
-                                        shutil.rmtree(carpeta_scrapy)
-                                except:
-                                    pass
-                                
-                                self.after(0, lambda: self.progreso.config(text=f'🎉 ¡Completado! {archivos_movidos} archivos Excel', fg='green'))
-                                self.after(0, lambda: self.progreso_detalle.config(text=f'📁 Archivos guardados en: {ruta_final}', fg='white'))
-                            except Exception as e:
-                                error_detalle = str(e)
-                                self.after(0, lambda: self.progreso.config(text='⚠️ Error moviendo archivos', fg='orange'))
-                                self.after(0, lambda: self.progreso_detalle.config(text=f'Error: {error_detalle[:50]}. Archivos en: {carpeta_scrapy}', fg='orange'))
-                        else:
-                            self.after(0, lambda: self.progreso.config(text=f'🎉 ¡Completado! {len(archivos_excel)} archivos Excel', fg='green'))
-                            self.after(0, lambda: self.progreso_detalle.config(text=f'📁 Archivos en: {carpeta_scrapy}', fg='white'))
-                    else:
-                        self.after(0, lambda: self.progreso.config(text='⚠️ No se generaron archivos Excel', fg='orange'))
-                        self.after(0, lambda: self.progreso_detalle.config(text='Verifica las fechas e intenta de nuevo', fg='orange'))
+            archivos = []
+            rutas = []
+            procesadas = []
+            
+            def al_evento(evento):
+                if evento['tipo'] != 'item':
+                    return
+                item = evento['item']
+                procesadas.append(item['fecha'])
+                if item.get('status') == 'success':
+                    archivos.append(item.get('archivo'))
+                    if item.get('ruta'):
+                        rutas.append((item['fecha'], item['ruta']))
+                    detalle = f'✅ {item["fecha"]}: {item.get("estaciones", 0)} estaciones'
+                else:
+                    detalle = f'⚠️ {item["fecha"]}: {item.get("status")}'
+                texto = f'📥 {len(procesadas)}/{total_dias} días procesados'
+                self.after(0, lambda: self.progreso.config(text=texto, fg='yellow'))
+                self.after(0, lambda: self.progreso_detalle.config(text=detalle, fg='lightgray'))
+            
+            resultado = self.trabajador.ejecutar(args, al_evento=al_evento)
+
+            if resultado['tipo'] == 'fin':
+                if archivos:
+                    # Los días llegan según terminan; la vista previa los lee en orden de fecha
+                    rutas.sort(key=lambda r: datetime.strptime(r[0], '%d-%m-%Y'))
+                    self.rutas_descargadas = [ruta for _, ruta in rutas]
+                    self.after(0, lambda: self.btn_vista_previa.config(state='normal' if self.rutas_descargadas else 'disabled'))
+                    self.after(0, lambda: self.progreso.config(text=f'🎉 ¡Completado! {len(archivos)} archivos {formato.upper()}', fg='green'))
+                    self.after(0, lambda: self.progreso_detalle.config(text=f'📁 Archivos guardados en: {ruta_final}', fg='white'))
                 else:
-                    self.after(0, lambda: self.progreso.config(text='⚠️ No se encontró carpeta de resultados', fg='orange'))
-                    self.after(0, lambda: self.progreso_detalle.config(text='Scrapy ejecutó pero no generó la carpeta esperada', fg='orange'))
+                    self.after(0, lambda: self.progreso.config(text='⚠️ No se generaron archivos de salida', fg='orange'))
+                    self.after(0, lambda: self.progreso_detalle.config(text='Verifica las fechas e intenta de nuevo', fg='orange'))
             else:
-                error_msg = result.stderr[:200] if result.stderr else 'Error desconocido'
+                error_msg = resultado.get('error') or 'Error desconocido'
                 self.after(0, lambda: self.progreso.config(text='❌ Error en Scrapy', fg='red'))
                 self.after(0, lambda: self.progreso_detalle.config(text=f'Error: {error_msg[:80]}... Verifica instalación de Scrapy', fg='red'))
 
@@ -362,6 +630,16 @@ class SedeAppSimple(tk.Tk):
             self.after(0, lambda: setattr(self, 'descarga_en_progreso', False))
             self.after(30000, lambda: self.progreso_detalle.config(text=''))
 
+    def abrir_vista_previa(self):
+        """Enseñar los días de la última descarga en una tabla virtual"""
+        if self.rutas_descargadas:
+            VistaPrevia(self, self.rutas_descargadas)
+
+    def cerrar(self):
+        """Terminar el proceso trabajador junto con la ventana"""
+        self.trabajador.cerrar()
+        self.destroy()
+
     def fecha_valida(self, fecha_str):
         try:
             datetime.strptime(fecha_str, '%d-%m-%Y')
@@ -0,0 +1,286 @@
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from json_carburantes import PRODUCTOS
+
+PROVINCIAS = [
+    'ALBACETE', 'ALICANTE', 'ALMERÍA', 'ARABA/ÁLAVA', 'ASTURIAS', 'ÁVILA', 'BADAJOZ', 'BALEARS (ILLES)',
+    'BARCELONA', 'BIZKAIA', 'BURGOS', 'CÁCERES', 'CÁDIZ', 'CANTABRIA', 'CASTELLÓN / CASTELLÓ', 'CEUTA',
+    'CIUDAD REAL', 'CÓRDOBA', 'CORUÑA (A)', 'CUENCA', 'GIPUZKOA', 'GIRONA', 'GRANADA', 'GUADALAJARA',
+    'HUELVA', 'HUESCA', 'JAÉN', 'LEÓN', 'LLEIDA', 'LUGO', 'MADRID', 'MÁLAGA', 'MELILLA', 'MURCIA',
+    'NAVARRA', 'OURENSE', 'PALENCIA', 'PALMAS (LAS)', 'PONTEVEDRA', 'RIOJA (LA)', 'SALAMANCA',
+    'SANTA CRUZ DE TENERIFE', 'SEGOVIA', 'SEVILLA', 'SORIA', 'TARRAGONA', 'TERUEL', 'TOLEDO',
+    'VALENCIA / VALÈNCIA', 'VALLADOLID', 'ZAMORA', 'ZARAGOZA',
+]
+ROTULOS = ['REPSOL', 'CEPSA', 'BP', 'GALP', 'SHELL', 'PETRONOR', 'BALLENOY', 'PLENOIL', 'ALCAMPO',
+           'CARREFOUR', 'AVIA', 'DISA', 'PETROPRIX', 'BONAREA', 'NO TIENE']
+# Combustible: (probabilidad de que una estación lo venda, precio base)
+COMBUSTIBLES = {
+    'Adblue': (0.2, 0.9), 'Amoniaco': (0.0, 0.0), 'Biodiesel': (0.01, 1.5), 'Bioetanol': (0.005, 1.2),
+    'Biogas Natural Comprimido': (0.0, 0.0), 'Biogas Natural Licuado': (0.0, 0.0),
+    'Diésel Renovable': (0.02, 1.7), 'Gas Natural Comprimido': (0.01, 1.3), 'Gas Natural Licuado': (0.01, 1.2),
+    'Gases licuados del petróleo': (0.06, 0.95), 'Gasoleo A': (0.98, 1.45), 'Gasoleo B': (0.2, 1.1),
+    'Gasoleo Premium': (0.6, 1.55), 'Gasolina 95 E10': (0.02, 1.5), 'Gasolina 95 E25': (0.0, 0.0),
+    'Gasolina 95 E5': (0.95, 1.55), 'Gasolina 95 E5 Premium': (0.1, 1.62), 'Gasolina 95 E85': (0.0, 0.0),
+    'Gasolina 98 E10': (0.01, 1.68), 'Gasolina 98 E5': (0.5, 1.7), 'Gasolina Renovable': (0.0, 0.0),
+    'Hidrogeno': (0.001, 12.0), 'Metanol': (0.0, 0.0),
+}
+
+CLAVES_INICIO = ['C.P.', 'Dirección', 'Horario', 'Latitud', 'Localidad', 'Longitud (WGS84)', 'Margen', 'Municipio']
+CLAVES_MEDIO = ['Provincia', 'Remisión', 'Rótulo', 'Tipo Venta']
+CLAVES_FIN = ['IDEESS', 'IDMunicipio', 'IDProvincia', 'IDCCAA']
+
+
+def _coma(valor, decimales):
+    return f'{valor:.{decimales}f}'.replace('.', ',')
+
+
+class GeneradorPayloads:
+    """Respuestas sintéticas con la forma de EstacionesTerrestresHist: mismas claves, decimales con coma y centinelas
+
+    Las estaciones son siempre las mismas (misma semilla) y cada una cambia sus precios
+    cada pocos días, así que de un día a otro solo cambia una parte, como en los datos reales.
+    """
+
+    def __init__(self, estaciones=12000, semilla=0):
+        self.semilla = semilla
+        r = random.Random(semilla)
+        ids = sorted(r.sample(range(1, max(20000, 2 * estaciones)), estaciones))
+        self.estaciones = []
+        for i in range(estaciones):
+            provincia = r.randrange(len(PROVINCIAS))
+            centinela = r.random() < 0.002
+            self.estaciones.append({
+                'C.P.': '' if r.random() < 0.01 else f'{r.randint(1000, 52999):05d}',
+                'Dirección': f'CALLE {r.choice(["MAYOR", "REAL", "NUEVA", "DEL SOL", "CTRA. N-"])} {r.randint(1, 400)}',
+                'Horario': r.choice(['L-D: 24H', 'L-D: 06:00-22:00', 'L-V: 07:00-21:00; S: 08:00-14:00']),
+                'Latitud': '#####' if centinela else _coma(r.uniform(27.6, 43.8), 6),
+                'Localidad': f'LOCALIDAD {r.randint(1, 3000)}',
+                'Longitud (WGS84)': '#####' if centinela else _coma(r.uniform(-18.2, 4.3), 6),
+                'Margen': r.choice(['D', 'I', 'N']),
+                'Municipio': f'MUNICIPIO {r.randint(1, 8000)}',
+                'Provincia': PROVINCIAS[provincia],
+                'Remisión': r.choice(['dm', 'OM']),
+                'Rótulo': r.choice(ROTULOS),
+                'Tipo Venta': 'P' if r.random() < 0.97 else 'R',
+                'IDEESS': str(ids[i]),
+                'IDMunicipio': str(r.randint(1, 8200)),
+                'IDProvincia': f'{provincia + 1:02d}',
+                'IDCCAA': f'{r.randint(1, 19):02d}',
+                'combustibles': {c: base + r.uniform(-0.15, 0.15) for c, (p, base) in COMBUSTIBLES.items() if r.random() < p},
+                'bio': r.random() < 0.05,
+                'periodo': r.randint(3, 12),
+                'fase': r.randrange(12),
+            })
+
+    def registros(self, fecha):
+        dia = datetime.strptime(fecha, '%d-%m-%Y').toordinal()
+        # Tendencia general que cambia por semanas; entre días solo cambian algunas estaciones
+        tendencia = 0.004 * ((dia // 7) % 52 - 26)
+        for i, estacion in enumerate(self.estaciones):
+            # Mismo orden de claves que la API: datos, precios, resto de datos, porcentajes e identificadores
+            registro = {k: estacion[k] for k in CLAVES_INICIO}
+            # Cada estación mantiene su ajuste durante su periodo (pseudoaleatorio y reproducible)
+            tramo = (dia + estacion['fase']) // estacion['periodo']
+            cambio = ((i * 2654435761 + tramo * 40503 + self.semilla) % 1000) / 1000 * 0.06 - 0.03
+            for combustible in COMBUSTIBLES:
+                precio = estacion['combustibles'].get(combustible)
+                registro[f'Precio {combustible}'] = '' if precio is None else _coma(max(0.5, precio + tendencia + cambio), 3)
+            for k in CLAVES_MEDIO:
+                registro[k] = estacion[k]
+            registro['% BioEtanol'] = '5,0' if estacion['bio'] else '0,0'
+            registro['% Éster metílico'] = '7,0' if estacion['bio'] else '0,0'
+            for k in CLAVES_FIN:
+                registro[k] = estacion[k]
+            yield registro
+
+    def cuerpo(self, fecha, combustible=None):
+        """Bytes JSON de la respuesta para una fecha dd-mm-aaaa (con combustible, la de FiltroProducto)"""
+        registros = self.registros(fecha)
+        if combustible is not None:
+            registros = (self._producto(registro, combustible) for registro in registros
+                         if registro[f'Precio {combustible}'])
+        return json.dumps({
+            'Fecha': f'{fecha} 0:00:00',
+            'ListaEESSPrecio': list(registros),
+            'Nota': 'Archivo de todos los productos en todas las estaciones de servicio.',
+            'ResultadoConsulta': 'OK',
+        }, ensure_ascii=False).encode('utf-8')
+
+    @staticmethod
+    def _producto(registro, combustible):
+        """Registro de FiltroProducto: los mismos datos y solo el precio pedido, como 'PrecioProducto'"""
+        producto = {}
+        for clave, valor in registro.items():
+            if clave.startswith('Precio ') or clave.startswith('% '):
+                if clave == f'Precio {combustible}':
+                    producto['PrecioProducto'] = valor
+                continue
+            producto[clave] = valor
+        return producto
+
+
+class ServidorPrueba:
+    """Servidor HTTP local que imita el servicio REST del ministerio, con latencia y errores configurables
+
+    - latencia (s) y variacion (± s) antes de cada respuesta.
+    - tasa_429 / tasa_500: probabilidad de responder con ese error.
+    - limite_concurrencia: por encima de tantas peticiones simultáneas responde 429 con Retry-After.
+    - Comprime con gzip si la petición lo acepta y responde 304 a If-None-Match con el ETag del día.
+    """
+
+    def __init__(self, puerto=0, estaciones=12000, latencia=0.0, variacion=0.0, tasa_429=0.0, tasa_500=0.0,
+                 limite_concurrencia=0, retry_after=1, semilla=0, cache_dias=8):
+        self.generador = GeneradorPayloads(estaciones, semilla)
+        self.latencia = latencia
+        self.variacion = variacion
+        self.tasa_429 = tasa_429
+        self.tasa_500 = tasa_500
+        self.limite_concurrencia = limite_concurrencia
+        self.retry_after = retry_after
+        self.cache_dias = cache_dias
+        self.cuerpos = OrderedDict()
+        self.activas = 0
+        self.peticiones = 0
+        self.errores = 0
+        self.bloqueo = threading.Lock()
+        self.azar = random.Random(semilla)
+        self.http = ThreadingHTTPServer(('127.0.0.1', puerto), self._manejador())
+        self.http.daemon_threads = True
+        self.hilo = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.http.server_address[1]}'
+
+    def _cuerpo(self, fecha, combustible=None):
+        """(cuerpo, cuerpo en gzip, ETag) de un día, generados una vez y guardados en el LRU"""
+        clave = (fecha, combustible)
+        with self.bloqueo:
+            entrada = self.cuerpos.get(clave)
+            if entrada is not None:
+                self.cuerpos.move_to_end(clave)
+                return entrada
+        cuerpo = self.generador.cuerpo(fecha, combustible)
+        entrada = (cuerpo, gzip.compress(cuerpo, compresslevel=6), f'"{hashlib.sha1(cuerpo).hexdigest()[:16]}"')
+        with self.bloqueo:
+            self.cuerpos[clave] = entrada
+            while len(self.cuerpos) > self.cache_dias:
+                self.cuerpos.popitem(last=False)
+        return entrada
+
+    def _manejador(self):
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with servidor.bloqueo:
+                    servidor.activas += 1
+                    servidor.peticiones += 1
+                    saturado = 0 < servidor.limite_concurrencia < servidor.activas
+                    azar = servidor.azar.random()
+                try:
+                    espera = servidor.latencia + servidor.variacion * (2 * servidor.azar.random() - 1)
+                    if espera > 0:
+                        time.sleep(espera)
+                    if saturado or azar < servidor.tasa_429:
+                        return self._error(429, {'Retry-After': str(servidor.retry_after)})
+                    if azar < servidor.tasa_429 + servidor.tasa_500:
+                        return self._error(500)
+
+                    partes = self.path.rstrip('/').split('/')
+                    combustible = None
+                    if len(partes) >= 3 and partes[-3] == 'FiltroProducto':
+                        # .../FiltroProducto/{fecha}/{idProducto}
+                        nombres = {str(id_producto): nombre for nombre, id_producto in PRODUCTOS.items()}
+                        combustible = nombres.get(partes[-1])
+                        if combustible is None:
+                            return self._error(404)
+                        partes = partes[:-1]
+                    fecha = partes[-1]
+                    try:
+                        datetime.strptime(fecha, '%d-%m-%Y')
+                    except ValueError:
+                        return self._error(404)
+                    cuerpo, comprimido, etag = servidor._cuerpo(fecha, combustible)
+                    if etag in self.headers.get('If-None-Match', ''):
+                        self.send_response(304)
+                        self.send_header('ETag', etag)
+                        self.end_headers()
+                        return
+                    gzip_aceptado = 'gzip' in self.headers.get('Accept-Encoding', '')
+                    if gzip_aceptado:
+                        cuerpo = comprimido
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json; charset=utf-8')
+                    self.send_header('ETag', etag)
+                    if gzip_aceptado:
+                        self.send_header('Content-Encoding', 'gzip')
+                    self.send_header('Content-Length', str(len(cuerpo)))
+                    self.end_headers()
+                    self.wfile.write(cuerpo)
+                finally:
+                    with servidor.bloqueo:
+                        servidor.activas -= 1
+
+            def _error(self, estado, cabeceras=None):
+                with servidor.bloqueo:
+                    servidor.errores += 1
+                self.send_response(estado)
+                for clave, valor in (cabeceras or {}).items():
+                    self.send_header(clave, valor)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        return Manejador
+
+    def iniciar(self):
+        """Servir en un hilo en segundo plano; devuelve la URL base para -a base_url="""
+        self.hilo = threading.Thread(target=self.http.serve_forever, daemon=True)
+        self.hilo.start()
+        return self.url
+
+    def parar(self):
+        self.http.shutdown()
+        self.http.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Servidor local que imita la API de precios de carburantes')
+    parser.add_argument('--puerto', type=int, default=8765)
+    parser.add_argument('--estaciones', type=int, default=12000)
+    parser.add_argument('--latencia', type=float, default=0.0, help='segundos antes de cada respuesta')
+    parser.add_argument('--variacion', type=float, default=0.0, help='± segundos aleatorios sobre la latencia')
+    parser.add_argument('--tasa-429', type=float, default=0.0)
+    parser.add_argument('--tasa-500', type=float, default=0.0)
+    parser.add_argument('--limite-concurrencia', type=int, default=0)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--cache-dias', type=int, default=8, help='respuestas generadas que se guardan en memoria')
+    args = parser.parse_args(argv)
+
+    servidor = ServidorPrueba(args.puerto, args.estaciones, args.latencia, args.variacion, args.tasa_429,
+                              args.tasa_500, args.limite_concurrencia, semilla=args.semilla, cache_dias=args.cache_dias)
+    print(f'🧪 Servidor de prueba en {servidor.url} ({args.estaciones} estaciones)', flush=True)
+    try:
+        servidor.http.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.http.server_close()
+
+
+if __name__ == '__main__':
+    main()
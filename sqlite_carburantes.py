@@ -0,0 +1,297 @@
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from esquema_carburantes import a_float64
+
+ATRIBUTOS_ESTACION = {
+    'Rótulo': 'rotulo',
+    'Dirección': 'direccion',
+    'C.P.': 'cp',
+    'Localidad': 'localidad',
+    'Municipio': 'municipio',
+    'Provincia': 'provincia',
+    'Latitud': 'latitud',
+    'Longitud (WGS84)': 'longitud',
+}
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS combustibles (
+    id INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS estaciones (
+    ideess INTEGER PRIMARY KEY,
+    rotulo TEXT, direccion TEXT, cp TEXT, localidad TEXT, municipio TEXT, provincia TEXT,
+    latitud REAL, longitud REAL,
+    ultima_fecha TEXT
+);
+CREATE TABLE IF NOT EXISTS dias (
+    fecha TEXT PRIMARY KEY,
+    fecha_descarga TEXT,
+    estaciones INTEGER,
+    semana TEXT
+);
+CREATE TABLE IF NOT EXISTS precios (
+    fecha TEXT NOT NULL,
+    ideess INTEGER NOT NULL,
+    combustible INTEGER NOT NULL REFERENCES combustibles(id),
+    provincia TEXT,
+    precio REAL NOT NULL
+);
+"""
+
+INDICES = {
+    'idx_precios_ideess_fecha': 'precios (ideess, fecha)',
+    'idx_precios_provincia_fecha': 'precios (provincia, fecha)',
+    'idx_precios_combustible': 'precios (combustible, fecha)',
+}
+
+# La semana ISO (aaaa-Www, lunes a domingo, con el año ISO) se calcula al cargar y se guarda en dias:
+# strftime('%W') de SQLite no es ISO y deja los días de antes del primer lunes en la semana 00
+PERIODOS = {
+    'dia': "p.fecha",
+    'semana': "d.semana",
+    'mes': "strftime('%Y-%m', p.fecha)",
+    'anio': "strftime('%Y', p.fecha)",
+}
+
+
+def _iso(fecha):
+    """dd-mm-aaaa -> aaaa-mm-dd, el formato que se ordena bien como texto en SQLite"""
+    return datetime.strptime(fecha, '%d-%m-%Y').strftime('%Y-%m-%d')
+
+
+def _semana_iso(dia):
+    """aaaa-mm-dd -> aaaa-Www de la semana ISO (el 30-12-2024 es 2025-W01)"""
+    anio, semana, _ = datetime.strptime(dia, '%Y-%m-%d').isocalendar()
+    return f'{anio}-W{semana:02d}'
+
+
+def _numero(serie):
+    """Convertir '1,459' (o ya numérico) a float, con None en los vacíos"""
+    if not pd.api.types.is_numeric_dtype(serie):
+        serie = serie.astype(str).str.strip().str.replace(',', '.', regex=False)
+    return pd.Series(a_float64(pd.to_numeric(serie, errors='coerce')), index=serie.index)
+
+
+class AlmacenSQLite:
+    """Base de datos SQLite local con los precios diarios, lista para consultas
+
+    - precios: una fila por (estación, fecha, combustible) con precio informado,
+      con índices por (ideess, fecha), (provincia, fecha) y (combustible, fecha).
+    - estaciones: los últimos datos conocidos de cada estación.
+    - dias: fechas cargadas, para poder sustituir un día completo.
+    Las fechas se guardan como aaaa-mm-dd; la API recibe y devuelve dd-mm-aaaa.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        with closing(self.conectar()) as con:
+            con.executescript(ESQUEMA)
+            self._migrar(con)
+            self._crear_indices(con)
+
+    def conectar(self):
+        con = sqlite3.connect(self.ruta, timeout=600)
+        con.execute('PRAGMA journal_mode=WAL')
+        con.execute('PRAGMA synchronous=NORMAL')
+        con.execute('PRAGMA cache_size=-262144')
+        return con
+
+    @staticmethod
+    def _migrar(con):
+        """Añadir la semana ISO a las bases creadas antes de que dias la tuviera"""
+        if 'semana' in {fila[1] for fila in con.execute('PRAGMA table_info(dias)')}:
+            return
+        with con:
+            con.execute('ALTER TABLE dias ADD COLUMN semana TEXT')
+            dias = [fila[0] for fila in con.execute('SELECT fecha FROM dias')]
+            con.executemany('UPDATE dias SET semana = ? WHERE fecha = ?', [(_semana_iso(dia), dia) for dia in dias])
+
+    @staticmethod
+    def _crear_indices(con):
+        for nombre, definicion in INDICES.items():
+            con.execute(f'CREATE INDEX IF NOT EXISTS {nombre} ON {definicion}')
+
+    def _ids_combustibles(self, con, nombres):
+        con.executemany('INSERT OR IGNORE INTO combustibles (nombre) VALUES (?)', [(n,) for n in nombres])
+        return dict(con.execute('SELECT nombre, id FROM combustibles').fetchall())
+
+    @staticmethod
+    def _borrar_dias(con, dias):
+        """Borrar los precios de unas fechas aaaa-mm-dd (por combustible y fecha, para usar su índice)"""
+        con.executemany('DELETE FROM precios WHERE combustible IN (SELECT id FROM combustibles) AND fecha = ?',
+                        [(dia,) for dia in dias])
+        con.executemany('DELETE FROM dias WHERE fecha = ?', [(dia,) for dia in dias])
+
+    def _cargar_dia(self, con, df, fecha):
+        """Insertar los precios de un día en la conexión abierta, sustituyendo los que hubiera de esa fecha
+
+        Devuelve los datos de sus estaciones, que se guardan aparte con _actualizar_estaciones.
+        """
+        dia = _iso(fecha)
+        ideess = pd.to_numeric(df['IDEESS'], errors='coerce')
+        df = df[ideess.notna()]
+        ideess = ideess[ideess.notna()].astype('int64').to_numpy()
+
+        if con.execute('SELECT 1 FROM dias WHERE fecha = ?', (dia,)).fetchone():
+            self._borrar_dias(con, [dia])
+
+        columnas_precio = [col for col in df.columns if col.startswith('Precio ')]
+        ids = self._ids_combustibles(con, [col[len('Precio '):] for col in columnas_precio])
+        provincia = (df['Provincia'].to_numpy(dtype=object, na_value=None) if 'Provincia' in df.columns
+                     else np.full(len(df), None, dtype=object))
+        _, primeras = np.unique(ideess, return_index=True)
+        for col in columnas_precio:
+            precio = _numero(df[col]).to_numpy()[primeras]
+            informado = ~np.isnan(precio)
+            if not informado.any():
+                continue
+            n = int(informado.sum())
+            # Listas de Python en vez de filas de pandas: executemany las recorre sin coste extra
+            con.executemany('INSERT INTO precios VALUES (?, ?, ?, ?, ?)', zip(
+                repeat(dia, n), ideess[primeras][informado].tolist(), repeat(ids[col[len('Precio '):]], n),
+                provincia[primeras][informado].tolist(), precio[informado].tolist(),
+            ))
+
+        descarga = df['FechaDescarga'].iloc[0] if 'FechaDescarga' in df.columns and len(df) else None
+        con.execute('INSERT OR REPLACE INTO dias VALUES (?, ?, ?, ?)',
+                    (dia, None if descarga is None else str(descarga), len(primeras), _semana_iso(dia)))
+
+        estaciones = pd.DataFrame({'ideess': ideess})
+        for col, campo in ATRIBUTOS_ESTACION.items():
+            valores = df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+            if campo in ('latitud', 'longitud'):
+                valores = _numero(valores)
+            elif campo == 'cp':
+                valores = valores.astype(str).str.lstrip("'").where(valores.notna())
+            estaciones[campo] = valores.to_numpy(dtype=object)
+        estaciones['ultima_fecha'] = dia
+        return estaciones.iloc[primeras]
+
+    @staticmethod
+    def _actualizar_estaciones(con, estaciones):
+        """Guardar los datos más recientes de cada estación (un día antiguo no pisa uno más nuevo)"""
+        estaciones = estaciones.sort_values('ultima_fecha', kind='stable').drop_duplicates('ideess', keep='last')
+        estaciones = estaciones.astype(object).where(estaciones.notna(), None)
+        campos = list(estaciones.columns)
+        con.executemany(
+            f'INSERT INTO estaciones ({", ".join(campos)}) VALUES ({", ".join("?" * len(campos))}) '
+            'ON CONFLICT(ideess) DO UPDATE SET '
+            + ', '.join(f'{c} = excluded.{c}' for c in campos[1:])
+            + ' WHERE excluded.ultima_fecha >= estaciones.ultima_fecha',
+            estaciones.itertuples(index=False, name=None),
+        )
+
+    def agregar_dia(self, df, fecha):
+        """Cargar (o sustituir) un día limpio en una sola transacción"""
+        with closing(self.conectar()) as con, con:
+            self._actualizar_estaciones(con, self._cargar_dia(con, df, fecha))
+        return self.ruta
+
+    def agregar_dias(self, dias):
+        """Carga masiva de (df, fecha) en una sola transacción
+
+        Los índices de precios se quitan durante la carga y se reconstruyen al final,
+        que es mucho más rápido que mantenerlos fila a fila. Las fechas ya cargadas
+        se borran antes, mientras los índices todavía existen.
+        """
+        dias = list(dias)
+        n = 0
+        estaciones = []
+        with closing(self.conectar()) as con, con:
+            cargados = {fila[0] for fila in con.execute('SELECT fecha FROM dias')}
+            self._borrar_dias(con, sorted({_iso(fecha) for _, fecha in dias} & cargados))
+            for nombre in INDICES:
+                con.execute(f'DROP INDEX IF EXISTS {nombre}')
+            for df, fecha in dias:
+                estaciones.append(self._cargar_dia(con, df, fecha))
+                n += 1
+            if estaciones:
+                self._actualizar_estaciones(con, pd.concat(estaciones, ignore_index=True))
+            self._crear_indices(con)
+        return n
+
+    def consultar(self, sql, parametros=()):
+        """Ejecutar una consulta libre y devolver un DataFrame"""
+        with closing(self.conectar()) as con:
+            return pd.read_sql_query(sql, con, params=parametros)
+
+    @staticmethod
+    def _filtros(desde=None, hasta=None, combustibles=None, provincia=None):
+        condiciones, parametros = [], []
+        if desde:
+            condiciones.append('p.fecha >= ?')
+            parametros.append(_iso(desde))
+        if hasta:
+            condiciones.append('p.fecha <= ?')
+            parametros.append(_iso(hasta))
+        if combustibles:
+            if isinstance(combustibles, str):
+                combustibles = [combustibles]
+            condiciones.append(f'c.nombre IN ({", ".join("?" * len(combustibles))})')
+            parametros.extend(combustibles)
+        if provincia:
+            condiciones.append('p.provincia = ?')
+            parametros.append(provincia)
+        return (' AND '.join(condiciones) or '1'), parametros
+
+    @staticmethod
+    def _fechas_a_texto(df, columna='fecha'):
+        if columna in df.columns and len(df):
+            df[columna] = pd.to_datetime(df[columna], format='%Y-%m-%d').dt.strftime('%d-%m-%Y')
+        return df
+
+    def serie_estacion(self, ideess, combustibles=None, desde=None, hasta=None):
+        """Precios de una estación día a día (una columna por combustible)"""
+        donde, parametros = self._filtros(desde, hasta, combustibles)
+        largo = self.consultar(
+            'SELECT p.fecha, c.nombre AS combustible, p.precio FROM precios p '
+            'JOIN combustibles c ON c.id = p.combustible '
+            f'WHERE p.ideess = ? AND {donde} ORDER BY p.fecha',
+            [int(ideess)] + parametros,
+        )
+        ancho = largo.pivot(index='fecha', columns='combustible', values='precio').reset_index()
+        ancho.columns.name = None
+        return self._fechas_a_texto(ancho)
+
+    def agregado_region(self, combustible, desde=None, hasta=None, provincia=None, periodo='semana', por_municipio=False):
+        """Precio medio, mínimo y máximo de un combustible por provincia (o municipio) y periodo (semana ISO, mes...)"""
+        if periodo not in PERIODOS:
+            raise ValueError(f'Periodo no soportado: {periodo} (usa {", ".join(PERIODOS)})')
+        donde, parametros = self._filtros(desde, hasta, combustible, provincia)
+        region = 'p.provincia'
+        union = 'JOIN dias d ON d.fecha = p.fecha ' if periodo == 'semana' else ''
+        if por_municipio:
+            region = 'p.provincia, e.municipio'
+            union += 'JOIN estaciones e ON e.ideess = p.ideess '
+        return self.consultar(
+            f'SELECT {PERIODOS[periodo]} AS periodo, {region}, '
+            'AVG(p.precio) AS precio_medio, MIN(p.precio) AS precio_min, MAX(p.precio) AS precio_max, '
+            'COUNT(DISTINCT p.ideess) AS estaciones '
+            'FROM precios p JOIN combustibles c ON c.id = p.combustible '
+            f'{union}WHERE {donde} GROUP BY periodo, {region} ORDER BY periodo, {region}',
+            parametros,
+        )
+
+    def rango(self, desde, hasta, combustibles=None, provincia=None):
+        """Todos los precios de un rango de fechas, con los datos de cada estación"""
+        donde, parametros = self._filtros(desde, hasta, combustibles, provincia)
+        return self._fechas_a_texto(self.consultar(
+            'SELECT p.fecha, p.ideess, e.rotulo, e.municipio, p.provincia, c.nombre AS combustible, p.precio '
+            'FROM precios p JOIN combustibles c ON c.id = p.combustible '
+            'LEFT JOIN estaciones e ON e.ideess = p.ideess '
+            f'WHERE {donde} ORDER BY p.fecha, p.ideess',
+            parametros,
+        ))
+
+    def fechas(self):
+        """Fechas cargadas (dd-mm-aaaa), en orden cronológico"""
+        with closing(self.conectar()) as con:
+            filas = con.execute('SELECT fecha FROM dias ORDER BY fecha').fetchall()
+        return [datetime.strptime(f, '%Y-%m-%d').strftime('%d-%m-%Y') for (f,) in filas]
@@ -0,0 +1,40 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+CARPETA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Los módulos del proyecto están en la raíz, sin paquete
+sys.path.insert(0, CARPETA)
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def servidor():
+    """Servidor de prueba local (gzip, ETag/304), sin latencia; devuelve su URL base"""
+    puerto = _puerto_libre()
+    proceso = subprocess.Popen(
+        [sys.executable, os.path.join(CARPETA, 'servidor_prueba_carburantes.py'),
+         '--puerto', str(puerto), '--estaciones', '50', '--latencia', '0'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', puerto), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        yield f'http://127.0.0.1:{puerto}'
+    finally:
+        proceso.terminate()
+        proceso.wait()
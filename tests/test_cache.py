@@ -0,0 +1,64 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+from cache_carburantes import CacheRespuestas
+
+ENDPOINT = 'EstacionesTerrestresHist'
+
+
+def cuerpo(n):
+    # Bytes pseudoaleatorios: gzip apenas los comprime y el tamaño en disco es predecible
+    return os.urandom(n)
+
+
+def test_guardar_y_leer(tmp_path):
+    cache = CacheRespuestas(str(tmp_path), max_mb=None)
+    assert cache.obtener(ENDPOINT, '01-03-2024') is None
+    cache.guardar(ENDPOINT, '01-03-2024', b'{"ListaEESSPrecio": []}', {'etag': '"abc"', 'last_modified': ''})
+    assert cache.obtener(ENDPOINT, '01-03-2024') == b'{"ListaEESSPrecio": []}'
+    assert cache.validadores(ENDPOINT, '01-03-2024') == {'etag': '"abc"'}
+
+
+def test_dias_recientes_se_refrescan(tmp_path):
+    cache = CacheRespuestas(str(tmp_path), refrescar_dias=2)
+    hoy = datetime.now().strftime('%d-%m-%Y')
+    antiguo = (datetime.now() - timedelta(days=10)).strftime('%d-%m-%Y')
+    for fecha in (hoy, antiguo):
+        cache.guardar(ENDPOINT, fecha, b'{}')
+    assert cache.obtener(ENDPOINT, hoy) is None
+    assert cache.leer(ENDPOINT, hoy) == b'{}'
+    assert cache.obtener(ENDPOINT, antiguo) == b'{}'
+
+
+def test_expulsa_las_menos_usadas_y_solo_recorre_al_pasarse(tmp_path, monkeypatch):
+    cache = CacheRespuestas(str(tmp_path), max_mb=0.1)
+    recorridos = []
+    entradas = cache.entradas
+    monkeypatch.setattr(cache, 'entradas', lambda: recorridos.append(1) or entradas())
+
+    fechas = [f'{d:02d}-01-2024' for d in range(1, 8)]
+    for i, fecha in enumerate(fechas[:4]):
+        cache.guardar(ENDPOINT, fecha, cuerpo(20 * 1024))
+        os.utime(cache.ruta(ENDPOINT, fecha), (time.time() - 100 + i, time.time() - 100 + i))
+    assert recorridos == []
+    # Usar el primer día lo convierte en el más reciente
+    assert cache.obtener(ENDPOINT, fechas[0]) is not None
+
+    for fecha in fechas[4:]:
+        cache.guardar(ENDPOINT, fecha, cuerpo(20 * 1024))
+    assert recorridos
+    assert cache.total_bytes == sum(tamaño for _, tamaño, _ in entradas())
+    assert cache.total_bytes <= cache.max_bytes
+    assert cache.obtener(ENDPOINT, fechas[1]) is None
+    assert cache.obtener(ENDPOINT, fechas[0]) is not None
+    assert cache.obtener(ENDPOINT, fechas[-1]) is not None
+
+
+def test_total_inicial_cuenta_lo_ya_guardado(tmp_path):
+    CacheRespuestas(str(tmp_path), max_mb=None).guardar(ENDPOINT, '01-01-2024', cuerpo(10 * 1024))
+    cache = CacheRespuestas(str(tmp_path), max_mb=1)
+    assert cache.total_bytes == os.path.getsize(cache.ruta(ENDPOINT, '01-01-2024'))
+    # Sustituir una entrada no la cuenta dos veces
+    cache.guardar(ENDPOINT, '01-01-2024', cuerpo(10 * 1024))
+    assert cache.total_bytes == os.path.getsize(cache.ruta(ENDPOINT, '01-01-2024'))
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+import pytest
+
+from cli_carburantes import dividir_en_shards, main
+
+
+def test_shards_de_meses_completos():
+    shards = dividir_en_shards(datetime(2023, 11, 15), datetime(2024, 5, 3), meses_por_shard=3)
+    assert [(s['desde'], s['hasta']) for s in shards] == [
+        ('15-11-2023', '31-01-2024'),
+        ('01-02-2024', '30-04-2024'),
+        ('01-05-2024', '03-05-2024'),
+    ]
+
+
+@pytest.mark.parametrize('meses', [0, -1])
+def test_meses_por_shard_no_positivo(meses):
+    with pytest.raises(ValueError):
+        dividir_en_shards(datetime(2024, 1, 1), datetime(2024, 2, 1), meses_por_shard=meses)
+
+
+def test_cli_rechaza_meses_por_shard_cero(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        main(['--desde', '01-01-2024', '--salida', str(tmp_path), '--meses-por-shard', '0'])
+    assert 'al menos 1' in capsys.readouterr().err
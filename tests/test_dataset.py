@@ -0,0 +1,53 @@
+import os
+
+import pandas as pd
+
+from dataset_carburantes import COLUMNA_FECHA, DatasetParticionado, escribir_parquet_atomico
+
+FECHAS = ['30-01-2024', '31-01-2024', '01-02-2024', '02-02-2024']
+
+
+def dia(precio=1.5, estaciones=5):
+    return pd.DataFrame({
+        'IDEESS': list(range(1, estaciones + 1)),
+        'C.P.': ["'01234"] * estaciones,
+        'Precio Gasoleo A': [precio] * estaciones,
+    })
+
+
+def test_ida_y_vuelta_un_fichero_por_dia(tmp_path):
+    dataset = DatasetParticionado(str(tmp_path))
+    for fecha in FECHAS:
+        dataset.agregar_dia(dia(), fecha)
+    assert dataset.fechas() == FECHAS
+    assert os.path.exists(tmp_path / 'anio=2024' / 'mes=02' / 'dia=01.parquet')
+
+    # Repetir un día solo reescribe el suyo
+    otro = tmp_path / 'anio=2024' / 'mes=02' / 'dia=02.parquet'
+    escrito = otro.stat().st_mtime_ns
+    dataset.agregar_dia(dia(precio=1.6, estaciones=3), '01-02-2024')
+    assert otro.stat().st_mtime_ns == escrito
+
+    df = dataset.leer('31-01-2024', '01-02-2024')
+    assert sorted(df[COLUMNA_FECHA].unique()) == ['01-02-2024', '31-01-2024']
+    assert len(df) == 5 + 3
+    assert df.loc[df[COLUMNA_FECHA] == '01-02-2024', 'Precio Gasoleo A'].tolist() == [1.6] * 3
+    assert df['C.P.'].eq('01234').all()
+    assert len(dataset.leer()) == 5 * 3 + 3
+
+
+def test_meses_antiguos_en_un_solo_fichero(tmp_path):
+    antiguo = pd.concat([dia().assign(**{COLUMNA_FECHA: fecha}) for fecha in FECHAS[:2]], ignore_index=True)
+    escribir_parquet_atomico(antiguo, str(tmp_path / 'anio=2024' / 'mes=01' / 'precios.parquet'))
+    dataset = DatasetParticionado(str(tmp_path))
+    assert dataset.fechas() == FECHAS[:2]
+    assert len(dataset.leer('31-01-2024', '31-01-2024')) == 5
+
+    # El día repetido pasa a su propio fichero y sale del antiguo, sin duplicarse
+    dataset.agregar_dia(dia(precio=1.7), '31-01-2024')
+    df = dataset.leer()
+    assert len(df) == 10
+    assert df.loc[df[COLUMNA_FECHA] == '31-01-2024', 'Precio Gasoleo A'].tolist() == [1.7] * 5
+    dataset.agregar_dia(dia(), '30-01-2024')
+    assert not os.path.exists(tmp_path / 'anio=2024' / 'mes=01' / 'precios.parquet')
+    assert dataset.fechas() == FECHAS[:2]
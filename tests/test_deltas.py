@@ -0,0 +1,60 @@
+import pandas as pd
+
+from deltas_carburantes import AlmacenDeltas
+from json_carburantes import columnas_estaciones
+from scrapy_carburantes_simple import limpiar_dataframe
+from servidor_prueba_carburantes import GeneradorPayloads
+
+FECHAS = ['01-03-2024', '02-03-2024', '03-03-2024']
+
+
+def dia_limpio(generador, fecha):
+    df = pd.DataFrame(columnas_estaciones(generador.cuerpo(fecha)))
+    return limpiar_dataframe(df, ['Gasoleo A'])
+
+
+def test_historial_estacion_con_ideess_tipado(tmp_path):
+    generador = GeneradorPayloads(50)
+    almacen = AlmacenDeltas(str(tmp_path / 'deltas'))
+    dias = {fecha: dia_limpio(generador, fecha) for fecha in FECHAS}
+    for fecha, df in dias.items():
+        almacen.agregar_dia(df, fecha)
+    assert str(dias[FECHAS[0]]['IDEESS'].dtype) == 'Int32'
+
+    ideess = int(dias[FECHAS[0]]['IDEESS'].iloc[0])
+    for clave in (ideess, str(ideess)):
+        historial = almacen.historial_estacion(clave)
+        assert historial['FechaConsulta'].tolist() == FECHAS
+        esperado = [float(df.loc[df['IDEESS'] == ideess, 'Precio Gasoleo A'].iloc[0]) for df in dias.values()]
+        assert [float(p) for p in historial['Precio Gasoleo A']] == esperado
+
+    assert almacen.historial_estacion(ideess, desde=FECHAS[1])['FechaConsulta'].tolist() == FECHAS[1:]
+
+
+def test_dias_en_orden_igual_que_recodificando_el_mes(tmp_path):
+    generador = GeneradorPayloads(80)
+    fechas = [f'{d:02d}-03-2024' for d in range(1, 8)]
+    dias = {fecha: dia_limpio(generador, fecha) for fecha in fechas}
+    # Una estación que desaparece un día y vuelve después
+    dias[fechas[3]] = dias[fechas[3]].iloc[1:]
+
+    en_orden = AlmacenDeltas(str(tmp_path / 'en_orden'))
+    en_orden.agregar_dia(dias[fechas[0]], fechas[0])
+    keyframe = tmp_path / 'en_orden' / 'anio=2024' / 'mes=03' / 'keyframe.parquet'
+    escrito = keyframe.stat().st_mtime_ns
+    for fecha in fechas[1:]:
+        en_orden.agregar_dia(dias[fecha], fecha)
+    # Los días añadidos al final no vuelven a escribir la foto del mes
+    assert keyframe.stat().st_mtime_ns == escrito
+
+    al_reves = AlmacenDeltas(str(tmp_path / 'al_reves'))
+    for fecha in reversed(fechas):
+        al_reves.agregar_dia(dias[fecha], fecha)
+
+    assert en_orden.fechas() == fechas
+    for fecha in fechas:
+        reconstruido = en_orden.dia(fecha)
+        pd.testing.assert_frame_equal(reconstruido, al_reves.dia(fecha))
+        esperado = dias[fecha].sort_values('IDEESS').reset_index(drop=True)
+        assert reconstruido['IDEESS'].tolist() == esperado['IDEESS'].tolist()
+        assert reconstruido['Precio Gasoleo A'].astype('Float32').equals(esperado['Precio Gasoleo A'])
@@ -0,0 +1,53 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from escritores_carburantes import crear_escritor, filas_sin_nulos
+from importador_carburantes import leer_archivo
+
+
+def dia(filas):
+    precios = np.where(np.arange(filas) % 7 == 0, np.nan, 1.459)
+    return pd.DataFrame({
+        'IDEESS': pd.array(np.arange(1, filas + 1), dtype='Int32'),
+        'Rótulo': pd.Series(['REPSOL', None] * (filas // 2) + ['BP'] * (filas % 2), dtype=object),
+        'Latitud': np.linspace(36.0, 43.0, filas),
+        'Precio Gasoleo A': pd.array(precios, dtype='Float32'),
+    })
+
+
+def test_filas_por_bloques_iguales_y_con_none():
+    df = dia(23)
+    filas = list(filas_sin_nulos(df, filas_por_bloque=5))
+    assert filas == list(filas_sin_nulos(df, filas_por_bloque=100))
+    assert len(filas) == 23
+    assert filas[0] == [1, 'REPSOL', 36.0, None]
+    assert filas[1] == [2, None, df['Latitud'].iloc[1], 1.459]
+
+
+def test_memoria_acotada_por_bloque():
+    df = dia(30_000)
+
+    def pico(filas_por_bloque):
+        tracemalloc.start()
+        for _ in filas_sin_nulos(df, filas_por_bloque):
+            pass
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return pico
+
+    assert pico(2000) * 4 < pico(len(df))
+
+
+@pytest.mark.parametrize('formato', ['xlsx', 'csv', 'parquet'])
+def test_ida_y_vuelta(tmp_path, formato):
+    df = dia(12)
+    escritor = crear_escritor(formato)
+    ruta = escritor.escribir(df, str(tmp_path / f'precios_01_03_2024.{escritor.extension}'))
+    leido = leer_archivo(ruta)
+    assert leido['IDEESS'].astype(int).tolist() == list(range(1, 13))
+    precios = pd.to_numeric(leido['Precio Gasoleo A'].astype(str).str.replace(',', '.'), errors='coerce')
+    assert precios.isna().tolist() == df['Precio Gasoleo A'].isna().tolist()
+    assert precios.dropna().eq(1.459).all()
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from espacial_carburantes import IndiceEspacial, benchmark, distancia_km, radio_fuerza_bruta
+from json_carburantes import columnas_estaciones
+from scrapy_carburantes_simple import limpiar_dataframe
+from servidor_prueba_carburantes import GeneradorPayloads
+
+
+def dia(estaciones=2000):
+    df = pd.DataFrame(columnas_estaciones(GeneradorPayloads(estaciones).cuerpo('01-03-2024')))
+    return limpiar_dataframe(df, ['Gasoleo A', 'Gasolina 95 E5'])
+
+
+def puntos(indice, n=50):
+    rng = np.random.default_rng(1)
+    elegidas = rng.integers(0, len(indice), n)
+    return list(zip(indice.lat[elegidas] + rng.normal(0, 0.05, n), indice.lon[elegidas] + rng.normal(0, 0.05, n)))
+
+
+def test_radio_igual_que_fuerza_bruta():
+    df = dia()
+    indice = IndiceEspacial(df, celda_km=5)
+    # Las estaciones sin coordenadas quedan fuera del índice
+    validas = pd.to_numeric(df['Latitud'], errors='coerce').notna() & pd.to_numeric(df['Longitud (WGS84)'], errors='coerce').notna()
+    assert 0 < len(indice) == validas.sum()
+    for lat, lon in puntos(indice):
+        resultado = indice.radio(lat, lon, 15, 'Gasoleo A', limite=10)
+        referencia = radio_fuerza_bruta(df, lat, lon, 15, 'Gasoleo A', limite=10)
+        assert resultado['IDEESS'].astype(str).tolist() == referencia['IDEESS'].astype(str).tolist()
+    assert benchmark(df, n_consultas=20)['resultados_iguales']
+
+
+def test_cercanas_son_las_k_de_menor_distancia():
+    df = dia()
+    indice = IndiceEspacial(df, celda_km=2)
+    for lat, lon in puntos(indice, 20):
+        cercanas = indice.cercanas(lat, lon, k=7)
+        todas = np.sort(distancia_km(lat, lon, indice.lat, indice.lon))[:7]
+        np.testing.assert_allclose(cercanas['distancia_km'], todas.round(3))
+    # Sin estaciones dentro del radio máximo la tabla sale vacía
+    assert indice.cercanas(0.0, -60.0, k=3, radio_max_km=1).empty
+
+
+def test_lote_numera_las_consultas():
+    indice = IndiceEspacial(dia(300))
+    lote = indice.cercanas_lote(puntos(indice, 4), k=2, combustible='Gasolina 95 E5')
+    assert lote['consulta'].tolist() == [0, 0, 1, 1, 2, 2, 3, 3]
+    assert lote['Precio Gasolina 95 E5'].notna().all()
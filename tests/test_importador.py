@@ -0,0 +1,44 @@
+import pandas as pd
+
+from dataset_carburantes import DatasetParticionado
+from importador_carburantes import ImportadorCarpetas, descubrir
+from scrapy_carburantes_simple import procesar_dia
+from servidor_prueba_carburantes import GeneradorPayloads
+
+FECHAS = ['27-02-2024', '28-02-2024', '29-02-2024', '01-03-2024', '02-03-2024', '03-03-2024', '04-03-2024']
+
+
+def exportar(tmp_path):
+    salida = tmp_path / 'salida'
+    salida.mkdir()
+    config = {
+        'combustibles_extra': ['Gasoleo A'], 'formato': 'csv', 'output_dir': str(salida),
+        'dataset': None, 'normalizado': None, 'deltas': None, 'sqlite': None,
+        'resumen': None, 'medir_memoria': False, 'perfilar': None,
+    }
+    generador = GeneradorPayloads(200)
+    for fecha in FECHAS:
+        assert procesar_dia(generador.cuerpo(fecha), 'utf-8', fecha, config)['status'] == 'success'
+    return str(salida)
+
+
+def test_importar_mas_archivos_que_la_ventana(tmp_path):
+    archivos, _ = descubrir([exportar(tmp_path)])
+    importador = ImportadorCarpetas(str(tmp_path / 'dataset'), procesos=1)
+    assert len(archivos) > importador.ventana
+
+    vistos = []
+    resumen = importador.importar(archivos, lambda resultado, hechos, total: vistos.append(resultado['fecha']))
+    assert vistos == FECHAS
+    assert resumen['importados'] == len(FECHAS) and resumen['errores'] == 0
+
+    dataset = DatasetParticionado(str(tmp_path / 'dataset'))
+    assert dataset.fechas() == FECHAS
+    df = dataset.leer()
+    assert len(df) == 200 * len(FECHAS)
+    # 'Tipo Venta' (>90% mismo valor) la quitó la limpieza: vuelve vacía, no como el texto 'nan'
+    assert df['Tipo Venta'].isna().all()
+    assert not df['Horario'].isin(['nan', 'None', '<NA>']).any()
+
+    assert importador.importar(archivos)['saltados'] == len(FECHAS)
+    assert pd.api.types.is_float_dtype(df['Precio Gasoleo A'])
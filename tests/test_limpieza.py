@@ -0,0 +1,134 @@
+import logging
+import random
+import re
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from esquema_carburantes import aplicar_esquema
+from scrapy_carburantes_simple import CarburantesSpider
+
+
+def dia_sintetico(estaciones, semilla):
+    """Un día con la forma de ListaEESSPrecio: decimales con coma, centinelas y columnas casi vacías"""
+    r = random.Random(semilla)
+    coma = lambda valor, decimales: f'{valor:.{decimales}f}'.replace('.', ',')
+    filas = []
+    for i in range(estaciones):
+        centinela = r.random() < 0.01
+        filas.append({
+            'C.P.': r.choice(['', 'AB12', str(r.randint(1000, 9999)), str(r.randint(10000, 52999))]),
+            'Dirección': f'CALLE MAYOR {r.randint(1, 400)}',
+            'Horario': r.choice(['L-D: 24H', 'L-D: 06:00-22:00']),
+            'Latitud': '#####' if centinela else coma(r.uniform(27.6, 43.8), 6),
+            'Localidad': r.choice([f'LOCALIDAD {r.randint(1, 50)}', None]),
+            'Longitud (WGS84)': '' if centinela else coma(r.uniform(-18.2, 4.3), 6),
+            'Margen': r.choice(['D', 'I']),
+            'Municipio': f'MUNICIPIO {r.randint(1, 80)}',
+            'Precio Gasoleo A': '' if r.random() < 0.05 else coma(r.uniform(1.3, 1.7), 3),
+            'Precio Gasoleo B': '' if r.random() < 0.7 else coma(r.uniform(1.0, 1.3), 3),
+            'Precio Gasolina 95 E5': coma(r.uniform(1.4, 1.8), 3),
+            'Precio Hidrogeno': '#####' if r.random() < 0.01 else '',
+            'Provincia': r.choice(['MADRID', 'SEVILLA', 'VALENCIA / VALÈNCIA']),
+            'Remisión': 'dm' if r.random() < 0.95 else 'OM',
+            'Rótulo': r.choice(['REPSOL', 'CEPSA', 'BP', 'SIN RÓTULO']),
+            'Tipo Venta': 'P' if r.random() < 0.97 else 'R',
+            '% BioEtanol': '0,0' if r.random() < 0.93 else coma(r.uniform(0, 10), 1),
+            'IDEESS': str(i + 1),
+            'IDMunicipio': str(r.randint(1, 8200)),
+            'IDProvincia': f'{r.randint(1, 52):02d}',
+        })
+    return pd.DataFrame(filas)
+
+
+def limpiar_original(df, combustibles_extra=None):
+    """Limpieza fila a fila tal como estaba antes de vectorizarla, como referencia"""
+    if df.empty:
+        return df
+
+    regex_lat = re.compile(r'latitud', re.IGNORECASE)
+    regex_lon = re.compile(r'longitud', re.IGNORECASE)
+    lat_cols = [col for col in df.columns if regex_lat.search(col)]
+    lon_cols = [col for col in df.columns if regex_lon.search(col)]
+
+    for col in lat_cols + lon_cols:
+        serie = df[col].replace(['#####', ''], np.nan)
+        serie = serie.astype(str).str.strip().str.replace(',', '.', regex=False)
+        df[col] = pd.to_numeric(serie, errors='coerce')
+
+    columnas_combustibles = [col for col in df.columns if col.startswith('Precio ')]
+
+    combustibles_usuario = []
+    for combustible_usuario in combustibles_extra or []:
+        for col in columnas_combustibles:
+            if combustible_usuario.strip().lower() == col.replace('Precio ', '').strip().lower():
+                combustibles_usuario.append(col)
+
+    cols_fundamentales = ['IDEESS', 'Rótulo', 'Dirección', 'C.P.', 'Localidad', 'Municipio', 'Provincia']
+    cols_importantes = lat_cols + lon_cols + cols_fundamentales + combustibles_usuario
+
+    for col in columnas_combustibles:
+        if col not in combustibles_usuario:
+            df = df.drop(columns=[col])
+
+    def es_vacio(x):
+        return pd.isna(x) or x == '' or x == '#####'
+
+    for col in list(df.columns):
+        if col not in cols_importantes:
+            vacios = df[col].apply(es_vacio).sum()
+            if vacios / len(df) > 0.8:
+                df = df.drop(columns=[col])
+                continue
+            valores = df[col].astype(str).str.replace(',', '.').str.strip()
+            if len(valores.mode()) > 0:
+                valor_frecuente = valores.mode()[0]
+                if (valores == valor_frecuente).sum() / len(df) > 0.9:
+                    df = df.drop(columns=[col])
+
+    # El esquema común se añadió después; se aplica igual que en limpiar_dataframe
+    df = aplicar_esquema(df)
+
+    if 'C.P.' in df.columns:
+        df['C.P.'] = df['C.P.'].astype(str).apply(
+            lambda x: f"'{x.zfill(5)}" if x.isdigit() else f"'{x}"
+        )
+
+    if 'Localidad' in df.columns:
+        df = df.sort_values('Localidad', na_position='last')
+
+    return df
+
+
+def limpiar_actual(df, combustibles_extra=None):
+    spider = SimpleNamespace(combustibles_extra=combustibles_extra or [], logger=logging.getLogger('limpieza'))
+    return CarburantesSpider.limpiar_datos(spider, df)
+
+
+@pytest.mark.parametrize('combustibles', [
+    None,
+    ['Gasoleo A'],
+    ['gasolina 95 e5 ', 'Gasoleo A', 'Gasoleo B'],
+    ['Hidrogeno', 'No existe'],
+])
+@pytest.mark.parametrize('semilla', [0, 1])
+def test_limpieza_igual_que_la_original(combustibles, semilla):
+    df = dia_sintetico(2000, semilla)
+    pd.testing.assert_frame_equal(limpiar_actual(df.copy(), combustibles), limpiar_original(df.copy(), combustibles))
+
+
+def test_limpieza_con_columnas_vacias_y_repetidas():
+    df = pd.DataFrame({
+        'IDEESS': ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10'],
+        'C.P.': ['1234', '28001', '', 'AB12', '08001', '1234', '28001', '', '41001', '46001'],
+        'Localidad': ['B', 'A', None, 'C', 'A', 'B', 'D', 'E', 'F', 'A'],
+        'Latitud': ['40,1', '#####', '', '39,9', '41,0', '40,2', '38,1', '37,5', '36,0', '42,2'],
+        'Vacía': ['', '#####', None, '', '', '', '', '', 'x', ''],
+        'Constante': ['1,0'] * 9 + ['2,0'],
+        'Precio Gasoleo A': ['1,459', '', '1,5', '#####', '1,4', '1,41', '1,42', '1,43', '1,44', '1,45'],
+        'Precio Gasolina 95 E5': ['1,6'] * 10,
+    })
+    for combustibles in (None, ['Gasoleo A']):
+        pd.testing.assert_frame_equal(limpiar_actual(df.copy(), combustibles), limpiar_original(df.copy(), combustibles))
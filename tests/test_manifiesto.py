@@ -0,0 +1,51 @@
+import json
+from datetime import datetime
+
+from manifiesto_carburantes import ManifiestoDescargas, sha256_archivo
+
+
+def item(fecha, status='success', ruta=None):
+    return {'fecha': fecha, 'status': status, 'estaciones': 10, 'ruta': ruta}
+
+
+def test_reanudar_y_sync(tmp_path):
+    ruta = str(tmp_path / 'manifiesto.jsonl')
+    archivo = tmp_path / 'precios_02-03-2024.csv'
+    archivo.write_text('IDEESS\n1\n')
+
+    manifiesto = ManifiestoDescargas(ruta)
+    manifiesto.registrar(item('01-03-2024'))
+    manifiesto.registrar(item('02-03-2024', ruta=str(archivo)))
+    manifiesto.registrar(item('03-03-2024', status='error'))
+    assert manifiesto.registros['02-03-2024']['sha256'] == sha256_archivo(str(archivo))
+
+    # Un proceso nuevo ve lo mismo, aunque la última línea quedara a medias
+    with open(ruta, 'a', encoding='utf-8') as f:
+        f.write('{"fecha": "04-03')
+    manifiesto = ManifiestoDescargas(ruta)
+    fechas = ['01-03-2024', '02-03-2024', '03-03-2024', '04-03-2024']
+    assert manifiesto.pendientes(fechas) == ['03-03-2024', '04-03-2024']
+    assert manifiesto.fechas_sync(hasta=datetime(2024, 3, 5)) == ['03-03-2024', '04-03-2024', '05-03-2024']
+
+    # Si el archivo desaparece, el día vuelve a estar pendiente
+    archivo.unlink()
+    assert manifiesto.pendientes(fechas) == ['02-03-2024', '03-03-2024', '04-03-2024']
+
+
+def test_sync_sin_completadas_empieza_en_desde(tmp_path):
+    manifiesto = ManifiestoDescargas(str(tmp_path / 'manifiesto.jsonl'))
+    assert manifiesto.fechas_sync(datetime(2024, 2, 28), datetime(2024, 3, 1)) == ['28-02-2024', '29-02-2024', '01-03-2024']
+
+
+def test_compacta_las_lineas_repetidas(tmp_path):
+    ruta = tmp_path / 'manifiesto.jsonl'
+    manifiesto = ManifiestoDescargas(str(ruta))
+    for _ in range(60):
+        manifiesto.registrar(item('02-03-2024', status='error'))
+        manifiesto.registrar(item('01-03-2024'))
+    manifiesto.registrar(item('02-03-2024'))
+
+    manifiesto = ManifiestoDescargas(str(ruta))
+    lineas = [json.loads(linea) for linea in ruta.read_text(encoding='utf-8').splitlines()]
+    assert [r['fecha'] for r in lineas] == ['01-03-2024', '02-03-2024']
+    assert manifiesto.pendientes(['01-03-2024', '02-03-2024']) == []
@@ -0,0 +1,44 @@
+import json
+import tracemalloc
+
+from metricas_carburantes import MedidorEtapas, MetricasEtapas
+
+
+class Stats(dict):
+    def set_value(self, clave, valor):
+        self[clave] = valor
+
+
+def test_histograma_y_percentiles_en_las_stats(tmp_path):
+    metricas = MetricasEtapas()
+    for fecha, ms in [('01-03-2024', 3), ('02-03-2024', 40), ('03-03-2024', 45), ('04-03-2024', 60000)]:
+        metricas.registrar({'fecha': fecha, 'status': 'success', 'etapas': {'limpiar': {'ms': ms, 'cpu_ms': ms}}})
+
+    stats = Stats()
+    metricas.volcar_stats(stats)
+    assert stats['etapas/limpiar/dias'] == 4
+    assert stats['etapas/limpiar/p50_ms'] == 42.5
+    assert {clave: valor for clave, valor in stats.items() if '/hist/' in clave} == {
+        'etapas/limpiar/hist/5': 1,
+        'etapas/limpiar/hist/50': 2,
+        'etapas/limpiar/hist/inf': 1,
+    }
+
+    ruta = metricas.guardar_informe(str(tmp_path / 'informe.json'), stats=dict(stats))
+    with open(ruta, encoding='utf-8') as f:
+        informe = json.load(f)
+    assert informe['etapas']['limpiar']['histograma_ms'] == {'<=5': 1, '<=50': 2, '>30000': 1}
+    assert len(informe['dias']) == 4
+
+
+def test_medidor_de_etapas():
+    medidor = MedidorEtapas(memoria=True)
+    try:
+        with medidor.medir('lista'):
+            datos = list(range(100_000))
+    finally:
+        # El medidor deja tracemalloc activo para los días siguientes; aquí ralentizaría el resto de tests
+        tracemalloc.stop()
+    assert set(medidor.etapas['lista']) == {'ms', 'cpu_ms', 'pico_mb'}
+    assert medidor.etapas['lista']['pico_mb'] > 0
+    del datos
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from json_carburantes import columnas_estaciones
+from normalizado_carburantes import AlmacenNormalizado
+from scrapy_carburantes_simple import limpiar_dataframe
+from servidor_prueba_carburantes import GeneradorPayloads
+
+COMBUSTIBLES = ['Gasoleo A', 'Gasolina 95 E5']
+
+
+def dia_limpio(generador, fecha):
+    df = limpiar_dataframe(pd.DataFrame(columnas_estaciones(generador.cuerpo(fecha))), COMBUSTIBLES)
+    # Dos estaciones abiertas ese día sin ningún precio informado
+    df.loc[df.index[:2], [f'Precio {c}' for c in COMBUSTIBLES]] = np.nan
+    return df
+
+
+def test_ida_y_vuelta_conserva_todas_las_estaciones(tmp_path):
+    generador = GeneradorPayloads(60)
+    almacen = AlmacenNormalizado(str(tmp_path))
+    dias = {fecha: dia_limpio(generador, fecha) for fecha in ('01-03-2024', '02-03-2024')}
+    for fecha, df in dias.items():
+        almacen.agregar_dia(df, fecha)
+
+    for fecha, df in dias.items():
+        reconstruido = almacen.dia(fecha).set_index('IDEESS').sort_index()
+        original = df.assign(IDEESS=df['IDEESS'].astype('int32')).set_index('IDEESS').sort_index()
+        assert reconstruido.index.tolist() == original.index.tolist()
+        for col in [f'Precio {c}' for c in COMBUSTIBLES]:
+            np.testing.assert_array_equal(reconstruido[col].to_numpy(dtype='float32', na_value=np.nan),
+                                          original[col].to_numpy(dtype='float32', na_value=np.nan))
+        assert reconstruido['Rótulo'].tolist() == original['Rótulo'].tolist()
+        assert reconstruido['C.P.'].tolist() == original['C.P.'].str.lstrip("'").tolist()
+
+
+def test_cambio_de_rotulo_abre_una_version(tmp_path):
+    generador = GeneradorPayloads(10)
+    almacen = AlmacenNormalizado(str(tmp_path))
+    primero = dia_limpio(generador, '01-03-2024')
+    segundo = dia_limpio(generador, '02-03-2024')
+    segundo.loc[segundo.index[0], 'Rótulo'] = 'NUEVO RÓTULO'
+    almacen.agregar_dia(primero, '01-03-2024')
+    almacen.agregar_dia(segundo, '02-03-2024')
+
+    ideess = int(segundo['IDEESS'].iloc[0])
+    versiones = almacen.leer_estaciones().query('IDEESS == @ideess')
+    assert len(versiones) == 2
+    assert almacen.leer_estaciones('01-03-2024').query('IDEESS == @ideess')['Rótulo'].item() == primero['Rótulo'].iloc[0]
+    assert almacen.leer_estaciones('02-03-2024').query('IDEESS == @ideess')['Rótulo'].item() == 'NUEVO RÓTULO'
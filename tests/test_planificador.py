@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import pytest
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Request, Response
+from scrapy.settings import Settings
+
+from planificador_carburantes import PlanificadorAdaptativo, orden_huecos_primero
+
+
+class Stats(dict):
+    def set_value(self, clave, valor):
+        self[clave] = valor
+
+    def inc_value(self, clave, cantidad=1):
+        self[clave] = self.get(clave, 0) + cantidad
+
+    def max_value(self, clave, valor):
+        self[clave] = max(self.get(clave, valor), valor)
+
+
+def fechas(*dias):
+    return [f'{d:02d}-03-2024' for d in dias]
+
+
+def test_huecos_primero_y_por_biseccion():
+    orden = orden_huecos_primero(fechas(2, 3, 4, 10, 11, 12, 13, 14, 15, 16), completadas=fechas(1, 5))
+    # El hueco entre el 1 y el 5 va primero, empezando por su centro
+    assert orden[:3] == fechas(3, 2, 4)
+    assert orden[3] == fechas(13)[0]
+    assert sorted(orden) == sorted(fechas(2, 3, 4, 10, 11, 12, 13, 14, 15, 16))
+
+
+def planificador(**ajustes):
+    settings = Settings({'ADAPTATIVO_ENABLED': True, 'CONCURRENT_REQUESTS_PER_DOMAIN': 4, 'DOWNLOAD_DELAY': 0.5,
+                         'ADAPTATIVO_ENFRIAMIENTO': 0, **ajustes})
+    slot = SimpleNamespace(concurrency=4, delay=0.5)
+    crawler = SimpleNamespace(settings=settings, stats=Stats(),
+                              engine=SimpleNamespace(downloader=SimpleNamespace(slots={'a': slot})))
+    return PlanificadorAdaptativo.from_crawler(crawler), slot, crawler.stats
+
+
+def respuesta(status=200, latencia=0.1, **cabeceras):
+    request = Request('http://localhost/x', meta={'download_latency': latencia, 'download_slot': 'a'})
+    return request, Response(request.url, status=status, headers=cabeceras, request=request)
+
+
+def test_desactivado_por_defecto():
+    with pytest.raises(NotConfigured):
+        planificador(ADAPTATIVO_ENABLED=False)
+
+
+def test_frena_ante_429_y_sube_con_respuestas_sanas():
+    mw, slot, stats = planificador(ADAPTATIVO_VENTANA=2)
+    mw.process_response(*respuesta(429, **{'Retry-After': '7'}))
+    assert (slot.concurrency, slot.delay) == (2, 7.0)
+    # Las respuestas en vuelo con la misma señal no vuelven a frenar
+    mw.process_response(*respuesta(429))
+    assert stats['adaptativo/frenos'] == 1 and stats['adaptativo/señales/429'] == 2
+
+    for _ in range(2):
+        mw.process_response(*respuesta())
+    assert (slot.concurrency, slot.delay) == (3, 3.5)
+    assert stats['adaptativo/subidas'] == 1
+
+
+def test_ignora_respuestas_de_cache():
+    mw, slot, stats = planificador()
+    request, response = respuesta(503)
+    response.flags.append('cached')
+    mw.process_response(request, response)
+    assert slot.concurrency == 4 and 'adaptativo/frenos' not in stats
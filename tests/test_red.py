@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+from scrapy.http import Request, Response
+
+from cache_carburantes import CacheRespuestas, CacheRespuestasMiddleware
+from cli_carburantes import entorno_con_carpeta
+
+CARPETA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINT = 'EstacionesTerrestresHist'
+
+
+class Stats(dict):
+    def inc_value(self, clave, cantidad=1):
+        self[clave] = self.get(clave, 0) + cantidad
+
+
+def middleware(cache):
+    crawler = SimpleNamespace(spider=SimpleNamespace(cache=cache), stats=Stats())
+    return CacheRespuestasMiddleware(crawler), crawler.stats
+
+
+def peticion(fecha):
+    return Request(f'http://localhost/{ENDPOINT}/{fecha}', meta={'endpoint': ENDPOINT, 'fecha': fecha})
+
+
+def test_dia_antiguo_sale_de_la_cache_sin_red(tmp_path):
+    cache = CacheRespuestas(str(tmp_path), refrescar_dias=1)
+    cache.guardar(ENDPOINT, '01-03-2024', b'{"ListaEESSPrecio": []}')
+    mw, stats = middleware(cache)
+    respuesta = mw.process_request(peticion('01-03-2024'))
+    assert respuesta.body == b'{"ListaEESSPrecio": []}'
+    assert respuesta.flags == ['cached']
+    assert stats == {'cache_carburantes/hit': 1}
+
+
+def test_dia_reciente_se_revalida_y_un_304_usa_la_copia(tmp_path):
+    hoy = datetime.now().strftime('%d-%m-%Y')
+    cache = CacheRespuestas(str(tmp_path), refrescar_dias=1)
+    cache.guardar(ENDPOINT, hoy, b'{"ListaEESSPrecio": [1]}', {'etag': '"v1"', 'last_modified': 'Mon, 04 Mar 2024 08:00:00 GMT'})
+    mw, stats = middleware(cache)
+
+    request = peticion(hoy)
+    assert mw.process_request(request) is None
+    assert request.headers['If-None-Match'] == b'"v1"'
+    assert request.headers['If-Modified-Since'] == b'Mon, 04 Mar 2024 08:00:00 GMT'
+    assert 304 in request.meta['handle_httpstatus_list']
+
+    respuesta = mw.process_response(request, Response(request.url, status=304, headers={'ETag': '"v2"'}, request=request))
+    assert respuesta.status == 200
+    assert respuesta.body == b'{"ListaEESSPrecio": [1]}'
+    assert respuesta.flags == ['cached', 'no_modificado']
+    assert cache.validadores(ENDPOINT, hoy)['etag'] == '"v2"'
+    assert stats['cache_carburantes/condicional'] == 1 and stats['cache_carburantes/no_modificado'] == 1
+
+    # Un 200 sigue su camino sin tocar la copia
+    nueva = Response(request.url, status=200, body=b'{}', request=request)
+    assert mw.process_response(request, nueva) is nueva
+
+
+def test_spider_comprime_y_revalida_con_304(tmp_path, servidor):
+    """Dos ejecuciones del spider desde otra carpeta: la segunda recibe un 304 y no reprocesa el día"""
+    hoy = datetime.now().strftime('%d-%m-%Y')
+
+    def ejecutar(nombre):
+        items = tmp_path / f'{nombre}.jsonl'
+        comando = [sys.executable, '-m', 'scrapy', 'runspider', os.path.join(CARPETA, 'scrapy_carburantes_simple.py'),
+                   '-o', f'{items}:jsonlines', '-s', 'LOG_LEVEL=WARNING', '-s', 'DOWNLOAD_DELAY=0',
+                   '-a', f'fecha_inicio={hoy}', '-a', f'fecha_fin={hoy}', '-a', f'base_url={servidor}',
+                   '-a', 'formato=csv', '-a', f'output_dir={tmp_path / "salida"}', '-a', f'cache_dir={tmp_path / "cache"}']
+        subprocess.run(comando, cwd=tmp_path, env=entorno_con_carpeta(), check=True, capture_output=True, timeout=120)
+        with open(items, encoding='utf-8') as f:
+            return [json.loads(linea) for linea in f]
+
+    primero, = ejecutar('primero')
+    assert primero['status'] == 'success' and not primero.get('sin_cambios')
+    assert primero['codificacion'] == 'gzip'
+    assert primero['bytes_red'] < primero['bytes_descomprimidos']
+
+    segundo, = ejecutar('segundo')
+    assert segundo['status'] == 'success'
+    assert segundo['sin_cambios'] and segundo['cache']
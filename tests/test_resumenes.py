@@ -0,0 +1,38 @@
+import pandas as pd
+
+from json_carburantes import columnas_estaciones
+from resumenes_carburantes import AlmacenResumenes
+from scrapy_carburantes_simple import procesar_dia
+from servidor_prueba_carburantes import GeneradorPayloads
+
+FECHA = '01-03-2024'
+
+
+def config(tmp_path, combustibles):
+    return {
+        'combustibles_extra': combustibles, 'formato': 'csv', 'output_dir': str(tmp_path / 'salida'),
+        'dataset': None, 'normalizado': None, 'deltas': None, 'sqlite': None,
+        'resumen': str(tmp_path / 'resumen.sqlite'), 'medir_memoria': False, 'perfilar': None,
+    }
+
+
+def test_resumen_incluye_combustibles_no_seleccionados(tmp_path):
+    (tmp_path / 'salida').mkdir()
+    cuerpo = GeneradorPayloads(200).cuerpo(FECHA)
+    item = procesar_dia(cuerpo, 'utf-8', FECHA, config(tmp_path, []))
+    assert item['status'] == 'success'
+
+    resumen = AlmacenResumenes(str(tmp_path / 'resumen.sqlite'))
+    for combustible in ('Gasoleo A', 'Gasolina 95 E5'):
+        assert len(resumen.consultar(combustible, nivel='provincia')) > 0
+
+
+def test_repetir_dia_con_otros_combustibles_no_borra_los_demas(tmp_path):
+    df = pd.DataFrame(columnas_estaciones(GeneradorPayloads(200).cuerpo(FECHA)))
+    resumen = AlmacenResumenes(str(tmp_path / 'resumen.sqlite'))
+    resumen.agregar_dia(df[['IDEESS', 'Provincia', 'Municipio', 'Precio Gasoleo A']], FECHA)
+    gasoleo = resumen.consultar('Gasoleo A')
+    resumen.agregar_dia(df[['IDEESS', 'Provincia', 'Municipio', 'Precio Gasolina 95 E5']], FECHA)
+
+    pd.testing.assert_frame_equal(resumen.consultar('Gasoleo A'), gasoleo)
+    assert len(resumen.consultar('Gasolina 95 E5')) > 0
@@ -0,0 +1,64 @@
+import sqlite3
+import time
+from contextlib import closing
+
+import pandas as pd
+
+from json_carburantes import columnas_estaciones
+from scrapy_carburantes_simple import limpiar_dataframe
+from servidor_prueba_carburantes import COMBUSTIBLES, GeneradorPayloads
+from sqlite_carburantes import AlmacenSQLite
+
+
+def dia_limpio(generador, fecha, combustibles=('Gasoleo A', 'Gasolina 95 E5')):
+    return limpiar_dataframe(pd.DataFrame(columnas_estaciones(generador.cuerpo(fecha))), list(combustibles))
+
+
+def test_ida_y_vuelta_de_precios(tmp_path):
+    generador = GeneradorPayloads(100)
+    almacen = AlmacenSQLite(str(tmp_path / 'precios.sqlite'))
+    dias = {fecha: dia_limpio(generador, fecha) for fecha in ('01-03-2024', '02-03-2024')}
+    almacen.agregar_dias((df, fecha) for fecha, df in dias.items())
+    # Volver a cargar un día lo sustituye
+    almacen.agregar_dia(dias['02-03-2024'], '02-03-2024')
+    assert almacen.fechas() == list(dias)
+
+    df = dias['01-03-2024']
+    ideess = int(df['IDEESS'].iloc[0])
+    serie = almacen.serie_estacion(ideess, 'Gasoleo A')
+    assert serie['fecha'].tolist() == list(dias)
+    esperado = [float(d.loc[d['IDEESS'] == ideess, 'Precio Gasoleo A'].iloc[0]) for d in dias.values()]
+    # Los precios vuelven con sus 3 decimales exactos, sin restos de float32
+    assert serie['Gasoleo A'].tolist() == [round(p, 3) for p in esperado]
+
+    rango = almacen.rango('01-03-2024', '01-03-2024', 'Gasoleo A')
+    assert len(rango) == df['Precio Gasoleo A'].notna().sum()
+
+
+def test_semana_iso_en_cambio_de_anio(tmp_path):
+    generador = GeneradorPayloads(20)
+    almacen = AlmacenSQLite(str(tmp_path / 'precios.sqlite'))
+    fechas = ['01-01-2023', '02-01-2023', '29-12-2024', '30-12-2024', '31-12-2024']
+    almacen.agregar_dias((dia_limpio(generador, fecha), fecha) for fecha in fechas)
+    semanas = almacen.agregado_region('Gasoleo A', periodo='semana')['periodo'].unique().tolist()
+    assert semanas == ['2022-W52', '2023-W01', '2024-W52', '2025-W01']
+
+
+def test_base_antigua_sin_semana(tmp_path):
+    ruta = str(tmp_path / 'precios.sqlite')
+    with closing(sqlite3.connect(ruta)) as con, con:
+        con.execute('CREATE TABLE dias (fecha TEXT PRIMARY KEY, fecha_descarga TEXT, estaciones INTEGER)')
+        con.execute("INSERT INTO dias VALUES ('2024-12-30', NULL, 0)")
+    almacen = AlmacenSQLite(ruta)
+    assert almacen.consultar('SELECT semana FROM dias')['semana'].tolist() == ['2025-W01']
+
+
+def test_carga_de_un_anio(tmp_path):
+    df = dia_limpio(GeneradorPayloads(500), '01-01-2024', COMBUSTIBLES)
+    fechas = pd.date_range('2023-01-01', '2023-12-31').strftime('%d-%m-%Y')
+    almacen = AlmacenSQLite(str(tmp_path / 'precios.sqlite'))
+    inicio = time.perf_counter()
+    assert almacen.agregar_dias((df, fecha) for fecha in fechas) == 365
+    # Unos segundos; el límite solo detecta una vuelta a convertir cada precio en Python
+    assert time.perf_counter() - inicio < 30
+    assert len(almacen.fechas()) == 365
@@ -0,0 +1,27 @@
+from trabajador_carburantes import ClienteTrabajador
+
+
+def test_un_proceso_para_varios_trabajos(tmp_path, monkeypatch, servidor):
+    monkeypatch.chdir(tmp_path)
+    cliente = ClienteTrabajador(log=str(tmp_path / 'trabajador.log'))
+    try:
+        pids, finales = set(), []
+        for mes, inicio, fin in (('01', '01-01-2024', '02-01-2024'), ('02', '01-02-2024', '02-02-2024')):
+            eventos = []
+            args = {'fecha_inicio': inicio, 'fecha_fin': fin, 'base_url': servidor,
+                    'formato': 'csv', 'output_dir': str(tmp_path / mes)}
+            final = cliente.ejecutar(args, {'DOWNLOAD_DELAY': 0, 'LOG_LEVEL': 'WARNING'}, eventos.append)
+            pids.add(cliente.proceso.pid)
+            finales.append(final)
+
+            assert final['tipo'] == 'fin', final
+            assert eventos[0]['tipo'] == 'inicio' and eventos[0]['total'] == 2
+            items = [e['item'] for e in eventos if e['tipo'] == 'item']
+            assert [i['status'] for i in items] == ['success', 'success']
+            assert len(list((tmp_path / mes).glob('precios_*.csv'))) == 2
+        # El segundo trabajo reutiliza el proceso ya arrancado
+        assert len(pids) == 1
+        assert [f['items'] for f in finales] == [2, 2]
+    finally:
+        cliente.cerrar()
+    assert cliente.proceso.poll() is not None
@@ -0,0 +1,201 @@
+import json
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+
+
+def _emitir(salida, bloqueo_salida, evento):
+    with bloqueo_salida:
+        salida.write(json.dumps(evento, ensure_ascii=False, default=str) + '\n')
+        salida.flush()
+
+
+def main():
+    """Proceso de descarga persistente: mantiene Scrapy y pandas cargados y recibe trabajos por una tubería
+
+    Protocolo (una línea JSON por mensaje):
+    - stdin, trabajos: {"id": "1", "args": {"fecha_inicio": "01-01-2024", ...}, "ajustes": {"DOWNLOAD_DELAY": 1}}
+      con los mismos argumentos que `-a` y ajustes que `-s`; {"orden": "salir"} termina.
+    - stdout, eventos: {"tipo": "listo"}, y por trabajo "inicio" (total de fechas), "item"
+      (cada resultado de parse_datos según se produce), "fin" (estadísticas) o "error".
+    """
+    from scrapy.utils.reactor import install_reactor
+    install_reactor('twisted.internet.asyncioreactor.AsyncioSelectorReactor')
+
+    from scrapy import signals
+    from scrapy.crawler import CrawlerRunner
+    from scrapy.utils.log import configure_logging
+    from twisted.internet import defer, reactor
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from scrapy_carburantes_simple import CarburantesSpider
+
+    # stdout es el canal de eventos: cualquier print o log va a stderr
+    salida = sys.stdout
+    sys.stdout = sys.stderr
+    bloqueo_salida = threading.Lock()
+
+    def emitir(evento):
+        _emitir(salida, bloqueo_salida, evento)
+
+    configure_logging({'LOG_LEVEL': os.environ.get('CARBURANTES_LOG_LEVEL', 'INFO')})
+    runner = CrawlerRunner()
+    turno = defer.DeferredLock()
+
+    def ejecutar(trabajo):
+        id_trabajo = trabajo.get('id')
+        crawler = runner.create_crawler(CarburantesSpider)
+        for clave, valor in (trabajo.get('ajustes') or {}).items():
+            crawler.settings.set(clave, valor, priority='cmdline')
+
+        def al_abrir(spider):
+            emitir({'tipo': 'inicio', 'id': id_trabajo, 'total': len(spider.fechas), 'output_dir': os.path.abspath(spider.output_dir)})
+
+        def al_item(item, response=None, spider=None):
+            emitir({'tipo': 'item', 'id': id_trabajo, 'item': dict(item)})
+
+        crawler.signals.connect(al_abrir, signal=signals.spider_opened, weak=False)
+        crawler.signals.connect(al_item, signal=signals.item_scraped, weak=False)
+
+        d = runner.crawl(crawler, **(trabajo.get('args') or {}))
+
+        def terminado(_):
+            stats = crawler.stats.get_stats() if crawler.stats else {}
+            emitir({'tipo': 'fin', 'id': id_trabajo, 'motivo': stats.get('finish_reason'),
+                    'items': stats.get('item_scraped_count', 0), 'stats': stats})
+
+        def fallido(f):
+            emitir({'tipo': 'error', 'id': id_trabajo, 'error': f.getErrorMessage(),
+                    'traceback': f.getTraceback()})
+
+        d.addCallbacks(terminado, fallido)
+        return d
+
+    parado = []
+
+    def parar():
+        # 'salir' y el cierre de stdin llegan los dos: solo se para una vez
+        if not parado:
+            parado.append(True)
+            reactor.stop()
+
+    def recibir(linea):
+        try:
+            mensaje = json.loads(linea)
+        except json.JSONDecodeError as e:
+            emitir({'tipo': 'error', 'id': None, 'error': f'Mensaje no válido: {e}'})
+            return
+        if mensaje.get('orden') == 'salir':
+            turno.run(parar)
+            return
+        # Un trabajo detrás de otro: el reactor se comparte y los trabajos escriben en carpetas distintas
+        turno.run(ejecutar, mensaje)
+
+    def leer_entrada():
+        for linea in sys.stdin:
+            if linea.strip():
+                reactor.callFromThread(recibir, linea)
+        reactor.callFromThread(turno.run, parar)
+
+    threading.Thread(target=leer_entrada, daemon=True).start()
+    reactor.callWhenRunning(emitir, {'tipo': 'listo', 'pid': os.getpid()})
+    reactor.run(installSignalHandlers=False)
+
+
+class ClienteTrabajador:
+    """Arranca el proceso trabajador una vez y le envía trabajos de descarga
+
+    Los eventos se leen en un hilo propio y se entregan a la función `al_evento`
+    del trabajo correspondiente; ejecutar() bloquea hasta el evento final.
+    """
+
+    def __init__(self, log=None):
+        # El stderr del trabajador (trazas de error de Scrapy) siempre queda en un fichero
+        self.log = log or os.path.join(tempfile.gettempdir(), 'carburantes_trabajador.log')
+        self.proceso = None
+        self.colas = {}
+        self.listo = threading.Event()
+        self.bloqueo = threading.Lock()
+        self.contador = 0
+
+    def iniciar(self):
+        """Lanzar el trabajador si no está vivo (en segundo plano; ejecutar() espera a que esté listo)"""
+        with self.bloqueo:
+            if self.proceso is not None and self.proceso.poll() is None:
+                return
+            self.listo.clear()
+            carpeta = os.path.dirname(os.path.abspath(__file__))
+            # El hijo hereda su propia copia del descriptor; la del padre se cierra al salir del with
+            with open(self.log, 'a', encoding='utf-8') as errores:
+                self.proceso = subprocess.Popen(
+                    [sys.executable, os.path.join(carpeta, 'trabajador_carburantes.py')],
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=errores,
+                    text=True, encoding='utf-8', bufsize=1, cwd=os.getcwd(),
+                )
+            threading.Thread(target=self._leer_eventos, args=(self.proceso,), daemon=True).start()
+
+    def _leer_eventos(self, proceso):
+        for linea in proceso.stdout:
+            try:
+                evento = json.loads(linea)
+            except json.JSONDecodeError:
+                continue
+            if evento.get('tipo') == 'listo':
+                self.listo.set()
+                continue
+            cola = self.colas.get(evento.get('id'))
+            if cola is not None:
+                cola.put(evento)
+        # El proceso ha terminado: se despiertan los trabajos que siguieran esperando
+        self.listo.set()
+        for id_trabajo, cola in list(self.colas.items()):
+            cola.put({'tipo': 'error', 'id': id_trabajo, 'error': f'El proceso trabajador ha terminado (detalles en {self.log})'})
+
+    def ejecutar(self, args, ajustes=None, al_evento=None, espera_arranque=120):
+        """Enviar un trabajo y esperar a que termine; devuelve el evento 'fin' o 'error'"""
+        self.iniciar()
+        if not self.listo.wait(espera_arranque):
+            return {'tipo': 'error', 'error': 'El proceso trabajador no ha arrancado'}
+
+        with self.bloqueo:
+            self.contador += 1
+            id_trabajo = str(self.contador)
+        cola = self.colas[id_trabajo] = queue.Queue()
+        try:
+            mensaje = {'id': id_trabajo, 'args': args, 'ajustes': ajustes or {}}
+            self.proceso.stdin.write(json.dumps(mensaje, ensure_ascii=False) + '\n')
+            self.proceso.stdin.flush()
+        except OSError as e:
+            self.colas.pop(id_trabajo, None)
+            return {'tipo': 'error', 'error': f'No se pudo enviar el trabajo: {e}'}
+
+        try:
+            while True:
+                evento = cola.get()
+                if al_evento is not None:
+                    al_evento(evento)
+                if evento['tipo'] in ('fin', 'error'):
+                    return evento
+        finally:
+            self.colas.pop(id_trabajo, None)
+
+    def cerrar(self):
+        if self.proceso is not None and self.proceso.poll() is None:
+            try:
+                self.proceso.stdin.write(json.dumps({'orden': 'salir'}) + '\n')
+                self.proceso.stdin.close()
+                self.proceso.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                self.proceso.kill()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception:
+        traceback.print_exc()
+        sys.exit(1)